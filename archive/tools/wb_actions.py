@@ -3,6 +3,11 @@ from wikibaseintegrator import WikibaseIntegrator, entities, wbi_helpers, wbi_lo
 from wikibaseintegrator.wbi_config import config as wbi_config
 
 import os
+import sys
+
+# the shared HTTP settings are kept in src/tools, which belongs to the same 'tools' namespace package
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'src'))
+import tools.http_client as http_client
 
 
 wbi_config['MEDIAWIKI_API_URL'] = 'https://prunus-208.man.poznan.pl/api.php'
@@ -14,6 +19,7 @@ BOT_NAME = os.environ.get('BOT_NAME')
 BOT_PASSWORD = os.environ.get('BOT_PASSWORD')
 
 login_instance = wbi_login.Login(user=BOT_NAME, password=BOT_PASSWORD)
+http_client.configure(login_instance)
 wbi = WikibaseIntegrator(login=login_instance)
 
 
@@ -9,6 +9,16 @@ from dotenv import load_dotenv
 from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
 from wikibaseintegrator.wbi_config import config as wbi_config
 
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.entity_cache as entity_cache
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+
 
 WRITE = False
 
@@ -30,50 +40,70 @@ P_PRNG_ID = 'P76'
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume)
 
     report_path = 'data_2025/reports/01.3_ahp_prng_checked_elements.txt'
+    report = report_writer.ReportWriter(report_path)
+    journal.attach(report)
 
     data_file = open('data_2025/01.3_AHP_PRNG_elements_to_check.csv')
     file_reader = csv.reader(data_file)
 
     property_to_check = P_AHP_ID
 
+    item_links = {}
     for row in file_reader:
         item_link = row[0]
         position = item_link.rfind(r'/')
         item_id = item_link[position+1:]
-        item = wbi.item.get(entity_id=item_id)
+        if not journal.is_done(item_id):
+            item_links[item_id] = item_link
+
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(len(item_links))
 
-        number_of_values_for_a_property = 0
-        for claim in item.claims:
-            if claim.mainsnak.property_number == property_to_check:
-                number_of_values_for_a_property += 1
+    # the elements are only read, so read-only records are enough
+    for item in tracker.track(concurrent_fetcher.fetch_entities(wbi, item_links.keys(), ordered=True, cache=cache,
+                                                                as_records=True)):
+        item_link = item_links[item.id]
+
+        number_of_values_for_a_property = len(item.get_claims(property_to_check))
         
         if number_of_values_for_a_property == 0:
             print("There is no value for property " + property_to_check + " in element " + item_link)
-            with open(report_path, 'a', encoding='utf-8') as report:
-                report.write(f"There is no value for property {property_to_check} in element {item_link}.\n")
+            report.write(f"There is no value for property {property_to_check} in element {item_link}.\n")
         elif number_of_values_for_a_property > 1:
             print("Właściwość " + property_to_check + " ma więcej niż jedną wartość dla elementu " + item_link)
 
-            for claim in item.claims:
-                if claim.mainsnak.property_number == property_to_check:
-                    print("Value " + str(claim.mainsnak.datavalue))
-            with open(report_path, 'a', encoding='utf-8') as report:
-                report.write(f"Property {property_to_check} has more than one value for element {item_link}.\n")
+            for claim in item.get_claims(property_to_check):
+                print("Value " + str(claim.mainsnak.datavalue))
+            report.write(f"Property {property_to_check} has more than one value for element {item_link}.\n")
+
+        journal.record(item.id, outcome=str(number_of_values_for_a_property))
 
 
     data_file.close()
+    journal.close()
+    cache.close()
 
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.close()
 
@@ -1,6 +1,8 @@
 """
 This scipt moves data from one element to another. Those elements are connected based on the PRNG identifier. Moved data from 
 the first element is then deleted.  
+In the merge mode the first element is merged into the second one by Wikibase (wbmergeitems) and becomes a redirect, so it
+does not have to be deleted later.
 """
 
 import csv 
@@ -12,10 +14,29 @@ from wikibaseintegrator.datatypes import MonolingualText, ExternalID
 from wikibaseintegrator.models import claims, qualifiers, references, snaks
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_enums import ActionIfExists
-from wikibaseintegrator.wbi_helpers import execute_sparql_query
+from wikibaseintegrator.wbi_helpers import mediawiki_api_call_helper, merge_items
+
+import tools.batch_fetcher as batch_fetcher
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.entity_cache as entity_cache
+import tools.entity_diff as entity_diff
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.sparql as sparql
 
 
 WRITE = False
+# merge the elements with wbmergeitems instead of copying the statements and writing both elements
+MERGE_ITEMS = False
+
+P_STATED_AS = 'P54'
+# statements of the first element which are not moved to the second one
+PROPERTIES_NOT_MOVED = ('P27', 'P108')
 
 load_dotenv()
 
@@ -142,18 +163,191 @@ def prepare_new_claim_data_from_claim(claim: claims.Claim) -> claims.Claim:
     return claim_to_add
 
 
+def get_element_problem(element_json: dict | None) -> str | None:
+    """
+    Checks if the element downloaded for the merge still exists and was not merged before, e.g. by an interrupted run
+
+    Parameters
+    ----------
+    element_json : dict | None
+        JSON of one of the merged elements, None if it could not be downloaded
+
+    Returns
+    -------
+    str | None
+        description of the problem, None if the element can be merged
+    """
+    if element_json is None:
+        return "could not be downloaded"
+    if 'missing' in element_json:
+        return "does not exist"
+    if 'redirects' in element_json:
+        return f"was already merged into the element {element_json['redirects']['to']}"
+    return None
+
+
+def get_merge_conflicts(source_json: dict, target_json: dict) -> list[str]:
+    """
+    Finds the conflicts which would stop the merge of the elements: different sitelinks to the same site and statements
+    linking one element to the other. Conflicting descriptions are not listed, they are removed from the first element
+    before the merge (see prepare_source_cleanup()).
+
+    Parameters
+    ----------
+    source_json : dict
+        JSON of the element merged into the other one
+    target_json : dict
+        JSON of the element receiving the data
+
+    Returns
+    -------
+    list[str]
+        descriptions of the conflicts, empty if the elements can be merged
+    """
+    conflicts = []
+    for site, sitelink in source_json.get('sitelinks', {}).items():
+        target_sitelink = target_json.get('sitelinks', {}).get(site)
+        if target_sitelink and target_sitelink['title'] != sitelink['title']:
+            conflicts.append(f"sitelink {site}")
+
+    for entity_json, other_id in ((source_json, target_json['id']), (target_json, source_json['id'])):
+        for property_number, statement in entity_json.get('claims', {}).items():
+            for claim in statement:
+                value = claim['mainsnak'].get('datavalue', {}).get('value')
+                if isinstance(value, dict) and value.get('id') == other_id:
+                    conflicts.append(f"{entity_json['id']} {property_number} {other_id}")
+
+    return conflicts
+
+
+def prepare_source_cleanup(source_json: dict, target_json: dict) -> dict:
+    """
+    Prepares the data removing from the first element the parts which are not moved to the second one: statements of
+    PROPERTIES_NOT_MOVED and descriptions different than the descriptions of the second element
+
+    Parameters
+    ----------
+    source_json : dict
+        JSON of the element merged into the other one
+    target_json : dict
+        JSON of the element receiving the data
+
+    Returns
+    -------
+    dict
+        data for 'wbeditentity', empty if nothing has to be removed
+    """
+    data = {}
+    target_descriptions = target_json.get('descriptions', {})
+    descriptions = {language: {'language': language, 'remove': ''}
+                    for language, description in source_json.get('descriptions', {}).items()
+                    if language in target_descriptions and target_descriptions[language]['value'] != description['value']}
+    if descriptions:
+        data['descriptions'] = descriptions
+
+    claims_to_remove = [{'id': claim['id'], 'remove': ''} for property_number in PROPERTIES_NOT_MOVED
+                        for claim in source_json.get('claims', {}).get(property_number, [])]
+    if claims_to_remove:
+        data['claims'] = claims_to_remove
+
+    return data
+
+
+def get_promoted_aliases(source_json: dict, target_json: dict) -> dict[str, list[str]]:
+    """
+    Collects the 'stated as' values of the first element which should become aliases of the second one
+
+    Parameters
+    ----------
+    source_json : dict
+        JSON of the element merged into the other one
+    target_json : dict
+        JSON of the element receiving the data
+
+    Returns
+    -------
+    dict[str, list[str]]
+        new aliases by their languages
+    """
+    aliases = {}
+    for claim in source_json.get('claims', {}).get(P_STATED_AS, []):
+        value = claim['mainsnak'].get('datavalue', {}).get('value')
+        if not value:
+            continue
+        existing_aliases = [alias['value'] for alias in target_json.get('aliases', {}).get(value['language'], [])]
+        language_aliases = aliases.setdefault(value['language'], [])
+        if value['text'] not in existing_aliases and value['text'] not in language_aliases:
+            language_aliases.append(value['text'])
+
+    return {language: values for language, values in aliases.items() if values}
+
+
+def merge_element(source_json: dict, target_json: dict, login: wbi_login._Login) -> int:
+    """
+    Merges the first element into the second one: removes the parts which are not moved, merges the elements, turns the
+    first element into a redirect and adds its 'stated as' values as aliases of the second element
+
+    Parameters
+    ----------
+    source_json : dict
+        JSON of the element merged into the other one
+    target_json : dict
+        JSON of the element receiving the data
+    login : wbi_login._Login
+        login instance
+
+    Returns
+    -------
+    int
+        number of API calls
+    """
+    source_id = source_json['id']
+    target_id = target_json['id']
+    calls = 0
+
+    cleanup_data = prepare_source_cleanup(source_json, target_json)
+    if cleanup_data:
+        mediawiki_api_call_helper(data={'action': 'wbeditentity', 'id': source_id, 'data': entity_diff.to_json(cleanup_data),
+                                        'baserevid': source_json['lastrevid'], 'format': 'json'}, login=login)
+        calls += 1
+
+    results = merge_items(from_id=source_id, to_id=target_id, login=login)
+    calls += 1
+    # Wikibase creates the redirect itself when the first element is left empty
+    if not results.get('redirected'):
+        mediawiki_api_call_helper(data={'action': 'wbcreateredirect', 'from': source_id, 'to': target_id, 'format': 'json'},
+                                  login=login)
+        calls += 1
+
+    for language, values in get_promoted_aliases(source_json, target_json).items():
+        mediawiki_api_call_helper(data={'action': 'wbsetaliases', 'id': target_id, 'language': language,
+                                        'add': '|'.join(values), 'format': 'json'}, login=login)
+        calls += 1
+
+    return calls
+
+
 
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__, plan_unsupported="the items are merged and edited depending on the earlier edits")
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
 
     report_path = 'data_2025/reports/01.1_ahp_prng_data_transfer.txt'
+    report = report_writer.ReportWriter(report_path)
+    journal.attach(report)
 
     # data_file = open('data_2025/01.1_AHP_PRNG_data_examples.csv')
     data_file = open('data_2025/01.1_AHP_PRNG_data.csv')
@@ -162,74 +356,142 @@ if __name__ == '__main__':
     file_header = next(file_reader)
 
 
+    rows = []
+    item_ids = []
     for row in file_reader:
         item_link = row[0]
-        item_label = row[1]
-        item_prng = row[2]
-        
         position = item_link.rfind(r'/')
         item_id = item_link[position+1:]
+        if not journal.is_done(item_id):
+            rows.append(row)
+            item_ids.append(item_id)
+
+    items_by_prng = sparql.get_items_by_string_values('P76', (str(row[2]) for row in rows))
+
+    if MERGE_ITEMS:
+        # both elements of every pair are downloaded in batches, the merge itself does not need them to be downloaded again
+        source_jsons = {}
+        for source_json in batch_fetcher.get_entities_json(item_ids, login=login_instance):
+            # a redirected element is returned as the element it redirects to
+            source_jsons[source_json.get('redirects', {}).get('from', source_json['id'])] = source_json
+        # elements which cannot be merged are skipped in the main loop
+        items = (wbi.item.new().from_json(source_jsons[item_id]) if get_element_problem(source_jsons.get(item_id)) is None else None
+                 for item_id in item_ids)
+        target_links = [items_by_prng[str(row[2])][0] for row in rows if len(items_by_prng.get(str(row[2]), [])) == 1]
+        target_ids = dict.fromkeys(target_link[target_link.rfind(r'/')+1:] for target_link in target_links)
+        target_jsons = {target_json['id']: target_json for target_json in batch_fetcher.get_entities_json(target_ids, login=login_instance)}
+    else:
+        items = concurrent_fetcher.fetch_entities(wbi, item_ids, ordered=True, cache=cache)
+
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(len(rows))
+    for row, item_id, item in tracker.track(zip(rows, item_ids, items)):
+        item_link = row[0]
+        item_label = row[1]
+        item_prng = row[2]
 
-        prng_query = '"' + str(item_prng) + '"'
-        query = """
-            SELECT DISTINCT ?item WHERE {
-                ?item p:P76 ?statement0.
-                ?statement0 (ps:P76) """ + prng_query + """.
-            }
-            """
-        
-        results = execute_sparql_query(query)
-        output = []
-        for result in results["results"]["bindings"]:
-            output.append(result["item"]["value"])
+        if item is None:
+            source_problem = get_element_problem(source_jsons.get(item_id))
+            print(item_link + " " + source_problem + ", skipped.")
+            report.write(f"{item_link} {source_problem}, skipped.\n")
+            continue
 
+        output = items_by_prng.get(str(item_prng), [])
+        # failed writes are not recorded, so that the element is processed again with --resume
+        write_failed = False
 
-        item = wbi.item.get(entity_id=item_id)
 
         if len(output) == 0:
             prng_to_add = str(item_prng)
             add_prng(wh_item=item, prng=prng_to_add)
             print("PRNG prepared")
             if WRITE:
-                item.write()
-                print(item_link+ " PRNG added to the element.")
-                with open(report_path, 'a', encoding='utf-8') as report:
+                try:
+                    item.write()
+                    # the PRNG may repeat in the next rows of the file
+                    items_by_prng[prng_to_add] = [item_link]
+                    print(item_link+ " PRNG added to the element.")
                     report.write(f"{item_link} PRNG added to the element.\n")
+                except Exception as e:
+                    print(item_link + " - error writing to Wikibase")
+                    report.write(f"{item_link} - error writing to Wikibase {e}\n")
+                    write_failed = True
 
         elif len(output) == 1:
             item_to_update_link = output[0]
             position = item_to_update_link.rfind(r'/')
             item_to_update_id = item_to_update_link[position+1:]
-            item_to_update = wbi.item.get(entity_id=item_to_update_id)
-            
-            for claim in item.claims:
-                if claim.mainsnak.property_number == 'P54':
-                    alias_language = claim.mainsnak.datavalue['value']['language']
-                    alias_value = claim.mainsnak.datavalue['value']['text']
-                    item_to_update.aliases.set(language=alias_language, values=alias_value)
-
-                if claim.mainsnak.property_number not in ('P27', 'P108'):
-                    claim_to_add = prepare_new_claim_data_from_claim(claim)
-                    item_to_update.add_claims(claims=claim_to_add, action_if_exists=ActionIfExists.APPEND_OR_REPLACE)
-                    claim.remove()
 
-            if WRITE:
-                item.write()
-                item_to_update.write()
-                print(item_link + " data moved to the element " + item_to_update_link)
-                with open(report_path, 'a', encoding='utf-8') as report:
-                    report.write(f"{item_link} data moved to the element {item_to_update_link}.\n")
+            if MERGE_ITEMS:
+                source_json = source_jsons[item.id]
+                # the PRNG may have been added to the element by one of the previous rows, and the elements already
+                # merged into it have changed it, in both cases the element is downloaded again
+                target_json = target_jsons.get(item_to_update_id) or next(batch_fetcher.get_entities_json([item_to_update_id], login=login_instance), None)
+                target_problem = get_element_problem(target_json)
+                conflicts = get_merge_conflicts(source_json, target_json) if target_problem is None else []
+                if target_problem is not None:
+                    print(item_link + " - the element " + item_to_update_link + " " + target_problem)
+                    report.write(f"{item_link} - the element {item_to_update_link} {target_problem}, skipped.\n")
+                    write_failed = True
+                elif conflicts:
+                    print(item_link + " cannot be merged into the element " + item_to_update_link)
+                    report.write(f"{item_link} cannot be merged into the element {item_to_update_link}, conflicts: {', '.join(conflicts)}.\n")
+                elif WRITE:
+                    try:
+                        merge_element(source_json, target_json, login_instance)
+                        target_jsons.pop(item_to_update_id, None)
+                        print(item_link + " merged into the element " + item_to_update_link)
+                        report.write(f"{item_link} merged into the element {item_to_update_link}.\n")
+                    except Exception as e:
+                        print(item_link + " - error writing to Wikibase")
+                        report.write(f"{item_link} - error merging into the element {item_to_update_link} {e}\n")
+                        write_failed = True
+                else:
+                    print(item_link + " prepared to be merged into the element " + item_to_update_link)
+                    report.write(f"{item_link} prepared to be merged into the element {item_to_update_link}.\n")
+
+            else:
+                item_to_update = wbi.item.get(entity_id=item_to_update_id)
+
+                for claim in item.claims:
+                    if claim.mainsnak.property_number == 'P54':
+                        alias_language = claim.mainsnak.datavalue['value']['language']
+                        alias_value = claim.mainsnak.datavalue['value']['text']
+                        item_to_update.aliases.set(language=alias_language, values=alias_value)
+
+                    if claim.mainsnak.property_number not in ('P27', 'P108'):
+                        claim_to_add = prepare_new_claim_data_from_claim(claim)
+                        item_to_update.add_claims(claims=claim_to_add, action_if_exists=ActionIfExists.APPEND_OR_REPLACE)
+                        claim.remove()
+
+                if WRITE:
+                    try:
+                        item.write()
+                        item_to_update.write()
+                        print(item_link + " data moved to the element " + item_to_update_link)
+                        report.write(f"{item_link} data moved to the element {item_to_update_link}.\n")
+                    except Exception as e:
+                        print(item_link + " - error writing to Wikibase")
+                        report.write(f"{item_link} - error moving data to the element {item_to_update_link} {e}\n")
+                        write_failed = True
 
         else:
             print("PRNG " + item_prng + " exists in more than one element.")
-            with open(report_path, 'a', encoding='utf-8') as report:
-                report.write(f"PRNG {item_prng} exists in more than one element.\n")
+            report.write(f"PRNG {item_prng} exists in more than one element.\n")
+
+        if not write_failed:
+            journal.record(item.id, outcome=f"{len(output)} elements with PRNG {item_prng}")
 
     data_file.close()
+    journal.close()
+    cache.close()
 
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.close()
 
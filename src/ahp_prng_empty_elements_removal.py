@@ -1,16 +1,37 @@
 """
 This script removes 'empty' elements that were left after moving data from them (script 'ahp_prng_data_transfer.py).
+In the bulk mode the elements are checked in batches, downloading only their statements and sitelinks, and only the
+elements which are really empty are deleted, several at once.
 """
 
 import csv 
 import os
 import time
+from collections import deque
 from dotenv import load_dotenv
 from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
 from wikibaseintegrator.wbi_config import config as wbi_config
+from wikibaseintegrator.wbi_helpers import delete_page
+
+import tools.batch_fetcher as batch_fetcher
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.write_pool as write_pool
 
 
 WRITE = False
+# check the emptiness of the elements with batched requests and delete them with the write pool, instead of downloading
+# every element before its deletion
+BULK_DELETE = True
+# number of elements deleted at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
+DELETE_ERROR_MESSAGE = " - error deleting from Wikibase"
 
 load_dotenv()
 
@@ -25,42 +46,125 @@ WIKIDARIAH_ACCESS_SECRET = os.environ.get('WIKIDARIAH_ACCESS_SECRET')
 
 
 
+def is_empty(entity_json: dict) -> bool:
+    """
+    Checks if the element has no statements and no sitelinks
+
+    Parameters
+    ----------
+    entity_json : dict
+        JSON of the element from 'wbgetentities' with at least the 'claims' and 'sitelinks' props
+
+    Returns
+    -------
+    bool
+        True if the element is empty
+    """
+    return not entity_json.get('claims') and not entity_json.get('sitelinks')
+
+
+
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__, plan_unsupported="the empty items are deleted, not edited")
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
 
     report_path = 'data_2025/reports/01.2_ahp_prng_removed_elements.txt'
+    report = report_writer.ReportWriter(report_path)
+    journal.attach(report)
 
     # data_file = open('data_2025/01.2_AHP_PRNG_elements_to_remove_examples.csv')
     data_file = open('data_2025/01.2_AHP_PRNG_elements_to_remove.csv')
     file_reader = csv.reader(data_file)
 
 
+    item_links = {}
     for row in file_reader:
         item_link = row[0]
         
         position = item_link.rfind(r'/')
         item_id = item_link[position+1:]
-
-        item = wbi.item.get(entity_id=item_id)
-
-        if WRITE:
-            item.delete()
-            print(item_link + " został usunięty.")
-            with open(report_path, 'a', encoding='utf-8') as report:
-                report.write(f"{item_link} został usunięty.\n")
+        if not journal.is_done(item_id):
+            item_links[item_id] = item_link
+
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(len(item_links))
+    if BULK_DELETE:
+        pool = write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session())
+        pending_deletions = deque()
+
+        entities_json = batch_fetcher.get_entities_json(item_links.keys(), props=['info', 'claims', 'sitelinks'],
+                                                        login=login_instance)
+        for entity_json in tracker.track(entities_json):
+            # a redirected element is returned as the element it redirects to
+            item_id = entity_json.get('redirects', {}).get('from', entity_json['id'])
+            item_link = item_links[item_id]
+
+            # the deletions are reported when they are finished, failed deletions are not recorded in the journal
+            future = None
+            write_message = ''
+            if 'missing' in entity_json:
+                report_message = f"{item_link} nie istnieje."
+            elif 'redirects' in entity_json:
+                report_message = f"{item_link} jest przekierowaniem do {entity_json['redirects']['to']}, nie został usunięty."
+            elif not is_empty(entity_json):
+                print(item_link + " nie jest pusty.")
+                report_message = f"{item_link} nie jest pusty, nie został usunięty."
+            else:
+                report_message = ''
+                if WRITE:
+                    future = pool.submit(item_id, delete_page, pageid=entity_json['pageid'], login=login_instance,
+                                         maxlag=pool.maxlag)
+                    report_message = item_link
+                    write_message = " został usunięty."
+
+            pending_deletions.append((future, (item_id, report_message, write_message)))
+            write_pool.report_finished_writes(pending_deletions, report, journal, error_message=DELETE_ERROR_MESSAGE)
+
+        pool.close()
+        write_pool.report_finished_writes(pending_deletions, report, journal, wait=True, error_message=DELETE_ERROR_MESSAGE)
+    else:
+        items = concurrent_fetcher.fetch_entities(wbi, item_links.keys(), ordered=True)
+        for item_id, item in zip(list(item_links.keys()), tracker.track(items)):
+            item_link = item_links[item_id]
+            # a redirected element is returned as the element it redirects to, which must not be deleted
+            if item.id != item_id:
+                report.write(f"{item_link} jest przekierowaniem do {item.id}, nie został usunięty.\n")
+                journal.record(item_id)
+                continue
+
+            if WRITE:
+                try:
+                    item.delete()
+                    print(item_link + " został usunięty.")
+                    report.write(f"{item_link} został usunięty.\n")
+                except Exception as e:
+                    print(item_link + DELETE_ERROR_MESSAGE)
+                    report.write(f"{item_link}{DELETE_ERROR_MESSAGE} {e}\n")
+                    continue
+
+            journal.record(item.id)
 
 
     data_file.close()
+    journal.close()
 
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.close()
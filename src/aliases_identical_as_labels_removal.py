@@ -5,15 +5,36 @@ and removes them.
 
 import os
 import time
+from collections import deque
 from dotenv import load_dotenv
 from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_helpers import execute_sparql_query
-from wikibaseintegrator.wbi_exceptions import MWApiError, ModificationFailed
+
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.dump_scanner as dump_scanner
+import tools.edit_plan as edit_plan
+import tools.entity_cache as entity_cache
+import tools.entity_diff as entity_diff
+import tools.fixers as fixers
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.write_pool as write_pool
 
 
 
 WRITE = True
+# send only the changed parts of the entities (tools/entity_diff.py) instead of the whole entities
+MINIMAL_WRITES = True
+# number of items written at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
+# results of dump_scan.py (e.g. 'data_2025/dump_scan/aliases_identical_as_labels.csv') used instead of the SPARQL query, if set
+DETECTION_RESULTS = ''
 
 load_dotenv()
 
@@ -31,14 +52,24 @@ WIKIDARIAH_ACCESS_SECRET = os.environ.get('WIKIDARIAH_ACCESS_SECRET')
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
 
     report_path = 'data_2025/reports/04.1_remove_aliases_identical_as_labels.txt'
+    report = report_writer.ReportWriter(report_path)
+    plan = edit_plan.open_plan(arguments.plan, resume=arguments.resume) if not WRITE else None
+    journal.attach(report, plan)
 
     query = """ SELECT DISTINCT ?item ?itemLabel ?itemAlias WHERE {
                     ?item rdfs:label ?itemLabel .
@@ -48,56 +79,62 @@ if __name__ == '__main__':
                 ORDER BY ?item
             """
 
-    results = execute_sparql_query(query)
-    output = []
+    if DETECTION_RESULTS:
+        results = dump_scanner.read_detection_results(DETECTION_RESULTS)
+    else:
+        results = execute_sparql_query(query)
+    entity_links = {}
     for result in results["results"]["bindings"]:
-        output.append(result["item"]["value"])
-
-    for entity_link in output:
+        entity_link = result["item"]["value"]
         position = entity_link.rfind(r'/')
         entity_id = entity_link[position+1:]
+        if not journal.is_done(entity_id):
+            entity_links[entity_id] = entity_link
 
-        if entity_id.startswith('P'):
-            entity = wbi.property.get(entity_id=entity_id)
+    fixer = fixers.AliasesIdenticalAsLabelsFixer()
+    pool = write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session())
+    pending_writes = deque()
 
-        else: 
-            entity = wbi.item.get(entity_id=entity_id)
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(len(entity_links))
 
-        entity_labels = entity.labels.values
-        entity_aliases = entity.aliases.aliases
+    for entity in tracker.track(concurrent_fetcher.fetch_entities(wbi, entity_links.keys(), ordered=True, cache=cache)):
+        snapshot = entity_diff.take_snapshot(entity)
+        entity_link = entity_links[entity.id]
 
         print(entity_link)
-        report_message = f"{entity_link} "
-
-        languages = ['pl', 'en']
-
-        for language in languages:
-            label = entity_labels.get(language)
-            aliases = entity_aliases.get(language)
-            if not aliases:
-                continue
-            for alias in aliases:
-                if label == alias:
-                    if WRITE:
-                        try:
-                            alias.remove()
-                            entity.write()
-                            report_message += f"{language} {alias} "
-                            print(language, alias, "- Alias same as label has been removed ")
-                        except (MWApiError, ModificationFailed) as e:
-                            print(" - error writing to Wikibase")
-                            report_message += f"- error writing to Wikibase {e}"
-                    else:
-                        report_message += f"{language} {alias} - Alias same as label "
-                    continue
-
-        with open(report_path, 'a', encoding='utf-8') as report:
-            report.write(report_message + "\n")
-
-
+        is_changed, messages = fixer.fix(entity)
+        if not messages:
+            # the detection results may be older than the item
+            messages = ["no alias identical to the label any more, skipped"]
+        report_message = " ".join([entity_link] + messages)
+
+        # all the aliases of the item are removed with a single write, run by the write pool
+        future = None
+        if WRITE and is_changed:
+            future = pool.submit(entity.id, entity_diff.write_entity, entity, snapshot, minimal=MINIMAL_WRITES,
+                                 maxlag=pool.maxlag)
+        elif plan:
+            plan.add_entity(entity, snapshot)
+
+        pending_writes.append((future, (entity.id, report_message, '')))
+        write_pool.report_finished_writes(pending_writes, report, journal)
+
+    pool.close()
+    write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
+
+    journal.close()
+    cache.close()
+    if plan:
+        plan.close()
+
+
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n \n \n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n \n \n")
+    report.close()
 
@@ -0,0 +1,89 @@
+"""
+This script applies an edit plan written by a dry run of a cleanup script (e.g. 'python src/fixers_pipeline.py --plan
+data_2025/plans/fixers_pipeline.jsonl' with WRITE = False). The planned edits are sent without downloading and analysing
+the items again, several items at once. Items edited since the plan was made are skipped as stale and have to be
+processed again by the cleanup script.
+
+Usage: python src/apply_plan.py --plan data_2025/plans/fixers_pipeline.jsonl [--resume]
+"""
+
+import os
+import sys
+import time
+from dotenv import load_dotenv
+from wikibaseintegrator import wbi_login
+from wikibaseintegrator.wbi_config import config as wbi_config
+
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.edit_plan as edit_plan
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+
+
+# number of items written at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
+
+load_dotenv()
+
+wbi_config['MEDIAWIKI_API_URL'] = 'https://wikihum.lab.dariah.pl/api.php'
+wbi_config['SPARQL_ENDPOINT_URL'] = 'https://wikihum.lab.dariah.pl/bigdata/sparql'
+wbi_config['WIKIBASE_URL'] = 'https://wikihum.lab.dariah.pl'
+
+WIKIDARIAH_CONSUMER_TOKEN = os.environ.get('WIKIDARIAH_CONSUMER_TOKEN')
+WIKIDARIAH_CONSUMER_SECRET = os.environ.get('WIKIDARIAH_CONSUMER_SECRET')
+WIKIDARIAH_ACCESS_TOKEN = os.environ.get('WIKIDARIAH_ACCESS_TOKEN')
+WIKIDARIAH_ACCESS_SECRET = os.environ.get('WIKIDARIAH_ACCESS_SECRET')
+
+
+
+if __name__ == '__main__':
+
+    start_time = time.time()
+    arguments = cli.parse_arguments(__doc__)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
+    if not arguments.plan:
+        sys.exit("The plan file has to be given with --plan")
+
+    login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
+                                        consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
+                                        access_token=WIKIDARIAH_ACCESS_TOKEN,
+                                        access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, input_path=arguments.plan)
+
+    report_path = 'data_2025/reports/00.3_apply_plan.txt'
+    report = report_writer.ReportWriter(report_path)
+    journal.attach(report)
+    report.write(f"{arguments.plan}\n")
+
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(sum(1 for entry in edit_plan.iter_plan(arguments.plan) if not journal.is_done(entry['id'])))
+    entries = (entry for entry in edit_plan.iter_plan(arguments.plan) if not journal.is_done(entry['id']))
+    outcomes = {}
+    for entry, outcome in tracker.track(edit_plan.apply_plan(entries, login=login_instance, max_workers=MAX_WRITERS)):
+        print(entry['id'], outcome)
+        report.write(f"{entry['id']} - {len(entry['calls'])} API calls - {outcome}\n")
+        # stale, missing and failed entries are not recorded, so that they are tried again with --resume
+        if outcome == 'applied':
+            journal.record(entry['id'], outcome=outcome)
+        outcome_type = 'error' if outcome.startswith('error') else outcome
+        outcomes[outcome_type] = outcomes.get(outcome_type, 0) + 1
+
+    journal.close()
+
+    report.write(' '.join(f"{outcome}: {number}" for outcome, number in outcomes.items()) + "\n")
+
+    profiler.close()
+    tracker.close()
+    exporter.close()
+    end_time = time.time()
+    execution_time = end_time - start_time
+
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n \n \n")
+    report.close()
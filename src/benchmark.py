@@ -0,0 +1,566 @@
+"""
+This script benchmarks the hot paths of the cleanup scripts. It times building and comparing statements, SIMC
+normalisation, rebuilding the Data Atlas Fontium references and parsing and serializing entity JSON. It also measures
+the throughput (items per second) of every fixer of tools/fixers.py, alone and all of them together, against the fake
+Wikibase server (tools/fake_wikibase.py) with injected latency: the items are downloaded, fixed and written with the
+shared tools by a loop of the benchmark. The scripts run the same fixers, but these runs do not include their reports,
+journals and write methods, and the moves and merges of ahp_prng_data_transfer.py are not covered. The deletion of the
+empty elements (ahp_prng_empty_elements_removal.py) is measured in the same way.
+The written items are then compared with the items stored by the server, and the script exits with code 1 when they
+differ, e.g. when a minimal write lost a change or the item did not get its new revision ID.
+The results are saved as JSON in data_2025/benchmarks. With --baseline the run is compared with the results of an
+earlier build, and the script exits with code 1 when any benchmark got slower by more than REGRESSION_THRESHOLD.
+
+The entities are read from FIXTURE_PATH, a JSON dump with one entity per line, which can be recorded from Wikibase with
+--record. Without the file, synthetic place items with many 'neighborhood with' (P84) and 'stated as' (P54) statements
+with references are used.
+
+Usage: python src/benchmark.py [--baseline data_2025/benchmarks/benchmark_<time>.json] [--record Q1 Q2 ...]
+"""
+
+import argparse
+import copy
+import gc
+import itertools
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections.abc import Callable
+import ujson
+from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
+from wikibaseintegrator.wbi_config import config as wbi_config
+from wikibaseintegrator.wbi_helpers import delete_page
+
+import tools.batch_fetcher as batch_fetcher
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.dump_scanner as dump_scanner
+import tools.entity_diff as entity_diff
+import tools.entity_records as entity_records
+import tools.fake_wikibase as fake_wikibase
+import tools.fixers as fixers
+import tools.http_client as http_client
+import tools.write_pool as write_pool
+from ahp_prng_data_transfer import add_prng, prepare_new_claim_data_from_claim
+from ahp_prng_empty_elements_removal import is_empty
+
+
+FIXTURE_PATH = 'data_2025/benchmarks/fixtures.json'
+RESULTS_DIRECTORY = 'data_2025/benchmarks'
+# size of the synthetic place items
+SYNTHETIC_ITEMS = 100
+NEIGHBORHOOD_CLAIMS = 40
+STATED_AS_CLAIMS = 20
+# every micro-benchmark is run REPEAT times CALLS calls, the median of the repeats is compared between the builds
+REPEAT = 5
+CALLS = 100
+# latency of the fake server in seconds
+LATENCY = 0.02
+WRITE_LATENCY = 0.1
+SERVER_RUN_ITEMS = 20
+MAX_WRITERS = 4
+# share by which a benchmark may get slower than the baseline before it is reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+wbi_config['MEDIAWIKI_API_URL'] = 'https://wikihum.lab.dariah.pl/api.php'
+wbi_config['SPARQL_ENDPOINT_URL'] = 'https://wikihum.lab.dariah.pl/bigdata/sparql'
+wbi_config['WIKIBASE_URL'] = 'https://wikihum.lab.dariah.pl'
+
+
+# fixers applied to the downloaded items before they are written, every fixer alone and all of them like in fixers_pipeline.py
+FIXER_RUNS = {fixer.__name__: [fixer] for fixer in fixers.FIXERS}
+FIXER_RUNS['all fixers'] = fixers.FIXERS
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    Parses the command line options of the benchmark
+
+    Returns
+    -------
+    argparse.Namespace
+        values of the options
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', metavar='PATH', help='results of an earlier run to compare with')
+    parser.add_argument('--output', metavar='PATH', help='file of the results, a new file in data_2025/benchmarks by default')
+    parser.add_argument('--record', metavar='ID', nargs='+', help='download the entities from Wikibase into the fixture file')
+    parser.add_argument('--skip-server-runs', action='store_true', help='run only the benchmarks of single functions')
+    return parser.parse_args()
+
+
+def get_snak(property_number: str, datatype: str, value) -> dict:
+    """
+    Builds the JSON of a snak with a value
+
+    Parameters
+    ----------
+    property_number : str
+        property of the snak
+    datatype : str
+        'wikibase-item', 'monolingualtext', 'time' or a string datatype (e.g. 'external-id')
+    value
+        ID of the item, (text, language) tuple, time or the string
+
+    Returns
+    -------
+    dict
+        JSON of the snak
+    """
+    if datatype == 'wikibase-item':
+        datavalue = {'value': {'entity-type': 'item', 'numeric-id': int(value[1:]), 'id': value}, 'type': 'wikibase-entityid'}
+    elif datatype == 'monolingualtext':
+        datavalue = {'value': {'text': value[0], 'language': value[1]}, 'type': 'monolingualtext'}
+    elif datatype == 'time':
+        datavalue = {'value': {'time': value, 'timezone': 0, 'before': 0, 'after': 0, 'precision': 11,
+                               'calendarmodel': 'http://www.wikidata.org/entity/Q1985727'}, 'type': 'time'}
+    else:
+        datavalue = {'value': value, 'type': 'string'}
+    return {'snaktype': 'value', 'property': property_number, 'datavalue': datavalue, 'datatype': datatype}
+
+
+def get_claim(entity_id: str, number: int, mainsnak: dict, qualifiers: list[dict], references: list[list[dict]]) -> dict:
+    """
+    Builds the JSON of a statement with the given qualifiers and references (lists of snaks)
+    """
+    claim = {
+        'mainsnak': mainsnak,
+        'type': 'statement',
+        'id': f'{entity_id}${uuid.uuid5(uuid.NAMESPACE_URL, f"{entity_id}/{number}")}',
+        'rank': 'normal',
+        'qualifiers': {snak['property']: [snak] for snak in qualifiers},
+        'qualifiers-order': [snak['property'] for snak in qualifiers],
+        'references': [{'snaks': {snak['property']: [snak] for snak in reference},
+                        'snaks-order': [snak['property'] for snak in reference]} for reference in references]
+    }
+    return fake_wikibase.prepare_claim(claim, entity_id)
+
+
+def build_place_item(number: int) -> dict:
+    """
+    Builds a synthetic place item on which every fixer has some work: an alias identical to the label, pairs of equal
+    'stated as' values, SIMC identifiers without the leading zeros, an AHP identifier with 'stated in' in the reference
+    and many 'neighborhood with' statements stated in Data Atlas Fontium
+
+    Parameters
+    ----------
+    number : int
+        numeric part of the ID of the item
+
+    Returns
+    -------
+    dict
+        JSON of the item
+    """
+    entity_id = f'Q{number}'
+    label = f'Miejscowość {number}'
+    fontium_reference = [get_snak(fixers.P_STATED_IN, 'wikibase-item', fixers.DATA_ATLAS_FONTIUM['value']['id']),
+                         get_snak('P60', 'string', f'{number}/1')]
+    retrieved = get_snak(fixers.P_RETRIEVED, 'time', '+2023-12-07T00:00:00Z')
+
+    claims = []
+    for index in range(NEIGHBORHOOD_CLAIMS):
+        mainsnak = get_snak('P84', 'wikibase-item', f'Q{100000 + number * NEIGHBORHOOD_CLAIMS + index}')
+        claims.append(get_claim(entity_id, len(claims), mainsnak, [], [fontium_reference]))
+    for index in range(STATED_AS_CLAIMS):
+        mainsnak = get_snak(fixers.P_STATED_AS, 'monolingualtext', (f'{label} {index // 2}', 'pl'))
+        qualifiers = [get_snak('P40', 'time', '+1600-00-00T00:00:00Z')]
+        claims.append(get_claim(entity_id, len(claims), mainsnak, qualifiers, [fontium_reference]))
+
+    simc_id = str(number)
+    simc_values = [simc_id] if number % 2 else [simc_id, '0' + simc_id]
+    for simc_value in simc_values:
+        mainsnak = get_snak(fixers.P_SIMC_ID, 'external-id', simc_value)
+        claims.append(get_claim(entity_id, len(claims), mainsnak, [], [[retrieved]]))
+    ahp_reference = [get_snak(fixers.P_REFERENCE_URL, 'url', f'https://atlasfontium.pl/ahp/{number}'),
+                     get_snak(fixers.P_FILENAME, 'string', 'miejscowosci_ahp.csv'), retrieved,
+                     get_snak(fixers.P_STATED_IN, 'wikibase-item', 'Q1')]
+    claims.append(get_claim(entity_id, len(claims), get_snak(fixers.P_AHP_ID, 'external-id', f'AHP{number}'), [],
+                            [ahp_reference]))
+
+    claims_json = {}
+    for claim in claims:
+        claims_json.setdefault(claim['mainsnak']['property'], []).append(claim)
+    return {
+        'type': 'item',
+        'id': entity_id,
+        'labels': {'pl': {'language': 'pl', 'value': label}, 'en': {'language': 'en', 'value': label}},
+        'descriptions': {'pl': {'language': 'pl', 'value': 'miejscowość'}},
+        'aliases': {'pl': [{'language': 'pl', 'value': label}, {'language': 'pl', 'value': f'{label} Wielka'}]},
+        'claims': claims_json,
+        'sitelinks': {},
+        'lastrevid': number,
+    }
+
+
+def record_fixture(entity_ids: list[str], path: str = FIXTURE_PATH):
+    """
+    Downloads the entities from Wikibase and saves them as the fixture, one entity per line
+
+    Parameters
+    ----------
+    entity_ids : list[str]
+        IDs of the entities
+    path : str
+        path of the fixture file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fixture_file:
+        for entity_json in batch_fetcher.get_entities_json(entity_ids):
+            if 'missing' not in entity_json:
+                fixture_file.write(ujson.dumps(entity_json, ensure_ascii=False) + '\n')
+
+
+def load_fixture(path: str = FIXTURE_PATH) -> list[dict]:
+    """
+    Reads the recorded entities, or builds the synthetic ones if the fixture file does not exist
+    """
+    if os.path.exists(path):
+        return list(dump_scanner.read_dump(path))
+    return [build_place_item(number) for number in range(1, SYNTHETIC_ITEMS + 1)]
+
+
+def time_calls(function: Callable, setup: Callable[[], tuple], calls: int = CALLS, repeat: int = REPEAT) -> dict:
+    """
+    Measures the time of a single call of the function. The arguments of every call are prepared by setup(), which is
+    not timed, so functions which change their arguments always get fresh ones. The garbage collector is disabled while
+    the calls are timed, like in timeit.
+
+    Parameters
+    ----------
+    function : Callable
+        benchmarked function
+    setup : Callable[[], tuple]
+        function returning the arguments of the next call
+    calls : int
+        number of calls in a repeat
+    repeat : int
+        number of repeats
+
+    Returns
+    -------
+    dict
+        median, minimum and mean of the average call time of the repeats, in seconds
+    """
+    durations = []
+    for _ in range(repeat):
+        arguments = [setup() for _ in range(calls)]
+        gc.collect()
+        gc.disable()
+        try:
+            total = 0.0
+            for call_arguments in arguments:
+                start = time.perf_counter()
+                function(*call_arguments)
+                total += time.perf_counter() - start
+        finally:
+            gc.enable()
+        durations.append(total / calls)
+
+    return {'median': statistics.median(durations), 'min': min(durations), 'mean': statistics.fmean(durations),
+            'calls': calls * repeat}
+
+
+def run_micro_benchmarks(fixture: list[dict]) -> dict[str, dict]:
+    """
+    Times the functions used by the scripts for every item, on the entities of the fixture
+
+    Parameters
+    ----------
+    fixture : list[dict]
+        JSON of the entities
+
+    Returns
+    -------
+    dict[str, dict]
+        timings of the benchmarks by their names
+    """
+    wbi = WikibaseIntegrator()
+    texts = [ujson.dumps(entity_json) for entity_json in fixture]
+    next_text = itertools.cycle(texts).__next__
+    next_json = itertools.cycle(fixture).__next__
+
+    def parse(text: str):
+        return wbi.item.new().from_json(ujson.loads(text))
+
+    parsed_entities = [parse(text) for text in texts]
+    next_entity = itertools.cycle(parsed_entities).__next__
+    all_claims = [claim for entity in parsed_entities for claim in entity.claims]
+    stated_as_pairs = []
+    for entity in parsed_entities:
+        claims_by_value = {}
+        for claim in entity.claims.get(fixers.P_STATED_AS):
+            claims_by_value.setdefault(claim.mainsnak.datavalue['value']['text'], []).append(claim)
+        stated_as_pairs.extend(tuple(claims[:2]) for claims in claims_by_value.values() if len(claims) > 1)
+    simc_ids = [str(number) for number in range(1, 1001)]
+
+    def get_fixed_entity() -> tuple:
+        entity = parse(next_text())
+        snapshot = entity_diff.take_snapshot(entity)
+        for fixer in fixers.FIXERS:
+            fixer().fix(entity)
+        return entity, snapshot
+
+    benchmarks = {
+        'entity.json_loads': (ujson.loads, lambda: (next_text(),)),
+        'entity.json_dumps': (ujson.dumps, lambda: (next_json(),)),
+        'entity.from_json': (lambda entity_json: wbi.item.new().from_json(entity_json), lambda: (ujson.loads(next_text()),)),
+        'entity_records.EntityRecord': (entity_records.EntityRecord, lambda: (ujson.loads(next_text()),)),
+        'entity_records.EntityRecord.from_text': (entity_records.EntityRecord.from_text, lambda: (next_text(),)),
+        'entity.get_json': (lambda entity: entity.get_json(), lambda: (next_entity(),)),
+        'entity_diff.take_snapshot': (entity_diff.take_snapshot, lambda: (next_entity(),)),
+        'entity_diff.diff_entity': (entity_diff.diff_entity, get_fixed_entity),
+        'ahp_prng_data_transfer.prepare_new_claim_data_from_claim': (prepare_new_claim_data_from_claim,
+                                                                     itertools.cycle([(claim,) for claim in all_claims]).__next__),
+        'ahp_prng_data_transfer.add_prng': (add_prng, lambda: (parse(next_text()), '1234567')),
+        'fixers.check_two_property_values_equality': (fixers.check_two_property_values_equality,
+                                                      itertools.cycle(stated_as_pairs).__next__ if stated_as_pairs else None),
+        'fixers.add_leading_zeros (1000 SIMC IDs)': (lambda values: [fixers.add_leading_zeros(value) for value in values],
+                                                    lambda: (simc_ids,)),
+        'fixers.replace_data_atlas_fontium_references': (fixers.replace_data_atlas_fontium_references,
+                                                         lambda: (parse(next_text()),)),
+    }
+    for fixer in fixers.FIXERS:
+        benchmarks[f'fixers.{fixer.__name__}.fix'] = (fixer().fix, lambda: (parse(next_text()),))
+
+    results = {}
+    for name, (function, setup) in benchmarks.items():
+        if setup is None:
+            print(f"{name} - skipped, no data in the fixture")
+            continue
+        results[name] = time_calls(function, setup)
+        print(f"{name}: {results[name]['median'] * 1e6:.1f} µs")
+    return results
+
+
+def run_fixers(fixture: list[dict], name: str, fixers_to_run: list[type[fixers.Fixer]]) -> dict:
+    """
+    Runs the fixers on the items of the fixture against the fake Wikibase: the items are downloaded in parallel, fixed in
+    memory and written with minimal writes by the write pool
+
+    Parameters
+    ----------
+    fixture : list[dict]
+        JSON of the entities
+    name : str
+        name of the run
+    fixers_to_run : list[type[fixers.Fixer]]
+        fixers applied to every item
+
+    Returns
+    -------
+    dict
+        number of items, duration, items per second and the counters of the fake server
+    """
+    entities_json = fixture[:SERVER_RUN_ITEMS]
+    fixers_instances = [fixer() for fixer in fixers_to_run]
+    with fake_wikibase.FakeWikibase(entities_json, latency=LATENCY, write_latency=WRITE_LATENCY, seed=0) as wikibase:
+        wikibase.configure()
+        login_instance = wbi_login.OAuth1(consumer_token='benchmark', consumer_secret='benchmark',
+                                          access_token='benchmark', access_secret='benchmark')
+        http_client.configure(login_instance)
+        wbi = WikibaseIntegrator(login=login_instance)
+
+        start = time.perf_counter()
+        futures = []
+        written_entities = []
+        with write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session()) as pool:
+            # the rate limit of the fetcher is a setting of the real server and would hide the speed of the code
+            for entity in concurrent_fetcher.fetch_entities(wbi, [entity_json['id'] for entity_json in entities_json],
+                                                            requests_per_second=0):
+                snapshot = entity_diff.take_snapshot(entity)
+                summaries = [fixer.summary for fixer in fixers_instances if fixer.fix(entity)[0]]
+                if summaries:
+                    futures.append(pool.submit(entity.id, entity_diff.write_entity, entity, snapshot,
+                                               summary='; '.join(summaries), maxlag=pool.maxlag))
+                    written_entities.append(entity)
+        for future in futures:
+            future.result()
+        duration = time.perf_counter() - start
+        stats = wikibase.get_stats()
+        mismatches = get_mismatches(wikibase, wbi, written_entities)
+
+    result = summarize_run(len(entities_json), duration, stats)
+    result['mismatches'] = mismatches
+    print(f"{name}: {result['items_per_second']:.1f} items/s, {result['requests_per_item']:.1f} requests per item")
+    if mismatches:
+        print(f"{name}: written entities differ from the server: {', '.join(mismatches)}")
+    return result
+
+
+def get_mismatches(wikibase: fake_wikibase.FakeWikibase, wbi: WikibaseIntegrator,
+                   written_entities: list[entities.item.ItemEntity]) -> list[str]:
+    """
+    Compares the written entities with the entities stored by the fake Wikibase, so that the runs also check
+    that the minimal writes leave the same data on the server as in the modified entities and that the entities got
+    the new revision IDs from the responses
+
+    Parameters
+    ----------
+    wikibase : fake_wikibase.FakeWikibase
+        server the entities were written to
+    wbi : WikibaseIntegrator
+        WikibaseIntegrator instance of the run
+    written_entities : list[entities.item.ItemEntity]
+        entities after their writes
+
+    Returns
+    -------
+    list[str]
+        ID of every entity which differs from the stored one, with the difference
+    """
+    mismatches = []
+    for entity in written_entities:
+        # the stored entity is loaded like a downloaded one and used as the snapshot, any planned call is a difference
+        stored_entity = wbi.item.new().from_json(copy.deepcopy(wikibase.entities[entity.id]))
+        if entity.lastrevid != stored_entity.lastrevid:
+            mismatches.append(f"{entity.id} revision {entity.lastrevid} instead of {stored_entity.lastrevid}")
+        calls = entity_diff.diff_entity(entity, entity_diff.take_snapshot(stored_entity))
+        if calls:
+            mismatches.append(f"{entity.id} {', '.join(call['action'] for call in calls)}")
+    return mismatches
+
+
+def run_empty_elements_removal(fixture: list[dict]) -> dict:
+    """
+    Runs the bulk deletion of ahp_prng_empty_elements_removal.py against the fake Wikibase: the items are downloaded in
+    batches and the empty ones are deleted by the write pool
+
+    Parameters
+    ----------
+    fixture : list[dict]
+        JSON of the entities, copied without their statements to make them empty
+
+    Returns
+    -------
+    dict
+        number of items, duration, items per second and the counters of the fake server
+    """
+    entities_json = [{'id': entity_json['id'], 'labels': entity_json.get('labels', {})} for entity_json in fixture[:SERVER_RUN_ITEMS]]
+    with fake_wikibase.FakeWikibase(entities_json, latency=LATENCY, write_latency=WRITE_LATENCY, seed=0) as wikibase:
+        wikibase.configure()
+        login_instance = wbi_login.OAuth1(consumer_token='benchmark', consumer_secret='benchmark',
+                                          access_token='benchmark', access_secret='benchmark')
+        http_client.configure(login_instance)
+
+        start = time.perf_counter()
+        futures = []
+        with write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session()) as pool:
+            for entity_json in batch_fetcher.get_entities_json([entity_json['id'] for entity_json in entities_json],
+                                                               props=['info', 'claims', 'sitelinks'], login=login_instance):
+                if is_empty(entity_json):
+                    futures.append(pool.submit(entity_json['id'], delete_page, pageid=entity_json['pageid'],
+                                               login=login_instance, maxlag=pool.maxlag))
+        for future in futures:
+            future.result()
+        duration = time.perf_counter() - start
+        stats = wikibase.get_stats()
+
+    result = summarize_run(len(entities_json), duration, stats)
+    print(f"empty elements removal: {result['items_per_second']:.1f} items/s")
+    return result
+
+
+def summarize_run(number_of_items: int, duration: float, stats: dict) -> dict:
+    """
+    Summarizes a run against the fake Wikibase
+    """
+    return {
+        'items': number_of_items,
+        'seconds': duration,
+        'items_per_second': number_of_items / duration,
+        'requests_per_item': sum(stats['requests'].values()) / number_of_items,
+        'max_in_progress': stats['max_in_progress'],
+        'errors': stats['errors']
+    }
+
+
+def get_commit() -> str | None:
+    """
+    Returns the hash of the current git commit, None outside of a git repository
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list[str]:
+    """
+    Compares the results with the baseline and prints the change of every benchmark
+
+    Parameters
+    ----------
+    results : dict
+        results of this run
+    baseline : dict
+        results of an earlier run
+    threshold : float
+        share by which a benchmark may get slower before it is reported
+
+    Returns
+    -------
+    list[str]
+        names of the benchmarks which got slower by more than the threshold
+    """
+    regressions = []
+    print(f"\nComparison with {baseline.get('commit') or 'the baseline'} (slowdown > {threshold:.0%} is a regression)")
+    changes = [(name, benchmark['median'] / baseline['benchmarks'][name]['median'])
+               for name, benchmark in results['benchmarks'].items() if name in baseline.get('benchmarks', {})]
+    changes += [(f'server_runs.{name}', baseline['server_runs'][name]['items_per_second'] / run['items_per_second'])
+                for name, run in results['server_runs'].items() if name in baseline.get('server_runs', {})]
+    for name, slowdown in changes:
+        is_regression = slowdown > 1 + threshold
+        if is_regression:
+            regressions.append(name)
+        print(f"{name}: {slowdown:.2f}x the time of the baseline{' - REGRESSION' if is_regression else ''}")
+    return regressions
+
+
+
+if __name__ == '__main__':
+
+    arguments = parse_arguments()
+
+    if arguments.record:
+        record_fixture(arguments.record)
+        print(f"{len(arguments.record)} entities recorded in {FIXTURE_PATH}")
+        sys.exit()
+
+    fixture = load_fixture()
+    print(f"{len(fixture)} entities in the fixture ({FIXTURE_PATH if os.path.exists(FIXTURE_PATH) else 'synthetic'})")
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'fixture': FIXTURE_PATH if os.path.exists(FIXTURE_PATH) else 'synthetic',
+        'entities': len(fixture),
+        'benchmarks': run_micro_benchmarks(fixture),
+        'server_runs': {}
+    }
+
+    if not arguments.skip_server_runs:
+        for name, fixers_to_run in FIXER_RUNS.items():
+            results['server_runs'][name] = run_fixers(fixture, name, fixers_to_run)
+        results['server_runs']['empty elements removal'] = run_empty_elements_removal(fixture)
+
+    mismatched_runs = [name for name, result in results['server_runs'].items() if result.get('mismatches')]
+
+    output_path = arguments.output or os.path.join(RESULTS_DIRECTORY, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as results_file:
+        results_file.write(ujson.dumps(results, indent=2) + '\n')
+    print(f"Results saved in {output_path}")
+
+    if arguments.baseline:
+        with open(arguments.baseline, encoding='utf-8') as baseline_file:
+            regressions = compare_results(results, ujson.load(baseline_file))
+        if regressions:
+            sys.exit(f"{len(regressions)} benchmarks got slower: {', '.join(regressions)}")
+
+    if mismatched_runs:
+        sys.exit(f"Written entities differ from the fake Wikibase in: {', '.join(mismatched_runs)}")
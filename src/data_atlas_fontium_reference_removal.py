@@ -5,16 +5,40 @@ standardize those references property 'stated as' with value 'Data Atlas Fontium
 
 import os
 import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from itertools import groupby
 from dotenv import load_dotenv
 from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
 from wikibaseintegrator.models import Claim, references, snaks
 from wikibaseintegrator.wbi_config import config as wbi_config
-from wikibaseintegrator.wbi_helpers import execute_sparql_query
-from wikibaseintegrator.wbi_exceptions import MWApiError, ModificationFailed
+
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.dump_scanner as dump_scanner
+import tools.edit_plan as edit_plan
+import tools.entity_cache as entity_cache
+import tools.entity_diff as entity_diff
+import tools.fixers as fixers
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.sparql as sparql
+import tools.statement_edits as statement_edits
+import tools.write_pool as write_pool
 
 
 
 WRITE = False
+# replace the references by the statement GUIDs and reference hashes from the results, without downloading the items
+DIRECT_REFERENCE_EDITS = False
+# number of items written at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
+# results of dump_scan.py (e.g. 'data_2025/dump_scan/data_atlas_fontium_references.csv') used instead of the SPARQL query, if set
+DETECTION_RESULTS = ''
 
 load_dotenv()
 
@@ -28,96 +52,193 @@ WIKIDARIAH_ACCESS_TOKEN = os.environ.get('WIKIDARIAH_ACCESS_TOKEN')
 WIKIDARIAH_ACCESS_SECRET = os.environ.get('WIKIDARIAH_ACCESS_SECRET')
 
 
-P_STATED_IN = 'P55'
-P_REFERENCE_URL = 'P2'
-P_FILENAME = 'P122'
-P_RETRIEVED = 'P48'
 
-DATA_ATLAS_FONTIUM = {'value': {'entity-type': 'item', 'numeric-id': 179149, 'id': 'Q179149'}, 'type': 'wikibase-entityid'}
+def group_statements_by_entity(results: Iterable[dict[str, str]], journal: checkpoint.CheckpointJournal) -> Iterator[tuple[str, str, set[str]]]:
+    """
+    Groups consecutive result rows of the same item, skipping the items already recorded in the journal
+
+    Parameters
+    ----------
+    results : Iterable[dict[str, str]]
+        rows with 'item' and 'statement' links, sorted by item
+    journal : checkpoint.CheckpointJournal
+        checkpoint journal of the script
+
+    Returns
+    -------
+    Iterator[tuple[str, str, set[str]]]
+        ID and link of every item together with IDs of its statements to change
+    """
+    for entity_link, rows in groupby(results, key=lambda result: result["item"]):
+        position_e = entity_link.rfind(r'/')
+        entity_id = entity_link[position_e+1:]
+        if journal.is_done(entity_id):
+            continue
+        claim_ids = set()
+        for row in rows:
+            claim_to_change_link = row["statement"]
+            position_c = claim_to_change_link.rfind(r'/')
+            claim_ids.add(claim_to_change_link[position_c+1:].replace('-', '$', 1))
+        yield entity_id, entity_link, claim_ids
+
+
+
+def set_references(rows: list[dict[str, str]], reference_to_add: references.Reference, login: wbi_login.OAuth1):
+    """
+    Replaces the references of a single item from the results, one 'wbsetreference' call per reference.
+    Stops at the first failed call, the error is reported by the write pool.
+
+    Parameters
+    ----------
+    rows : list[dict[str, str]]
+        rows of the results of the item
+    reference_to_add : references.Reference
+        standard reference to Data Atlas Fontium
+    login : wbi_login.OAuth1
+        login instance
+    """
+    for row in rows:
+        statement_guid = statement_edits.get_statement_guid(row["statement"])
+        reference_hash = statement_edits.get_reference_hash(row["reference"])
+        statement_edits.set_reference(statement_guid, reference_to_add, reference_hash=reference_hash, login=login)
+
+
+
+def replace_references_directly(results: Iterable[dict[str, str]], journal: checkpoint.CheckpointJournal,
+                                report: report_writer.ReportWriter, login: wbi_login.OAuth1, pool: write_pool.WritePool):
+    """
+    Replaces every reference from the results with the standard reference to Data Atlas Fontium with a single
+    'wbsetreference' call, without downloading the items. The references of every item are replaced by the write pool.
+
+    Parameters
+    ----------
+    results : Iterable[dict[str, str]]
+        rows with 'item', 'statement' and 'reference' links, sorted by item
+    journal : checkpoint.CheckpointJournal
+        checkpoint journal of the script
+    report : report_writer.ReportWriter
+        report of the script
+    login : wbi_login.OAuth1
+        login instance
+    pool : write_pool.WritePool
+        write pool of the script
+    """
+    reference_to_add = fixers.get_data_atlas_fontium_reference()
+    pending_writes = deque()
+
+    for entity_link, rows in groupby(results, key=lambda result: result["item"]):
+        position_e = entity_link.rfind(r'/')
+        entity_id = entity_link[position_e+1:]
+        if journal.is_done(entity_id):
+            continue
+
+        print(entity_link)
+        rows = list(rows)
+        future = None
+        write_message = ''
+        if WRITE:
+            future = pool.submit(entity_id, set_references, rows, reference_to_add, login)
+            write_message = f" - stated in Data Atlas Fontium removed from {len(rows)} references"
+
+        pending_writes.append((future, (entity_id, f"{entity_link}", write_message)))
+        write_pool.report_finished_writes(pending_writes, report, journal)
+
+    write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
 
 
 
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__, plan_unsupported="the references are replaced directly" if DIRECT_REFERENCE_EDITS else None)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
 
     report_path = 'data_2025/reports/06.1_data_atlas_fontium_references_modification.txt'
+    report = report_writer.ReportWriter(report_path)
+    plan = edit_plan.open_plan(arguments.plan, resume=arguments.resume) if not WRITE else None
+    journal.attach(report, plan)
+    pool = write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session())
 
-
-    # 188209 results before the changes
-    query = """ SELECT ?item ?statement WHERE {
+    # 188209 results before the changes, read in pages
+    where_clause = """
                     ?item ?property ?statement .
                     ?statement prov:wasDerivedFrom ?reference .
                     ?reference pr:P55 wd:Q179149 .
-                } ORDER BY ?item
             """
 
-    results = execute_sparql_query(query)
-    outputElements = []
-    outputClaims = []
-    for result in results["results"]["bindings"]:
-        outputElements.append(result["item"]["value"])
-        outputClaims.append(result["statement"]["value"])
-
-    for i in range(0, len(outputElements)):
-        entity_link = outputElements[i]
-        position_e = entity_link.rfind(r'/')
-        entity_id = entity_link[position_e+1:]
-        entity = wbi.item.get(entity_id=entity_id)
-
-        claim_to_change_link = outputClaims[i]
-        position_c = claim_to_change_link.rfind(r'/')
-        claim_to_change_id = claim_to_change_link[position_c+1:]
-        claim_to_change_id = claim_to_change_id.replace('-', '$', 1)
-
-        print(entity_link)
-        report_message = f"{entity_link}"
-
-        for p, statement in entity.claims.claims.items():
-            for claim in statement:
-                if claim.id != claim_to_change_id:
-                    continue
-                for reference in claim.references:
-                    if P_STATED_IN in reference.snaks_order and reference.snaks.get(P_STATED_IN)[0].datavalue == DATA_ATLAS_FONTIUM:
-                        snaks_references = snaks.Snaks()
-
-                        snak_reference_url = snaks.Snak(snaktype='value', property_number='P2', datavalue={'value': 'https://data.atlasfontium.pl/documents/202', 'type': 'string'}, datatype='url')
-                        snak_filename  = snaks.Snak(snaktype='value', property_number='P122', datavalue={'value': 'tabela-zbiorcza-miejscowosci-atlas-historyczny-polski-xvi-w', 'type': 'string'}, datatype='string')
-                        snak_retrieved = snaks.Snak(snaktype='value', property_number='P48', datavalue={'value': {'time': '+2023-12-07T00:00:00Z', 'timezone': 0, 'before': 0, 'after': 0, 'precision': 11, 'calendarmodel': 'http://www.wikidata.org/entity/Q1985727'}, 'type': 'time'}, datatype='time')
-                            
-                        snaks_references.add(snak_reference_url)
-                        snaks_references.add(snak_filename)
-                        snaks_references.add(snak_retrieved)
-          
-                        references_order = [P_REFERENCE_URL, P_FILENAME, P_RETRIEVED]
-                        reference_to_add = references.Reference(snaks=snaks_references, snaks_order=references_order)
-
-                        claim.references.remove(reference)
-                        claim.references.add(reference_to_add)
-
-                        if WRITE:
-                            try:
-                                entity.write()
-                                report_message += " - stated in Data Atlas Fontium removed from reference"
-                            except (MWApiError, ModificationFailed) as e:
-                                print(" - error writing to Wikibase")
-                                report_message += f" - error writing to Wikibase {e}"
-
-                        with open(report_path, 'a', encoding='utf-8') as report:
-                            report.write(report_message + "\n")
-
-
-
+    # the results are read while the main loop runs
+    profiler.start_phase('main loop')
+    if DETECTION_RESULTS:
+        results = dump_scanner.iter_detection_rows(DETECTION_RESULTS)
+        tracker = progress.ProgressTracker(None)
+    else:
+        results = sparql.iter_query_rows(where_clause, ['item', 'statement', 'reference'])
+        tracker = progress.ProgressTracker(sparql.count_query_rows(where_clause, ['item', 'statement', 'reference']))
+    # the progress is counted in references
+    results = tracker.track(results)
+
+    if DIRECT_REFERENCE_EDITS:
+        replace_references_directly(results, journal, report, login_instance, pool)
+    else:
+        # items are fetched while the results are read, the groups wait in the queue until their items arrive
+        groups = deque()
+        pending_writes = deque()
+
+        def entity_ids_to_fetch() -> Iterator[str]:
+            for entity_id, entity_link, claim_ids in group_statements_by_entity(results, journal):
+                groups.append((entity_link, claim_ids))
+                yield entity_id
+
+        for entity in concurrent_fetcher.fetch_entities(wbi, entity_ids_to_fetch(), ordered=True, cache=cache):
+            entity_link, claim_ids = groups.popleft()
+            snapshot = entity_diff.take_snapshot(entity) if plan else None
+
+            print(entity_link)
+
+            # the item is written by the write pool, it is reported when the write is finished
+            future = None
+            report_message = ''
+            write_message = ''
+            number_of_references = fixers.replace_data_atlas_fontium_references(entity, claim_ids)
+            if number_of_references:
+                report_message = f"{entity_link}"
+                if WRITE:
+                    future = pool.submit(entity.id, entity.write, maxlag=pool.maxlag)
+                    write_message = f" - stated in Data Atlas Fontium removed from {number_of_references} references"
+                elif plan:
+                    plan.add_entity(entity, snapshot)
+
+            pending_writes.append((future, (entity.id, report_message, write_message)))
+            write_pool.report_finished_writes(pending_writes, report, journal)
+
+        write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
+
+    pool.close()
+    journal.close()
+    cache.close()
+    if plan:
+        plan.close()
+
+
+
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n\n\n\n\n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n\n\n\n\n")
+    report.close()
 
 
@@ -0,0 +1,38 @@
+"""
+This script searches a WikiHum JSON dump for the problems fixed by the cleanup scripts (missing labels and descriptions, aliases
+identical as labels, duplicated 'stated as' values, too short or duplicated SIMC IDs and references to Data Atlas Fontium)
+without sending any requests to WikiHum. The results are saved in CSV files, which can be used by the cleanup scripts
+instead of their SPARQL queries.
+"""
+
+import os
+import time
+
+import tools.dump_scanner as dump_scanner
+
+
+WIKIBASE_URL = 'https://wikihum.lab.dariah.pl'
+
+
+
+if __name__ == '__main__':
+
+    start_time = time.time()
+
+    dump_path = 'data_2025/dump/wikihum.json.gz'
+    output_directory = 'data_2025/dump_scan'
+    report_path = 'data_2025/reports/00.1_dump_scan.txt'
+
+    os.makedirs(output_directory, exist_ok=True)
+
+    detectors = [detector(WIKIBASE_URL) for detector in dump_scanner.DETECTORS]
+    number_of_entities = dump_scanner.scan_dump(dump_path, output_directory, detectors)
+
+    print(f"{number_of_entities} entities scanned")
+
+    end_time = time.time()
+    execution_time = end_time - start_time
+
+    with open(report_path, 'a', encoding='utf-8') as report:
+        report.write(f"{dump_path} - {number_of_entities} entities scanned\n")
+        report.write(f"Execution time: {time.strftime('%H:%M:%S', time.gmtime(execution_time))} s.\n")
@@ -5,16 +5,40 @@ This script modifies the references to the aHP ID external identifier. So far th
 
 import os
 import time
+from collections import deque
+from collections.abc import Iterable
+from itertools import groupby
 from dotenv import load_dotenv
 from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
 from wikibaseintegrator.models import Claim, references, snaks
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_helpers import execute_sparql_query
-from wikibaseintegrator.wbi_exceptions import MWApiError, ModificationFailed
+
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.edit_plan as edit_plan
+import tools.entity_cache as entity_cache
+import tools.entity_diff as entity_diff
+import tools.fixers as fixers
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.sparql as sparql
+import tools.statement_edits as statement_edits
+import tools.write_pool as write_pool
 
 
 
 WRITE = False
+# replace the references by the statement GUIDs and reference hashes from SPARQL, without downloading the items.
+# Only the references with 'stated in' are replaced, the other references of the AHP ID statement are kept, while the
+# default mode clears all the references of the statement and keeps the single rebuilt reference
+DIRECT_REFERENCE_EDITS = False
+# number of items written at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
 
 load_dotenv()
 
@@ -33,74 +57,225 @@ P_REFERENCE_URL = 'P2'
 P_FILENAME = 'P122'
 P_RETRIEVED = 'P48'
 
+# reference values of the AHP ID statements, with the full time value of 'retrieved'
+DIRECT_WHERE_CLAUSE = """
+                    ?item p:P81 ?statement .
+                    ?statement prov:wasDerivedFrom ?reference .
+                    ?reference pr:P55 ?statedIn ;
+                               pr:P2 ?url ;
+                               pr:P122 ?filename ;
+                               prv:P48 ?retrieved .
+                    ?retrieved wikibase:timeValue ?time ;
+                               wikibase:timePrecision ?precision ;
+                               wikibase:timeTimezone ?timezone ;
+                               wikibase:timeCalendarModel ?calendar .
+            """
+DIRECT_VARIABLES = ['item', 'statement', 'reference', 'url', 'filename', 'time', 'precision', 'timezone', 'calendar']
+
+
+
+def prepare_reference_from_result(result: dict[str, str]) -> references.Reference:
+    """
+    Prepares the reference consisting of 'reference URL', 'filename' and 'retrieved' from the values in the SPARQL result
+
+    Parameters
+    ----------
+    result : dict[str, str]
+        row of the results of DIRECT_WHERE_CLAUSE
+
+    Returns
+    -------
+    references.Reference
+        new reference
+    """
+    retrieved_time = result["time"].lstrip('+')
+    if '.' in retrieved_time:
+        # fractional seconds added by the query service
+        retrieved_time = retrieved_time[:retrieved_time.index('.')] + 'Z'
+    retrieved_value = {'time': '+' + retrieved_time, 'timezone': int(result["timezone"]), 'before': 0, 'after': 0,
+                       'precision': int(result["precision"]), 'calendarmodel': result["calendar"]}
+
+    snaks_references = snaks.Snaks()
+    snaks_references.add(snaks.Snak(snaktype='value', property_number=P_REFERENCE_URL, datavalue={'value': result["url"], 'type': 'string'}, datatype='url'))
+    snaks_references.add(snaks.Snak(snaktype='value', property_number=P_FILENAME, datavalue={'value': result["filename"], 'type': 'string'}, datatype='string'))
+    snaks_references.add(snaks.Snak(snaktype='value', property_number=P_RETRIEVED, datavalue={'value': retrieved_value, 'type': 'time'}, datatype='time'))
+
+    references_order = [P_REFERENCE_URL, P_FILENAME, P_RETRIEVED]
+    return references.Reference(snaks=snaks_references, snaks_order=references_order)
+
+
+
+def get_unique_references(rows: Iterable[dict[str, str]]) -> list[dict[str, str]]:
+    """
+    Keeps the first row of every reference. A reference with several values of 'reference URL', 'filename' or 'retrieved'
+    gives one row per combination of the values, the reference is rebuilt from the first value of every property.
+
+    Parameters
+    ----------
+    rows : Iterable[dict[str, str]]
+        rows of the results of DIRECT_WHERE_CLAUSE
+
+    Returns
+    -------
+    list[dict[str, str]]
+        one row per statement and reference
+    """
+    unique_rows = {}
+    for row in rows:
+        unique_rows.setdefault((row["statement"], row["reference"]), row)
+    return list(unique_rows.values())
+
+
+
+def set_references(rows: list[dict[str, str]], login: wbi_login.OAuth1):
+    """
+    Replaces the references of a single item from the results, one 'wbsetreference' call per reference.
+    Stops at the first failed call, the error is reported by the write pool.
+
+    Parameters
+    ----------
+    rows : list[dict[str, str]]
+        rows of the results of DIRECT_WHERE_CLAUSE of the item, one row per reference
+    login : wbi_login.OAuth1
+        login instance
+    """
+    for row in rows:
+        statement_guid = statement_edits.get_statement_guid(row["statement"])
+        reference_hash = statement_edits.get_reference_hash(row["reference"])
+        reference_to_add = prepare_reference_from_result(row)
+        statement_edits.set_reference(statement_guid, reference_to_add, reference_hash=reference_hash, login=login)
+
+
+
+def replace_references_directly(results: Iterable[dict[str, str]], journal: checkpoint.CheckpointJournal,
+                                report: report_writer.ReportWriter, login: wbi_login.OAuth1, pool: write_pool.WritePool):
+    """
+    Replaces every reference from the results with a reference without 'stated in' with a single 'wbsetreference' call,
+    without downloading the items. The references of every item are replaced by the write pool.
+
+    Parameters
+    ----------
+    results : Iterable[dict[str, str]]
+        rows of the results of DIRECT_WHERE_CLAUSE, sorted by item
+    journal : checkpoint.CheckpointJournal
+        checkpoint journal of the script
+    report : report_writer.ReportWriter
+        report of the script
+    login : wbi_login.OAuth1
+        login instance
+    pool : write_pool.WritePool
+        write pool of the script
+    """
+    pending_writes = deque()
+    for entity_link, rows in groupby(results, key=lambda result: result["item"]):
+        position = entity_link.rfind(r'/')
+        entity_id = entity_link[position+1:]
+        if journal.is_done(entity_id):
+            continue
+
+        print(entity_link)
+        rows = get_unique_references(rows)
+        future = None
+        write_message = ''
+        if WRITE:
+            future = pool.submit(entity_id, set_references, rows, login)
+            write_message = f" - stated in removed from {len(rows)} references"
+
+        pending_writes.append((future, (entity_id, f"{entity_link}", write_message)))
+        write_pool.report_finished_writes(pending_writes, report, journal)
+
+    write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
+
 
 
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__, plan_unsupported="the references are replaced directly" if DIRECT_REFERENCE_EDITS else None)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
 
     report_path = 'data_2025/reports/05.1_external_ID_AHP_references_modification.txt'
+    report = report_writer.ReportWriter(report_path)
+    plan = edit_plan.open_plan(arguments.plan, resume=arguments.resume) if not WRITE else None
+    journal.attach(report, plan)
+    pool = write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session())
 
+    if DIRECT_REFERENCE_EDITS:
+        profiler.start_phase('main loop')
+        tracker = progress.ProgressTracker(sparql.count_query_rows(DIRECT_WHERE_CLAUSE, DIRECT_VARIABLES))
+        results = tracker.track(sparql.iter_query_rows(DIRECT_WHERE_CLAUSE, DIRECT_VARIABLES))
+        replace_references_directly(results, journal, report, login_instance, pool)
+    else:
+        query = """ SELECT ?item ?statedIn WHERE {
+                        ?item p:P81 ?statement .
+                        ?statement prov:wasDerivedFrom ?reference .
+                        ?reference pr:P55 ?statedIn
+                    } ORDER BY ?item
+                """
 
-    query = """ SELECT ?item ?statedIn WHERE {
-                    ?item p:P81 ?statement .
-                    ?statement prov:wasDerivedFrom ?reference .
-                    ?reference pr:P55 ?statedIn
-                } ORDER BY ?item
-            """
-
-    results = execute_sparql_query(query)
-    output = []
-    for result in results["results"]["bindings"]:
-        output.append(result["item"]["value"])
-
-    for i in range(0, len(output)):
-        entity_link = output[i]
-        position = entity_link.rfind(r'/')
-        entity_id = entity_link[position+1:]
-        entity = wbi.item.get(entity_id=entity_id)
+        results = execute_sparql_query(query)
+        entity_links = {}
+        for result in results["results"]["bindings"]:
+            entity_link = result["item"]["value"]
+            position = entity_link.rfind(r'/')
+            entity_id = entity_link[position+1:]
+            if not journal.is_done(entity_id):
+                entity_links[entity_id] = entity_link
 
-        print(entity_link)
-        report_message = f"{entity_link}"
+        fixer = fixers.ExternalIdAhpReferencesFixer()
+        profiler.start_phase('main loop')
+        tracker = progress.ProgressTracker(len(entity_links))
+        pending_writes = deque()
+        for entity in tracker.track(concurrent_fetcher.fetch_entities(wbi, entity_links.keys(), ordered=True, cache=cache)):
+            entity_link = entity_links[entity.id]
+            snapshot = entity_diff.take_snapshot(entity) if plan else None
 
-        ahp_id_claim = entity.claims.get(P_AHP_ID)[0]
-        reference = ahp_id_claim.references.references[0]
+            print(entity_link)
 
-        snaks_references = snaks.Snaks()
-        snaks_references.add(reference.snaks.get(P_REFERENCE_URL)[0])
-        snaks_references.add(reference.snaks.get(P_FILENAME)[0])
-        snaks_references.add(reference.snaks.get(P_RETRIEVED)[0])
+            is_changed, messages = fixer.fix(entity)
+            if not messages:
+                # the query results may be older than the item
+                messages = ["no 'stated in' in the reference of AHP ID any more, skipped"]
+            report_message = " - ".join([entity_link] + messages)
 
-        references_order = [P_REFERENCE_URL, P_FILENAME, P_RETRIEVED]
-        reference_to_add = references.Reference(snaks=snaks_references, snaks_order=references_order)
+            # the item is written by the write pool, it is reported when the write is finished
+            future = None
+            if WRITE and is_changed:
+                future = pool.submit(entity.id, entity.write, maxlag=pool.maxlag)
+            elif plan and is_changed:
+                plan.add_entity(entity, snapshot)
 
-        ahp_id_claim.references.clear()
-        ahp_id_claim.references.add(reference_to_add)
+            pending_writes.append((future, (entity.id, report_message, '')))
+            write_pool.report_finished_writes(pending_writes, report, journal)
 
-        if WRITE:
-            try:
-                entity.write()
-                report_message += " - stated in removed from reference"
-                print("stated in removed from reference")
-            except (MWApiError, ModificationFailed) as e:
-                print(" - error writing to Wikibase")
-                report_message += f" - error writing to Wikibase {e}"
+        write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
 
-        with open(report_path, 'a', encoding='utf-8') as report:
-            report.write(report_message + "\n")
+    pool.close()
+    journal.close()
+    cache.close()
+    if plan:
+        plan.close()
 
 
 
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n \n \n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n \n \n")
+    report.close()
 
 
@@ -1,14 +1,26 @@
 """
 This script searches for missing english and polish labels and values and saves the data about incomplete elements in .xlsx file.
+The incomplete elements are streamed to a CSV file while the scan runs, and the .xlsx file is written from it at the end.
 """
 
+import csv
+import glob
 import os
 import time
 from dotenv import load_dotenv
-from openpyxl import load_workbook
-from wikibaseintegrator import WikibaseIntegrator, wbi_login
+from wikibaseintegrator import wbi_login
 from wikibaseintegrator.wbi_config import config as wbi_config
-from wikibaseintegrator.wbi_exceptions import MWApiError, MissingEntityException
+
+import tools.batch_fetcher as batch_fetcher
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.http_client as http_client
+import tools.id_space as id_space
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.sharding as sharding
 
 
 load_dotenv()
@@ -22,47 +34,170 @@ WIKIDARIAH_CONSUMER_SECRET = os.environ.get('WIKIDARIAH_CONSUMER_SECRET')
 WIKIDARIAH_ACCESS_TOKEN = os.environ.get('WIKIDARIAH_ACCESS_TOKEN')
 WIKIDARIAH_ACCESS_SECRET = os.environ.get('WIKIDARIAH_ACCESS_SECRET')
 
+LANGUAGES = ['pl', 'en']
+# number of processes scanning separate ranges of IDs, the scan runs in a single process if 1
+NUMBER_OF_SHARDS = 1
+
+TABLE_PATH = 'data_2025/Missing_data_Q_without_label_or_description.csv'
+TABLE_HEADER = ['link', 'id', 'label_pl', 'label_en', 'desc_pl', 'desc_en']
+WORKBOOK_PATH = 'data_2025/Missing_data_Q_without_label_or_description.xlsx'
+SHARDS_DIRECTORY = 'data_2025/shards'
+SHARD_FILE_PREFIX = 'Missing_data'
+
+
+
+def get_login() -> wbi_login.OAuth1:
+    """
+    Logs in to WikiHum with the OAuth credentials from the environment
+
+    Returns
+    -------
+    wbi_login.OAuth1
+        login instance
+    """
+    login = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
+                             consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
+                             access_token=WIKIDARIAH_ACCESS_TOKEN,
+                             access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login)
+    return login
+
+
+def find_incomplete_items(entity_ids: list[str], login: wbi_login.OAuth1, journal: checkpoint.CheckpointJournal,
+                          table: report_writer.CsvTableWriter) -> int:
+    """
+    Searches for items without polish or english label or description and streams their rows to the table. Every checked
+    item is recorded in the journal, which flushes the table before it is synced.
+
+    Parameters
+    ----------
+    entity_ids : list[str]
+        IDs of the items to check
+    login : wbi_login.OAuth1
+        login instance
+    journal : checkpoint.CheckpointJournal
+        checkpoint journal of the scan, with the table attached
+    table : report_writer.CsvTableWriter
+        table of the incomplete items
+
+    Returns
+    -------
+    int
+        number of incomplete items
+    """
+    number_of_rows = 0
+    tracker = progress.ProgressTracker(len(entity_ids))
+    records = tracker.track(batch_fetcher.get_labels_and_descriptions(entity_ids, languages=LANGUAGES, login=login))
+
+    # batches which cannot be downloaded are retried and reported by batch_fetcher, their items are not recorded
+    # in the journal, so they are checked again with --resume
+    for record in records:
+        print(record.id)
+        label_pl = record.labels.get('pl')
+        label_en = record.labels.get('en')
+        desc_pl = record.descriptions.get('pl')
+        desc_en = record.descriptions.get('en')
+        if not label_pl or not label_en or not desc_pl or not desc_en:
+            link = "https://wikihum.lab.dariah.pl/wiki/Item:" + str(record.id)
+            table.append([link, str(record.id), str(label_pl), str(label_en), str(desc_pl), str(desc_en)])
+            number_of_rows += 1
+            journal.record(record.id, outcome='incomplete')
+        else:
+            journal.record(record.id)
+
+    tracker.close()
+    return number_of_rows
+
+
+def scan_shard(entity_ids: list[str], partial_path: str):
+    """
+    Searches for incomplete items in a single shard and streams them to a partial CSV file
+
+    Parameters
+    ----------
+    entity_ids : list[str]
+        IDs of the items in the shard
+    partial_path : str
+        path of the partial file
+    """
+    journal = checkpoint.open_journal(__file__, resume=True)
+    table = report_writer.CsvTableWriter(partial_path)
+    journal.attach(table)
+    find_incomplete_items(entity_ids, get_login(), journal, table)
+    journal.close()
+    table.close()
+
+
+def get_partial_paths() -> list[str]:
+    """
+    Returns the paths of the partial files of the shards in the order of the shards
+    """
+    return sorted(glob.glob(os.path.join(SHARDS_DIRECTORY, f'{SHARD_FILE_PREFIX}_*.csv')))
+
+
+def merge_partial_tables(table: report_writer.CsvTableWriter):
+    """
+    Appends the rows of the partial files of the shards to the table and removes the partial files. The files left by
+    an interrupted sharded run are merged the same way when the scan is resumed.
+
+    Parameters
+    ----------
+    table : report_writer.CsvTableWriter
+        table of the incomplete items
+    """
+    partial_paths = get_partial_paths()
+    for row in sharding.merge_shards(partial_paths):
+        table.append(row)
+    table.flush()
+    for partial_path in partial_paths:
+        os.remove(partial_path)
+
 
 
 if __name__ == '__main__':
     
     start_time = time.time()
-
-    login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
-                                        consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
-                                        access_token=WIKIDARIAH_ACCESS_TOKEN,
-                                        access_secret=WIKIDARIAH_ACCESS_SECRET)
-    wbi = WikibaseIntegrator(login=login_instance)
-
-    file_path = 'data_2025/Missing_data.xlsx'
-    file_workbook = load_workbook(file_path)
-    work_sheet = file_workbook['Q_without_label_or_desctiption']
-
-    i = 1
-    row_number = 1
-    while i < 182020:
-        entity_id = "Q" + str(i)
-        print(entity_id)
-        try: 
-            wd_item = wbi.item.get(entity_id=entity_id)
-            label_pl = wd_item.labels.get('pl')
-            label_en = wd_item.labels.get('en')
-            desc_pl = wd_item.descriptions.get('pl')
-            desc_en = wd_item.descriptions.get('en')
-            if not label_pl or not label_en or not desc_pl or not desc_en:
-                link = "https://wikihum.lab.dariah.pl/wiki/Item:" + str(entity_id)
-                row = [link, str(entity_id), str(label_pl), str(label_en), str(desc_pl), str(desc_en)]
-                work_sheet.append(row)
-
-        except (KeyError, MissingEntityException) as wb_error:
-            print(f'ERROR: {wb_error}')
-        i += 1
-
-    file_workbook.save('data_2025/Missing_data.xlsx')
-
-
+    arguments = cli.parse_arguments(__doc__)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
+
+    login_instance = get_login()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume)
+    # rows found before an interruption are kept in the table when the scan is resumed
+    table = report_writer.CsvTableWriter(TABLE_PATH, header=TABLE_HEADER, append=arguments.resume)
+    if arguments.resume:
+        merge_partial_tables(table)
+    else:
+        for partial_path in get_partial_paths():
+            os.remove(partial_path)
+
+    entity_ids = id_space.to_entity_ids(id_space.get_existing_entity_numbers('Item', login=login_instance))
+    entity_ids = [entity_id for entity_id in entity_ids if not journal.is_done(entity_id)]
+    print(f"{len(entity_ids)} items to check")
+
+    profiler.start_phase('main loop')
+    if NUMBER_OF_SHARDS > 1:
+        journal.close()
+        shards = sharding.split_into_shards(entity_ids, NUMBER_OF_SHARDS)
+        sharding.run_sharded(scan_shard, shards, SHARDS_DIRECTORY, SHARD_FILE_PREFIX)
+        merge_partial_tables(table)
+    else:
+        journal.attach(table)
+        find_incomplete_items(entity_ids, login_instance, journal, table)
+        journal.close()
+    table.close()
+
+    # the workbook is written next to Missing_data.xlsx, whose other sheets are left untouched
+    with open(TABLE_PATH, encoding='utf-8', newline='') as table_file:
+        with report_writer.open_table_writer(WORKBOOK_PATH, 'Q_without_label_or_desctiption') as workbook:
+            for row in csv.reader(table_file):
+                workbook.append(row)
+
+
+    profiler.close()
+    exporter.close()
     end_time = time.time()
     elapsed_time = end_time - start_time
     print(f'Czas wykonania programu: {time.strftime("%H:%M:%S", time.gmtime(elapsed_time))} s.')
     
-
@@ -0,0 +1,167 @@
+"""
+This script runs several cleanup rules (fixers) in a single pass. Candidate items of all the fixers are downloaded once,
+every fixer is applied to the item in memory and the item is written once, with the summaries of all the fixers that
+changed it.
+"""
+
+import os
+import time
+from collections import deque
+from dotenv import load_dotenv
+from wikibaseintegrator import WikibaseIntegrator, wbi_login
+from wikibaseintegrator.wbi_config import config as wbi_config
+
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.edit_plan as edit_plan
+import tools.entity_cache as entity_cache
+import tools.entity_diff as entity_diff
+import tools.fixers as fixers
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.sparql as sparql
+import tools.write_pool as write_pool
+
+
+WRITE = False
+# send only the changed parts of the entities (tools/entity_diff.py) instead of the whole entities
+MINIMAL_WRITES = True
+# number of items written at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
+# fixers applied to every candidate item, in this order
+FIXERS = [fixer() for fixer in fixers.FIXERS]
+
+load_dotenv()
+
+wbi_config['MEDIAWIKI_API_URL'] = 'https://wikihum.lab.dariah.pl/api.php'
+wbi_config['SPARQL_ENDPOINT_URL'] = 'https://wikihum.lab.dariah.pl/bigdata/sparql'
+wbi_config['WIKIBASE_URL'] = 'https://wikihum.lab.dariah.pl'
+
+WIKIDARIAH_CONSUMER_TOKEN = os.environ.get('WIKIDARIAH_CONSUMER_TOKEN')
+WIKIDARIAH_CONSUMER_SECRET = os.environ.get('WIKIDARIAH_CONSUMER_SECRET')
+WIKIDARIAH_ACCESS_TOKEN = os.environ.get('WIKIDARIAH_ACCESS_TOKEN')
+WIKIDARIAH_ACCESS_SECRET = os.environ.get('WIKIDARIAH_ACCESS_SECRET')
+
+
+
+def get_sort_key(entity_id: str) -> tuple[str, int]:
+    """
+    Returns the key sorting the entity IDs by their prefix and number, e.g. ('Q', 123) for 'Q123'
+    """
+    return entity_id[0], int(entity_id[1:])
+
+
+def find_candidates(fixers_to_run: list[fixers.Fixer], journal: checkpoint.CheckpointJournal) -> dict[str, str]:
+    """
+    Collects candidate items of all the fixers, skipping the items already recorded in the journal
+
+    Parameters
+    ----------
+    fixers_to_run : list[fixers.Fixer]
+        fixers of the pipeline
+    journal : checkpoint.CheckpointJournal
+        checkpoint journal of the pipeline
+
+    Returns
+    -------
+    dict[str, str]
+        links of the candidate items by their IDs, sorted by the prefix and number of the ID
+    """
+    entity_links = {}
+    for fixer in fixers_to_run:
+        for result in sparql.iter_query_rows(fixer.where_clause, ['item']):
+            entity_link = result["item"]
+            position = entity_link.rfind(r'/')
+            entity_id = entity_link[position+1:]
+            if not journal.is_done(entity_id):
+                entity_links[entity_id] = entity_link
+        print(f"{type(fixer).__name__}: {len(entity_links)} candidate items in total")
+
+    return {entity_id: entity_links[entity_id] for entity_id in sorted(entity_links, key=get_sort_key)}
+
+
+if __name__ == '__main__':
+
+    start_time = time.time()
+    arguments = cli.parse_arguments(__doc__)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
+
+    login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
+                                        consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
+                                        access_token=WIKIDARIAH_ACCESS_TOKEN,
+                                        access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
+    wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
+
+    report_path = 'data_2025/reports/00.2_fixers_pipeline.txt'
+    report = report_writer.ReportWriter(report_path)
+    plan = edit_plan.open_plan(arguments.plan, resume=arguments.resume) if not WRITE else None
+    journal.attach(report, plan)
+
+    entity_links = find_candidates(FIXERS, journal)
+    pool = write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session())
+    pending_writes = deque()
+
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(len(entity_links))
+
+    for entity in tracker.track(concurrent_fetcher.fetch_entities(wbi, entity_links.keys(), ordered=True, cache=cache)):
+        snapshot = entity_diff.take_snapshot(entity)
+        entity_link = entity_links[entity.id]
+
+        print(entity_link)
+        report_message = f"{entity_link}"
+
+        summaries = []
+        try:
+            for fixer in FIXERS:
+                changed, messages = fixer.fix(entity)
+                if changed:
+                    summaries.append(fixer.summary)
+                for message in messages:
+                    report_message += f" - {message}"
+        except Exception as e:
+            # a malformed item is reported and left unchanged, it is not recorded in the journal
+            print(f"{entity.id} - error in {type(fixer).__name__}")
+            pending_writes.append((None, (None, report_message + f" - error in {type(fixer).__name__}: {e!r}", '')))
+            write_pool.report_finished_writes(pending_writes, report, journal)
+            continue
+
+        future = None
+        if summaries:
+            if WRITE:
+                future = pool.submit(entity.id, entity_diff.write_entity, entity, snapshot, minimal=MINIMAL_WRITES,
+                                     summary='; '.join(summaries), maxlag=pool.maxlag)
+            else:
+                report_message += " - changes prepared"
+                if plan:
+                    plan.add_entity(entity, snapshot, summary='; '.join(summaries))
+
+        # items are reported after the earlier writes have finished, so that the report and the journal keep their order
+        pending_writes.append((future, (entity.id, report_message, " - changes written" if future is not None else '')))
+        write_pool.report_finished_writes(pending_writes, report, journal)
+
+    pool.close()
+    write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
+    journal.close()
+    cache.close()
+    if plan:
+        plan.close()
+
+
+    profiler.close()
+    tracker.close()
+    exporter.close()
+    end_time = time.time()
+    execution_time = end_time - start_time
+
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n \n \n")
+    report.close()
@@ -8,6 +8,8 @@ from dotenv import load_dotenv
 from wikibaseintegrator import WikibaseIntegrator, wbi_login
 from wikibaseintegrator.wbi_config import config as wbi_config
 
+import tools.http_client as http_client
+
 
 load_dotenv()
 
@@ -26,6 +28,7 @@ login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+http_client.configure(login_instance)
 wbi = WikibaseIntegrator(login=login_instance)
 item_link = "https://wikihum.lab.dariah.pl/wiki/Item:Q17375"
 item_id = "Q179488"
@@ -11,16 +11,32 @@ This script replaces itemB with itemC in the property P84 in itemA and checks if
 import os
 import pandas as pd 
 import time
+from collections import deque
 from dotenv import load_dotenv
-from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
+from wikibaseintegrator import WikibaseIntegrator, wbi_login
 from wikibaseintegrator.models import references, snaks
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_helpers import execute_sparql_query
-from wikibaseintegrator.wbi_exceptions import MWApiError, ModificationFailed
+
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.edit_plan as edit_plan
+import tools.entity_cache as entity_cache
+import tools.entity_diff as entity_diff
+import tools.entity_records as entity_records
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.write_pool as write_pool
 
 
 
 WRITE = False
+# number of items written at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
 
 load_dotenv()
 
@@ -37,14 +53,14 @@ WIKIDARIAH_ACCESS_SECRET = os.environ.get('WIKIDARIAH_ACCESS_SECRET')
 P_NEIGHBORHOOD_WITH = 'P84'
 
 
-def search_for_item_in_neighborhood(item_id: str, value: str) -> bool:
+def search_for_item_in_neighborhood(item: entity_records.EntityRecord, value: str) -> bool:
     """
     Checks if provided value exists in property P84 'nieghborhood with' of the provided item
 
     Parameters
     ----------
-    item_id : str
-        ID of the item to be checked 
+    item : entity_records.EntityRecord
+        item to be checked 
     value : str
         value to search for
 
@@ -54,9 +70,8 @@ def search_for_item_in_neighborhood(item_id: str, value: str) -> bool:
         True if the value does exist in the property P84 and False otherwise
     """
     value_exist_in_neighborhood = False
-    item = wbi.item.get(entity_id=item_id)
-    for item_claim in item.claims:
-        if item_claim.mainsnak.property_number == P_NEIGHBORHOOD_WITH and item_claim.mainsnak.datavalue["value"]["id"] == value:
+    for item_claim in item.get_claims(P_NEIGHBORHOOD_WITH):
+        if item_claim.mainsnak.datavalue["value"]["id"] == value:
             value_exist_in_neighborhood = True
     return value_exist_in_neighborhood
 
@@ -65,24 +80,63 @@ def search_for_item_in_neighborhood(item_id: str, value: str) -> bool:
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
 
     report_path = 'data_2025/reports/03.4_replace_deleted_items_report.txt'
+    report = report_writer.ReportWriter(report_path)
+    plan = edit_plan.open_plan(arguments.plan, resume=arguments.resume) if not WRITE else None
+    journal.attach(report, plan)
 
     joined_tables = pd.read_csv('data_2025/03.4_joined_data.csv')
 
 
+    item_links = {}
+    rows_by_item = {}
+    new_value_ids = set()
     for index, row in joined_tables.iterrows():
         if index > 0 and index < 244:
             item_link = row["item"]
             position = item_link.rfind(r'/')
             item_id = item_link[position+1:]
+            if journal.is_done(item_id):
+                continue
+            item_links[item_id] = item_link
+            rows_by_item.setdefault(item_id, []).append(row)
+
+            new_value_link = row["newValue"]
+            position_new = new_value_link.rfind(r'/')
+            new_value_ids.add(new_value_link[position_new+1:])
+
+    # items are read as read-only records, the full entity is built only for the items which are changed
+    new_value_items = {new_value_item.id: new_value_item for new_value_item in concurrent_fetcher.fetch_entities(wbi, new_value_ids, cache=cache, as_records=True)}
+
+    pool = write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session())
+    pending_writes = deque()
+
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(len(rows_by_item))
 
+    for item in tracker.track(concurrent_fetcher.fetch_entities(wbi, rows_by_item.keys(), ordered=True, cache=cache, as_records=True)):
+        item_id = item.id
+        item_link = item_links[item_id]
+        entity = None
+        snapshot = None
+        report_lines = []
+        replacements = []
+
+        for row in rows_by_item[item_id]:
             old_value_link = row["value"]
             position_old = old_value_link.rfind(r'/')
             old_value_id = old_value_link[position_old+1:]
@@ -92,35 +146,54 @@ if __name__ == '__main__':
             new_value_id = new_value_link[position_new+1:]
             new_value_numeric_id = new_value_id[1:]
 
-            item = wbi.item.get(entity_id=item_id)
-
-            for claim in item.claims:
-                if claim.mainsnak.property_number == P_NEIGHBORHOOD_WITH and claim.mainsnak.datavalue["value"]["id"] == old_value_id:
-                    if search_for_item_in_neighborhood(new_value_id, item_id):
+            for claim in item.get_claims(P_NEIGHBORHOOD_WITH):
+                if claim.mainsnak.datavalue["value"]["id"] == old_value_id:
+                    if search_for_item_in_neighborhood(new_value_items[new_value_id], item_id):
                         datavalue = {'entity-type': 'item', 'numeric-id': new_value_numeric_id, 'id': new_value_id}
-                        if WRITE:
-                            try:
-                                claim.mainsnak.datavalue["value"] = datavalue
-                                item.write()
-                                print(item_link + " deleted item " + old_value_id + " was replaced " + new_value_id) 
-                                with open(report_path, 'a', encoding='utf-8') as report:
-                                    report.write(f"{item_link} deleted item {old_value_id} was replaced {new_value_id} \n")
-                            except (MWApiError, ModificationFailed) as e:
-                                print(item_link + " error writing to Wikibase")
-                                with open(report_path, 'a', encoding='utf-8') as report:
-                                    report.write(f"{item_link} error writing to Wikibase {e} \n")
+                        if WRITE or plan:
+                            if entity is None:
+                                entity = item.to_entity(wbi)
+                                snapshot = entity_diff.take_snapshot(entity) if plan else None
+                            entity_claim = next(entity_claim for entity_claim in entity.claims.get(P_NEIGHBORHOOD_WITH) if entity_claim.id == claim.id)
+                            entity_claim.mainsnak.datavalue["value"] = datavalue
+                            print(item_link + " deleted item " + old_value_id + " was replaced " + new_value_id)
+                            replacements.append(f"deleted item {old_value_id} was replaced {new_value_id}")
 
                     else:
                         print(item_link + " item does not exist in neighborhood of item " + new_value_link) 
-                        with open(report_path, 'a', encoding='utf-8') as report:
-                            report.write(f"{item_link} item does not exist in neighborhood of item {new_value_link} \n")
+                        report_lines.append(f"{item_link} item does not exist in neighborhood of item {new_value_link} ")
+
+        # all replacements in the item are written at once by the write pool, they are reported when the write is finished
+        future = None
+        write_message = ''
+        if entity is not None:
+            report_lines.append(item_link)
+            if WRITE:
+                future = pool.submit(item_id, entity.write, maxlag=pool.maxlag)
+                write_message = " - " + ", ".join(replacements)
+            else:
+                plan.add_entity(entity, snapshot)
+
+        pending_writes.append((future, (item_id, "\n".join(report_lines), write_message)))
+        write_pool.report_finished_writes(pending_writes, report, journal)
+
+    pool.close()
+    write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
+
+    journal.close()
+    cache.close()
+    if plan:
+        plan.close()
 
 
 
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.close()
 
 
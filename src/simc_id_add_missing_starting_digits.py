@@ -6,14 +6,36 @@ property and this value is shorter than 7 characters. These values are then fill
 
 import os
 import time
+from collections import deque
 from dotenv import load_dotenv
 from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_helpers import execute_sparql_query
 
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.dump_scanner as dump_scanner
+import tools.edit_plan as edit_plan
+import tools.entity_cache as entity_cache
+import tools.entity_diff as entity_diff
+import tools.fixers as fixers
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.write_pool as write_pool
+
 
 
 WRITE = False
+# send only the changed parts of the entities (tools/entity_diff.py) instead of the whole entities
+MINIMAL_WRITES = True
+# number of items written at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
+# results of dump_scan.py (e.g. 'data_2025/dump_scan/simc_id_too_short.csv') used instead of the SPARQL query, if set
+DETECTION_RESULTS = ''
 
 load_dotenv()
 
@@ -30,37 +52,27 @@ P_SIMC_ID = 'P75'
 
 
 
-def add_leading_zeros(simc_id: str) -> str:
-    """
-    Adds zeros at the beginning of the provided identifier value, so that the whole string consists of seven digits
-
-    Parameters
-    ----------
-    simc_id : str
-        current SIMC identifier 
-
-    Returns
-    -------
-    str
-        new SIMC identifier in correct seven-digit format
-    """
-    number_of_zeros = 7 - len(simc_id)
-    new_simc_id =  '{}{}'.format('0' * number_of_zeros, simc_id)
-    return new_simc_id
-
-
-
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
 
     report_path = 'data_2025/reports/02.1_simc_id_add_missing_starting_digits.txt'
+    report = report_writer.ReportWriter(report_path)
+    plan = edit_plan.open_plan(arguments.plan, resume=arguments.resume) if not WRITE else None
+    journal.attach(report, plan)
 
     query = """ SELECT ?item WHERE {
                     ?item p:P75 ?statement0.
@@ -76,34 +88,60 @@ if __name__ == '__main__':
                     FILTER (STRLEN(STR(?value)) < 7)
                 } """
 
-    results = execute_sparql_query(query)
-    output = []
+    if DETECTION_RESULTS:
+        results = dump_scanner.read_detection_results(DETECTION_RESULTS)
+    else:
+        results = execute_sparql_query(query)
+    item_links = {}
     for result in results["results"]["bindings"]:
-        output.append(result["item"]["value"])
-
-    for item_link in output:
+        item_link = result["item"]["value"]
         position = item_link.rfind(r'/')
         item_id = item_link[position+1:]
-
-        item = wbi.item.get(entity_id=item_id)
-        for claim in item.claims:
-            if claim.mainsnak.property_number == P_SIMC_ID:
-                simc_id_claim_value = claim.mainsnak.datavalue["value"]
-                new_simc_id_value = add_leading_zeros(simc_id_claim_value)
-
-                if WRITE and len(new_simc_id_value) == 7:
-                    print(item_id)
-                    value_to_update = claim.mainsnak.datavalue
-                    new_simc_datavalue = {'value': new_simc_id_value, 'type': 'string'}
-                    value_to_update.update(new_simc_datavalue)
-                    item.write()
-                    with open(report_path, 'a', encoding='utf-8') as report:
-                        report.write(f"{item_link} missing zeroes in SIMC ID were added {new_simc_id_value} \n")
+        if not journal.is_done(item_id):
+            item_links[item_id] = item_link
+
+    fixer = fixers.SimcIdAddMissingStartingDigitsFixer()
+    pool = write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session())
+    pending_writes = deque()
+
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(len(item_links))
+
+    for item in tracker.track(concurrent_fetcher.fetch_entities(wbi, item_links.keys(), ordered=True, cache=cache)):
+        snapshot = entity_diff.take_snapshot(item)
+        item_id = item.id
+        item_link = item_links[item_id]
+        is_changed, messages = fixer.fix(item)
+        if not messages:
+            # the detection results may be older than the item
+            messages = ["no longer has a single SIMC ID without the leading zeros, skipped"]
+        report_lines = [f"{item_link} {message}" for message in messages]
+
+        # the item is written by the write pool, it is reported when the write is finished
+        future = None
+        if WRITE and is_changed:
+            future = pool.submit(item_id, entity_diff.write_entity, item, snapshot, minimal=MINIMAL_WRITES, maxlag=pool.maxlag)
+        elif plan:
+            plan.add_entity(item, snapshot)
+
+        pending_writes.append((future, (item_id, "\n".join(report_lines) if WRITE else '', '')))
+        write_pool.report_finished_writes(pending_writes, report, journal)
+
+    pool.close()
+    write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
+
+    journal.close()
+    cache.close()
+    if plan:
+        plan.close()
     
 
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.close()
 
@@ -6,16 +6,34 @@ the second value to the first one.
 
 import os
 import time
+from collections import deque
 from dotenv import load_dotenv
 from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
-from wikibaseintegrator.models import references, snaks
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_helpers import execute_sparql_query
-from wikibaseintegrator.wbi_exceptions import MWApiError, ModificationFailed
+
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.dump_scanner as dump_scanner
+import tools.edit_plan as edit_plan
+import tools.entity_cache as entity_cache
+import tools.entity_diff as entity_diff
+import tools.fixers as fixers
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.write_pool as write_pool
 
 
 
 WRITE = False
+# number of items written at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
+# results of dump_scan.py (e.g. 'data_2025/dump_scan/simc_id_duplicates.csv') used instead of the SPARQL query, if set
+DETECTION_RESULTS = ''
 
 load_dotenv()
 
@@ -32,37 +50,27 @@ P_SIMC_ID = 'P75'
 
 
 
-def add_leading_zeros(simc_id: str) -> str:
-    """
-    Adds zeros at the beginning of the provided identifier value, so that the whole string consists of seven digits
-
-    Parameters
-    ----------
-    simc_id : str
-        current SIMC identifier 
-
-    Returns
-    -------
-    str
-        new SIMC identifier in correct seven-digit format
-    """
-    number_of_zeros = 7 - len(simc_id)
-    new_simc_id =  '{}{}'.format('0' * number_of_zeros, simc_id)
-    return new_simc_id
-
-
-
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
 
     report_path = 'data_2025/reports/02.2_simc_id_remove_duplicates.txt'
+    report = report_writer.ReportWriter(report_path)
+    plan = edit_plan.open_plan(arguments.plan, resume=arguments.resume) if not WRITE else None
+    journal.attach(report, plan)
 
     query = """ SELECT DISTINCT ?item WHERE {
                     ?item p:P75 ?statement0.
@@ -76,91 +84,64 @@ if __name__ == '__main__':
                         HAVING (?count = 2)
                     }
                 } """
-    results = execute_sparql_query(query)
-    output = []
+    if DETECTION_RESULTS:
+        results = dump_scanner.read_detection_results(DETECTION_RESULTS)
+    else:
+        results = execute_sparql_query(query)
+    item_links = {}
     for result in results["results"]["bindings"]:
-        output.append(result["item"]["value"])
-
-
-    for item_link in output:
+        item_link = result["item"]["value"]
         position = item_link.rfind(r'/')
         item_id = item_link[position+1:]
+        if not journal.is_done(item_id):
+            item_links[item_id] = item_link
+
+
+    fixer = fixers.SimcIdRemoveDuplicatesFixer()
+    pool = write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session())
+    pending_writes = deque()
+
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(len(item_links))
+
+
+    for item in tracker.track(concurrent_fetcher.fetch_entities(wbi, item_links.keys(), ordered=True, cache=cache)):
+        item_link = item_links[item.id]
+        snapshot = entity_diff.take_snapshot(item) if plan else None
+
+        is_changed, messages = fixer.fix(item)
+        if not messages:
+            # the detection results may be older than the item
+            messages = ["no longer has two values of the SIMC ID, skipped"]
+        report_lines = [f"{item_link} {message}" for message in messages]
+        for report_line in report_lines:
+            print(report_line)
+
+        # the item is written by the write pool, it is reported when the write is finished
+        future = None
+        if WRITE and is_changed:
+            future = pool.submit(item.id, item.write, maxlag=pool.maxlag)
+        elif plan and is_changed:
+            plan.add_entity(item, snapshot)
+
+        pending_writes.append((future, (item.id, "\n".join(report_lines), '')))
+        write_pool.report_finished_writes(pending_writes, report, journal)
+
+    pool.close()
+    write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
 
-        item = wbi.item.get(entity_id=item_id)
-
-        claims_simc_id = []
-        for claim in item.claims:
-            if claim.mainsnak.property_number == P_SIMC_ID:
-                claims_simc_id.append(claim)
-
-        claim_1 = claims_simc_id[0]
-        claim_2 = claims_simc_id[1]
-
-        claim_1_value = claim_1.mainsnak.datavalue["value"]
-        claim_2_value = claim_2.mainsnak.datavalue["value"]
-
-        new_claim_1_value = add_leading_zeros(claim_1_value)
-        new_claim_2_value = add_leading_zeros(claim_2_value)
-
-        if new_claim_1_value != new_claim_2_value:
-            print(item_link + "incompatible SIMC ID  " + new_claim_1_value + " / " + new_claim_2_value)
-            with open(report_path, 'a', encoding='utf-8') as report:
-                report.write(f"{item_link} incompatible SIMC ID {new_claim_1_value} / {new_claim_2_value} \n")
-            continue
-
-        claim_2_number_of_qualifiers = len(claim_2.qualifiers.qualifiers)
-        if claim_2_number_of_qualifiers != 0 :
-            print(item_link + "There are qualifiers in the second value of the SIMC ID")
-            with open(report_path, 'a', encoding='utf-8') as report:
-                report.write(f"{item_link} There are qualifiers in the second value of the SIMC ID \n")
-            continue
-
-        claim_2_number_of_references = len(claim_2.references)
-        if claim_2_number_of_references != 1 :
-            print(item_link + "More than one reference in the second value of the SIMC ID")
-            with open(report_path, 'a', encoding='utf-8') as report:
-                report.write(f"{item_link} More than one reference in the second value of the SIMC ID \n")
-            continue
-            
-        if new_claim_1_value != claim_1_value:
-            claim_1.mainsnak.datavalue["value"] = new_claim_1_value
-            print(item_link + "SIMC  ID value was changed " + claim_1_value + " to " + new_claim_1_value)
-            with open(report_path, 'a', encoding='utf-8') as report:
-                report.write(f"{item_link} SIMC  ID value was changed {claim_1_value} to {new_claim_1_value} \n")
-
-
-        claim_2_reference = claim_2.references.references[0]
-
-        snaks_references = snaks.Snaks()
-        for reference_element in claim_2_reference:
-            reference_snaktype = reference_element.snaktype 
-            reference_p_number = reference_element.property_number
-            reference_value = reference_element.datavalue
-            reference_datatype = reference_element.datatype
-
-            new_reference = snaks.Snak(snaktype=reference_snaktype, property_number=reference_p_number, datavalue=reference_value, datatype=reference_datatype)
-            snaks_references.add(new_reference)
-
-        references_order = claim_2_reference.snaks_order
-        reference_to_add = references.Reference(snaks=snaks_references, snaks_order=references_order)
-
-        try:
-            if WRITE:
-                claim_1.references.add(reference_to_add)
-                claim_2.remove()
-                item.write()
-                print(item_link + " References from the second value was moved, second value was deleted")
-                with open(report_path, 'a', encoding='utf-8') as report:
-                    report.write(f"{item_link} References from the second value was moved, second value was deleted \n")
-        except (MWApiError, ModificationFailed) as e:
-            print(item_link + " error writing to Wikibase")
-            with open(report_path, 'a', encoding='utf-8') as report:
-                report.write(f"{item_link} error writing to Wikibase {e} \n")
+    journal.close()
+    cache.close()
+    if plan:
+        plan.close()
 
 
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n")
+    report.close()
 
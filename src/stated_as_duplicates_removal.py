@@ -5,16 +5,36 @@ is searching for such duplicated values of property "stated as" and removes them
 
 import os
 import time
+from collections import deque
 from dotenv import load_dotenv
 from wikibaseintegrator import WikibaseIntegrator, entities, wbi_login
-from wikibaseintegrator.models import Claim
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_helpers import execute_sparql_query
-from wikibaseintegrator.wbi_exceptions import MWApiError, ModificationFailed
+
+import tools.checkpoint as checkpoint
+import tools.cli as cli
+import tools.concurrent_fetcher as concurrent_fetcher
+import tools.dump_scanner as dump_scanner
+import tools.edit_plan as edit_plan
+import tools.entity_cache as entity_cache
+import tools.entity_diff as entity_diff
+import tools.fixers as fixers
+import tools.http_client as http_client
+import tools.metrics as metrics
+import tools.profiling as profiling
+import tools.progress as progress
+import tools.report_writer as report_writer
+import tools.write_pool as write_pool
 
 
 
 WRITE = False
+# send only the changed parts of the entities (tools/entity_diff.py) instead of the whole entities
+MINIMAL_WRITES = True
+# number of items written at the same time, lowered automatically when the server is lagging or throttling the edits
+MAX_WRITERS = 4
+# results of dump_scan.py (e.g. 'data_2025/dump_scan/stated_as_duplicates.csv') used instead of the SPARQL query, if set
+DETECTION_RESULTS = ''
 
 load_dotenv()
 
@@ -31,89 +51,27 @@ P_STATED_AS = 'P54'
 
 
 
-def check_two_property_values_equality(claim_1: Claim, claim_2: Claim) -> tuple[bool, str]:
-    """
-    Checks if two claim values have the same text value, language, qualifiers and references.
-    Works for properties with datatype "monolingual text".
-
-    Parameters
-    ----------
-    claim_1 : Claim
-        First Claim
-    claim_2 : Claim
-        Second Claim
-
-    Returns
-    -------
-    tuple[bool, str]
-        True if the claims are equal, False if ther are not and a message with inequality reason
-    """
-    claim_1_value = claim_1.mainsnak.datavalue["value"]["text"]
-    claim_1_language = claim_1.mainsnak.datavalue["value"]["language"]
-
-    claim_2_value = claim_2.mainsnak.datavalue["value"]["text"]
-    claim_2_language = claim_2.mainsnak.datavalue["value"]["language"]
-
-    if claim_1_value != claim_2_value or claim_1_language != claim_2_language:
-        return False, " - value or language not eual"
-
-    claim_1_qualifiers_order = claim_1.qualifiers_order
-    claim_2_qualifiers_order = claim_2.qualifiers_order
-
-    if claim_1_qualifiers_order != claim_2_qualifiers_order:
-        return False, " - qualifiers order not equal"
-
-    for qualifier_p in claim_1_qualifiers_order:
-        claim_1_qualifier = claim_1.qualifiers.get(qualifier_p)
-        claim_1_qualifier_datavalue = claim_1_qualifier[0].datavalue
-
-        claim_2_qualifier = claim_2.qualifiers.get(qualifier_p)
-        claim_2_qualifier_datavalue = claim_2_qualifier[0].datavalue
-
-        if claim_1_qualifier_datavalue != claim_2_qualifier_datavalue:
-            return False, " - qualifiers not equal"
-        
-    claim_1_references = claim_1.references.references
-    claim_2_references = claim_2.references.references
-
-    if len(claim_1_references) != len(claim_2_references):
-        return False, " - number of references not equal"
-
-    if len(claim_1_references) > 1:
-        print("That's Too Much, Man!")
-        return False, " - too many references"
-
-    claim_1_reference_order = claim_1_references[0].snaks_order
-    claim_1_reference = claim_1_references[0].snaks
-
-    claim_2_reference_order = claim_2_references[0].snaks_order
-    claim_2_reference = claim_2_references[0].snaks
-
-    if claim_1_reference_order != claim_2_reference_order:
-        return False, " - references order not equal"
-
-    for reference_p in claim_1_reference_order:
-        reference_1_value = claim_1_reference.get(reference_p)[0].datavalue 
-        reference_2_value = claim_2_reference.get(reference_p)[0].datavalue 
-        if reference_1_value != reference_2_value: 
-            return False, " - references not equal"
-
-    return True, ""
-
-
-
-
 if __name__ == '__main__':
     
     start_time = time.time()
+    arguments = cli.parse_arguments(__doc__)
+    exporter = metrics.start_exporter(__file__)
+    profiler = profiling.open_profiler(__file__, arguments)
+    profiler.start_phase('setup')
 
     login_instance = wbi_login.OAuth1(consumer_token=WIKIDARIAH_CONSUMER_TOKEN,
                                         consumer_secret=WIKIDARIAH_CONSUMER_SECRET,
                                         access_token=WIKIDARIAH_ACCESS_TOKEN,
                                         access_secret=WIKIDARIAH_ACCESS_SECRET)
+    http_client.configure(login_instance)
     wbi = WikibaseIntegrator(login=login_instance)
+    cache = entity_cache.EntityCache()
+    journal = checkpoint.open_journal(__file__, resume=arguments.resume, dry_run=not WRITE)
 
     report_path = 'data_2025/reports/04.3_remove_stated_as_duplicates.txt'
+    report = report_writer.ReportWriter(report_path)
+    plan = edit_plan.open_plan(arguments.plan, resume=arguments.resume) if not WRITE else None
+    journal.attach(report, plan)
 
 
     query = """ SELECT DISTINCT ?item ?value WHERE {
@@ -128,63 +86,61 @@ if __name__ == '__main__':
                 ORDER BY ?item
             """
 
-    results = execute_sparql_query(query)
-    outputItems = []
-    outputValues = []
+    if DETECTION_RESULTS:
+        results = dump_scanner.read_detection_results(DETECTION_RESULTS)
+    else:
+        results = execute_sparql_query(query)
+    entity_links = {}
     for result in results["results"]["bindings"]:
-        outputItems.append(result["item"]["value"])
-        outputValues.append(result["value"]["value"])
-    
-    for i in range(0, len(outputItems)):
-        entity_link = outputItems[i]
-        stated_as_value = outputValues[i]
-
+        entity_link = result["item"]["value"]
         position = entity_link.rfind(r'/')
         entity_id = entity_link[position+1:]
+        if not journal.is_done(entity_id):
+            entity_links[entity_id] = entity_link
 
-        entity = wbi.item.get(entity_id=entity_id)
-
-        print(entity_link)
-        report_message = f"{entity_link}"
-
-        claims_stated_as = []
-        for claim in entity.claims:
-            if claim.mainsnak.property_number == P_STATED_AS and claim.mainsnak.datavalue["value"]["text"] == stated_as_value:
-                claims_stated_as.append(claim)
-                
-        if len(claims_stated_as) > 2:
-            print("That's too much, man!")
-            report_message += f" - too many claims in the property 'stated as' {len(claims_stated_as)}"
-            with open(report_path, 'a', encoding='utf-8') as report:
-                 report.write(report_message + "\n")
-            continue
-
-        are_claims_equal, check_message = check_two_property_values_equality(claims_stated_as[0], claims_stated_as[1])
-
-        if are_claims_equal:
-            claim_to_remove = claims_stated_as[1]
-            claim_to_remove_value = claim_to_remove.mainsnak.datavalue["value"]["text"]
-            if WRITE:
-                try:
-                    claim_to_remove.remove()
-                    entity.write()
-                    report_message += f" {claim_to_remove_value} claim removed"
-                    print(claim_to_remove_value, " claim removed")
-                except (MWApiError, ModificationFailed) as e:
-                    print(" - error writing to Wikibase")
-                    report_message += f" - error writing to Wikibase {e}"
-            else:
-                report_message += f" {claim_to_remove_value} claim prepared to be removed"
-        else:
-            report_message += check_message
-
-        with open(report_path, 'a', encoding='utf-8') as report:
-            report.write(report_message + "\n")
+    fixer = fixers.StatedAsDuplicatesFixer()
+    pool = write_pool.WritePool(max_workers=MAX_WRITERS, session=login_instance.get_session())
+    pending_writes = deque()
 
+    profiler.start_phase('main loop')
+    tracker = progress.ProgressTracker(len(entity_links))
 
+    for entity in tracker.track(concurrent_fetcher.fetch_entities(wbi, entity_links.keys(), ordered=True, cache=cache)):
+        snapshot = entity_diff.take_snapshot(entity)
+        entity_link = entity_links[entity.id]
+        print(entity_link)
+        is_changed, messages = fixer.fix(entity)
+        if not messages:
+            # the detection results may be older than the item
+            messages = ["no duplicated values of 'stated as' any more, skipped"]
+        report_lines = [f"{entity_link} {message}" for message in messages]
+
+        # all the duplicates of the item are removed with a single write, run by the write pool
+        future = None
+        if WRITE and is_changed:
+            future = pool.submit(entity.id, entity_diff.write_entity, entity, snapshot, minimal=MINIMAL_WRITES,
+                                 maxlag=pool.maxlag)
+        elif plan:
+            plan.add_entity(entity, snapshot)
+
+        pending_writes.append((future, (entity.id, "\n".join(report_lines), '')))
+        write_pool.report_finished_writes(pending_writes, report, journal)
+
+    pool.close()
+    write_pool.report_finished_writes(pending_writes, report, journal, wait=True)
+
+    journal.close()
+    cache.close()
+    if plan:
+        plan.close()
+
+
+    profiler.close()
+    tracker.close()
+    exporter.close()
     end_time = time.time()
     execution_time = end_time - start_time
 
-    with open(report_path, 'a', encoding='utf-8') as report:
-        report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n \n \n")
+    report.write(f"Execution time: {time.strftime("%H:%M:%S", time.gmtime(execution_time))} s.\n \n \n")
+    report.close()
 
@@ -0,0 +1,160 @@
+"""
+Functions that download many entities at once with batched 'wbgetentities' requests instead of one request per entity.
+"""
+
+import time
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+import requests
+from wikibaseintegrator import wbi_login
+from wikibaseintegrator.wbi_exceptions import MaxRetriesReachedException, MWApiError
+from wikibaseintegrator.wbi_helpers import mediawiki_api_call_helper
+
+
+MAX_IDS_PER_REQUEST = 50
+# a failed batch is requested again up to MAX_RETRIES times, waiting RETRY_AFTER seconds more after every attempt
+MAX_RETRIES = 3
+RETRY_AFTER = 5
+
+
+class LabelsAndDescriptions(NamedTuple):
+    """
+    Labels and descriptions of a single entity in the requested languages.
+    """
+    id: str
+    labels: dict[str, str]
+    descriptions: dict[str, str]
+
+
+def split_into_batches(entity_ids: Iterable[str], batch_size: int = MAX_IDS_PER_REQUEST) -> Iterator[list[str]]:
+    """
+    Splits the given entity IDs into lists of at most batch_size elements
+
+    Parameters
+    ----------
+    entity_ids : Iterable[str]
+        IDs of the entities
+    batch_size : int
+        maximum number of IDs in a single batch
+
+    Returns
+    -------
+    Iterator[list[str]]
+        consecutive batches of entity IDs
+    """
+    batch = []
+    for entity_id in entity_ids:
+        batch.append(entity_id)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def request_entities(params: dict, login: wbi_login._Login | None) -> dict | None:
+    """
+    Sends the 'wbgetentities' request, retrying it after API and connection errors
+
+    Parameters
+    ----------
+    params : dict
+        parameters of the request
+    login : wbi_login._Login | None
+        login instance used for the request, anonymous request is made if None
+
+    Returns
+    -------
+    dict | None
+        response of the API, None if the request failed MAX_RETRIES times
+    """
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            return mediawiki_api_call_helper(data=params, login=login, allow_anonymous=True)
+        except (MWApiError, MaxRetriesReachedException, requests.RequestException) as error:
+            print(f"ERROR: {params['ids']} - {error} (attempt {attempt} of {MAX_RETRIES})")
+            if attempt < MAX_RETRIES:
+                time.sleep(RETRY_AFTER * attempt)
+    return None
+
+
+def get_entities_json(entity_ids: Iterable[str], props: list[str] | None = None, languages: list[str] | None = None,
+                      login: wbi_login._Login | None = None, batch_size: int = MAX_IDS_PER_REQUEST) -> Iterator[dict]:
+    """
+    Downloads JSON data of the given entities, asking for up to batch_size entities in one 'wbgetentities' request.
+    Entities that do not exist are returned with the 'missing' key, just as the API returns them. A batch that fails
+    after all the retries is requested again entity by entity, and the entities that still cannot be downloaded are
+    reported and skipped, so that a single error does not end the whole scan.
+
+    Parameters
+    ----------
+    entity_ids : Iterable[str]
+        IDs of the entities to download
+    props : list[str] | None
+        parts of the entity to download (e.g. ['labels', 'descriptions']), all of them if None
+    languages : list[str] | None
+        languages of the terms to download, all of them if None
+    login : wbi_login._Login | None
+        login instance used for the requests, anonymous requests are made if None
+    batch_size : int
+        number of entities requested at once (50, or 500 for accounts with the 'apihighlimits' right)
+
+    Returns
+    -------
+    Iterator[dict]
+        JSON data of every downloaded entity in the order of the given IDs
+    """
+    for batch in split_into_batches(entity_ids, batch_size):
+        params = {
+            'action': 'wbgetentities',
+            'ids': '|'.join(batch),
+            'format': 'json'
+        }
+        if props:
+            params['props'] = '|'.join(props)
+        if languages:
+            params['languages'] = '|'.join(languages)
+
+        results = request_entities(params, login)
+        if results is not None:
+            for entity_id in batch:
+                yield results['entities'].get(entity_id, {'id': entity_id, 'missing': ''})
+            continue
+
+        for entity_id in batch:
+            results = request_entities({**params, 'ids': entity_id}, login) if len(batch) > 1 else None
+            if results is None:
+                print(f"ERROR: {entity_id} skipped, it could not be downloaded")
+                continue
+            yield results['entities'].get(entity_id, {'id': entity_id, 'missing': ''})
+
+
+def get_labels_and_descriptions(entity_ids: Iterable[str], languages: list[str], login: wbi_login._Login | None = None,
+                                batch_size: int = MAX_IDS_PER_REQUEST) -> Iterator[LabelsAndDescriptions]:
+    """
+    Downloads only the labels and descriptions in the given languages for the given entities. Entities that do not exist
+    are skipped.
+
+    Parameters
+    ----------
+    entity_ids : Iterable[str]
+        IDs of the entities to download
+    languages : list[str]
+        languages of the labels and descriptions
+    login : wbi_login._Login | None
+        login instance used for the requests, anonymous requests are made if None
+    batch_size : int
+        number of entities requested at once
+
+    Returns
+    -------
+    Iterator[LabelsAndDescriptions]
+        labels and descriptions of every existing entity in the order of the given IDs
+    """
+    entities_json = get_entities_json(entity_ids, props=['labels', 'descriptions'], languages=languages, login=login, batch_size=batch_size)
+    for entity_json in entities_json:
+        if 'missing' in entity_json:
+            continue
+        labels = {language: label['value'] for language, label in entity_json.get('labels', {}).items()}
+        descriptions = {language: description['value'] for language, description in entity_json.get('descriptions', {}).items()}
+        yield LabelsAndDescriptions(id=entity_json['id'], labels=labels, descriptions=descriptions)
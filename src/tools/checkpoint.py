@@ -0,0 +1,145 @@
+"""
+Checkpoint journal of long-running scripts. Every processed entity is appended to a JSON Lines file together with the outcome
+of its processing, so that a script restarted with the '--resume' option can skip the work that was already done. Entities
+whose processing failed are processed again.
+"""
+
+import os
+import time
+import ujson
+
+
+CHECKPOINTS_DIRECTORY = 'data_2025/checkpoints'
+DONE_OUTCOME = 'done'
+# outcome of the entities whose processing failed, they are not skipped by a resumed run
+ERROR_OUTCOME = 'error'
+
+
+class CheckpointJournal:
+    """
+    Append-only JSON Lines file with one record per processed entity. The records are written and the file is synced to
+    the disk every sync_interval seconds, right after flushing the outputs attached to the journal (reports, tables, edit
+    plans). The partial results of the run are thus saved periodically, and an entity is never recorded as done before its
+    results are saved. Several processes may append to the same journal.
+    """
+
+    def __init__(self, path: str, resume: bool = False, sync_interval: float = 1.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.sync_interval = sync_interval
+        self.last_sync_time = time.monotonic()
+        self.completed: dict[str, dict] = {}
+        self.pending_lines: list[str] = []
+        self.outputs = []
+
+        last_line = '\n'
+        if resume and os.path.exists(path):
+            with open(path, encoding='utf-8') as journal_file:
+                for last_line in journal_file:
+                    try:
+                        record = ujson.loads(last_line)
+                    except ValueError:
+                        # the last line may be incomplete after a crash
+                        continue
+                    self.completed[record['key']] = record
+
+        self.journal_file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if not last_line.endswith('\n'):
+            self.journal_file.write('\n')
+
+    def is_done(self, key: str) -> bool:
+        """
+        Checks if the entity was already processed
+
+        Parameters
+        ----------
+        key : str
+            key of the entity, usually its ID
+
+        Returns
+        -------
+        bool
+            True if there is a record of the entity in the journal and its processing did not fail
+        """
+        record = self.completed.get(key)
+        return record is not None and record['outcome'] != ERROR_OUTCOME
+
+    def attach(self, *outputs):
+        """
+        Attaches the outputs of the script, flushed every time the journal is synced
+
+        Parameters
+        ----------
+        outputs
+            objects with the flush() method, e.g. report_writer.ReportWriter, None values are ignored
+        """
+        self.outputs.extend(output for output in outputs if output is not None)
+
+    def record(self, key: str, outcome: str = DONE_OUTCOME, **data):
+        """
+        Appends a record of the processed entity to the journal
+
+        Parameters
+        ----------
+        key : str
+            key of the entity, usually its ID
+        outcome : str
+            result of the processing, e.g. the report message, or ERROR_OUTCOME if the processing failed
+        data
+            any other JSON serializable data needed to rebuild the results of the script
+        """
+        record = {'key': key, 'outcome': outcome, **data}
+        self.completed[key] = record
+        self.pending_lines.append(ujson.dumps(record, ensure_ascii=False) + '\n')
+        if time.monotonic() - self.last_sync_time >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """
+        Flushes the attached outputs, then writes the pending records in a single write and syncs the journal file
+        """
+        for output in self.outputs:
+            output.flush()
+        if self.pending_lines:
+            self.journal_file.write(''.join(self.pending_lines))
+            self.pending_lines.clear()
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+        self.last_sync_time = time.monotonic()
+
+    def close(self):
+        """
+        Syncs and closes the journal file, the attached outputs have to be closed afterwards
+        """
+        self.sync()
+        self.journal_file.close()
+
+
+def open_journal(script_path: str, resume: bool, dry_run: bool = False, input_path: str | None = None) -> CheckpointJournal:
+    """
+    Opens the journal of the given script. Dry runs have a separate journal, so that they are never resumed as real runs.
+
+    Parameters
+    ----------
+    script_path : str
+        path of the script, usually __file__
+    resume : bool
+        keep the records of the previous run, otherwise the journal is started from scratch
+    dry_run : bool
+        True if the script does not write to Wikibase
+    input_path : str | None
+        input file the entity IDs of the journal refer to (e.g. the edit plan), each input file has a separate journal
+
+    Returns
+    -------
+    CheckpointJournal
+        journal of the script
+    """
+    script_name = os.path.splitext(os.path.basename(script_path))[0]
+    suffix = '_dry_run' if dry_run else ''
+    if input_path:
+        input_name = os.path.splitext(os.path.basename(input_path))[0]
+        script_name = f'{script_name}_{input_name}'
+    return CheckpointJournal(os.path.join(CHECKPOINTS_DIRECTORY, f'{script_name}{suffix}.jsonl'), resume=resume)
@@ -0,0 +1,37 @@
+"""
+Command line options shared by all the scripts.
+"""
+
+import argparse
+
+
+def parse_arguments(description: str | None, plan_unsupported: str | None = None) -> argparse.Namespace:
+    """
+    Parses the command line options of a script
+
+    Parameters
+    ----------
+    description : str | None
+        description of the script shown in the help message, usually __doc__
+    plan_unsupported : str | None
+        reason why the script (in its current mode) cannot write an edit plan, --plan is rejected with this message
+
+    Returns
+    -------
+    argparse.Namespace
+        values of the options
+    """
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resume', action='store_true',
+                        help='skip the entities processed by the previous run, based on its checkpoint journal')
+    parser.add_argument('--plan', metavar='PATH',
+                        help='edit plan file: written by the dry runs (WRITE = False) and applied by apply_plan.py')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile the phases of the run with cProfile, the .prof files are saved in data_2025/reports; the '
+                             'entities are downloaded and written in the main thread, one at a time')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='profile the run and trace the memory allocations with tracemalloc (slower)')
+    arguments = parser.parse_args()
+    if plan_unsupported and arguments.plan:
+        parser.error(f"--plan is not supported: {plan_unsupported}")
+    return arguments
@@ -0,0 +1,175 @@
+"""
+Functions that download entities with several parallel requests instead of one blocking request at a time. The number of
+requests in progress and the number of requests per second sent to a single host are both limited.
+"""
+
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+from wikibaseintegrator import WikibaseIntegrator, entities
+from wikibaseintegrator.wbi_config import config as wbi_config
+from wikibaseintegrator.wbi_exceptions import MissingEntityException
+
+import tools.metrics as metrics
+import tools.profiling as profiling
+from tools.entity_cache import EntityCache
+from tools.entity_records import EntityRecord
+
+
+MAX_WORKERS = 8
+REQUESTS_PER_SECOND = 10.0
+
+
+class RateLimiter:
+    """
+    Spaces out requests so that no more than requests_per_second of them are started every second.
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.next_request_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        Blocks the calling thread until the next request can be sent
+        """
+        with self.lock:
+            now = time.monotonic()
+            request_time = max(now, self.next_request_time)
+            self.next_request_time = request_time + self.interval
+        if request_time > now:
+            time.sleep(request_time - now)
+
+
+rate_limiters: dict[str, RateLimiter] = {}
+rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(url: str, requests_per_second: float = REQUESTS_PER_SECOND) -> RateLimiter:
+    """
+    Returns the rate limiter shared by all requests sent to the host of the given URL
+
+    Parameters
+    ----------
+    url : str
+        URL of the API
+    requests_per_second : float
+        limit used when the rate limiter for the host is created
+
+    Returns
+    -------
+    RateLimiter
+        rate limiter of the host
+    """
+    host = urlparse(url).hostname or url
+    with rate_limiters_lock:
+        if host not in rate_limiters:
+            rate_limiters[host] = RateLimiter(requests_per_second)
+        return rate_limiters[host]
+
+
+def get_entity(wbi: WikibaseIntegrator, entity_id: str, rate_limiter: RateLimiter | None = None,
+               cache: EntityCache | None = None,
+               as_record: bool = False) -> entities.item.ItemEntity | entities.property.PropertyEntity | EntityRecord:
+    """
+    Downloads a single item or property, waiting for the rate limiter first. If the entity cache is given, an up to date
+    cached entity is used instead and every downloaded entity is saved in the cache.
+
+    Parameters
+    ----------
+    wbi : WikibaseIntegrator
+        WikibaseIntegrator instance used for the request
+    entity_id : str
+        ID of the item or property
+    rate_limiter : RateLimiter | None
+        rate limiter of the host, no limit if None
+    cache : EntityCache | None
+        entity cache, not used if None
+    as_record : bool
+        return a read-only record (tools/entity_records.py) instead of the full entity
+
+    Returns
+    -------
+    entities.item.ItemEntity | entities.property.PropertyEntity | EntityRecord
+        downloaded entity
+    """
+    entity_factory = wbi.property if entity_id.startswith('P') else wbi.item
+    entity_json = cache.get(entity_id) if cache is not None and entity_id in cache.valid_ids else None
+    if entity_json is None:
+        if rate_limiter:
+            rate_limiter.wait()
+        with metrics.measure('fetch.entity'):
+            entity_json = entity_factory._get(entity_id=entity_id)['entities'][entity_id]
+        if cache is not None and 'missing' not in entity_json:
+            cache.put(entity_json)
+    with metrics.measure('parse.entity'):
+        if as_record:
+            # the same error as from_json() of the full entity
+            if 'missing' in entity_json:
+                raise MissingEntityException('The MW API returned that the entity was missing.')
+            return EntityRecord(entity_json)
+        return entity_factory.new().from_json(json_data=entity_json)
+
+
+def fetch_entities(wbi: WikibaseIntegrator, entity_ids: Iterable[str], max_workers: int = MAX_WORKERS,
+                   requests_per_second: float = REQUESTS_PER_SECOND, ordered: bool = False, cache: EntityCache | None = None,
+                   as_records: bool = False) -> Iterator[entities.item.ItemEntity | entities.property.PropertyEntity | EntityRecord]:
+    """
+    Downloads the given entities with up to max_workers parallel requests and yields them as soon as they arrive. Only
+    about twice as many requests as max_workers are scheduled at once, so long lists of IDs are consumed lazily.
+    An error of any request is raised when its entity would be yielded.
+
+    Parameters
+    ----------
+    wbi : WikibaseIntegrator
+        WikibaseIntegrator instance used for the requests
+    entity_ids : Iterable[str]
+        IDs of the items or properties to download
+    max_workers : int
+        maximum number of requests in progress
+    requests_per_second : float
+        maximum number of requests per second sent to the Wikibase host
+    ordered : bool
+        yield the entities in the order of the given IDs instead of the order of arrival
+    cache : EntityCache | None
+        entity cache, revalidated in batches of IDs before they are scheduled; not used if None
+    as_records : bool
+        yield read-only records (tools/entity_records.py) instead of the full entities, for scans which do not edit them
+
+    Returns
+    -------
+    Iterator[entities.item.ItemEntity | entities.property.PropertyEntity | EntityRecord]
+        downloaded entities
+    """
+    rate_limiter = get_rate_limiter(str(wbi_config['MEDIAWIKI_API_URL']), requests_per_second)
+    max_pending = max_workers * 2
+    ids_iterator = iter(cache.revalidated(entity_ids, login=wbi.login) if cache else entity_ids)
+
+    if profiling.run_inline():
+        for entity_id in ids_iterator:
+            yield get_entity(wbi, entity_id, rate_limiter, cache, as_records)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: deque[Future] = deque()
+
+        def schedule() -> None:
+            for entity_id in ids_iterator:
+                pending.append(executor.submit(get_entity, wbi, entity_id, rate_limiter, cache, as_records))
+                if len(pending) >= max_pending:
+                    return
+
+        schedule()
+        while pending:
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield future.result()
+            schedule()
@@ -0,0 +1,299 @@
+"""
+Offline detection of data problems in a Wikibase JSON dump. The dump is read one entity per line, so the memory use does not
+depend on the size of the dump, and every entity is passed to a list of detectors. Each detector saves its findings in
+a CSV file whose columns are named like the variables of the SPARQL query used by the corresponding cleanup script, so
+the file can be read with read_detection_results() instead of running the query.
+"""
+
+import bz2
+import csv
+import gzip
+from collections import Counter
+from collections.abc import Iterator
+from typing import IO
+import ujson
+
+
+P_STATED_AS = 'P54'
+P_STATED_IN = 'P55'
+P_SIMC_ID = 'P75'
+DATA_ATLAS_FONTIUM_ID = 'Q179149'
+
+
+def open_dump(path: str) -> IO[str]:
+    """
+    Opens a Wikibase JSON dump, compressed with gzip or bzip2 or not compressed at all
+
+    Parameters
+    ----------
+    path : str
+        path to the .json, .json.gz or .json.bz2 file
+
+    Returns
+    -------
+    IO[str]
+        text stream of the dump
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def read_dump(path: str) -> Iterator[dict]:
+    """
+    Reads entities from a Wikibase JSON dump, which is a JSON array with one entity in each line
+
+    Parameters
+    ----------
+    path : str
+        path to the dump file
+
+    Returns
+    -------
+    Iterator[dict]
+        JSON data of consecutive entities
+    """
+    with open_dump(path) as dump:
+        for line in dump:
+            line = line.strip().rstrip(',')
+            if line in ('', '[', ']'):
+                continue
+            yield ujson.loads(line)
+
+
+def get_claims_values(entity: dict, property_number: str) -> list:
+    """
+    Returns main values of all the statements of the given property
+
+    Parameters
+    ----------
+    entity : dict
+        JSON data of the entity
+    property_number : str
+        ID of the property
+
+    Returns
+    -------
+    list
+        values of the statements, statements without a value are skipped
+    """
+    values = []
+    for statement in entity.get('claims', {}).get(property_number, []):
+        mainsnak = statement['mainsnak']
+        if mainsnak['snaktype'] == 'value':
+            values.append(mainsnak['datavalue']['value'])
+    return values
+
+
+class Detector:
+    """
+    Base class of the detectors. Subclasses set the name of the output file and its columns and implement detect().
+    """
+    file_name = ''
+    fieldnames: list[str] = []
+
+    def __init__(self, wikibase_url: str):
+        self.entity_url = wikibase_url + '/entity/'
+        self.reference_url = wikibase_url + '/reference/'
+
+    def detect(self, entity: dict) -> list[dict]:
+        """
+        Checks a single entity
+
+        Parameters
+        ----------
+        entity : dict
+            JSON data of the entity
+
+        Returns
+        -------
+        list[dict]
+            rows of the output file describing the problems found in the entity
+        """
+        raise NotImplementedError
+
+
+class MissingLabelsDetector(Detector):
+    """
+    Items without polish or english label or description, in the format of 'Missing_data.xlsx'.
+    """
+    file_name = 'missing_labels_and_descriptions.csv'
+    fieldnames = ['link', 'id', 'label_pl', 'label_en', 'desc_pl', 'desc_en']
+
+    def __init__(self, wikibase_url: str):
+        super().__init__(wikibase_url)
+        self.item_url = wikibase_url + '/wiki/Item:'
+
+    def detect(self, entity: dict) -> list[dict]:
+        if entity['type'] != 'item':
+            return []
+        labels = entity.get('labels', {})
+        descriptions = entity.get('descriptions', {})
+        terms = [labels.get('pl'), labels.get('en'), descriptions.get('pl'), descriptions.get('en')]
+        if all(terms):
+            return []
+        label_pl, label_en, desc_pl, desc_en = [str(term['value']) if term else str(None) for term in terms]
+        return [{'link': self.item_url + entity['id'], 'id': entity['id'], 'label_pl': label_pl, 'label_en': label_en,
+                 'desc_pl': desc_pl, 'desc_en': desc_en}]
+
+
+class AliasesIdenticalAsLabelsDetector(Detector):
+    """
+    Entities that have an alias identical to a label, as in 'aliases_identical_as_labels_removal.py'.
+    """
+    file_name = 'aliases_identical_as_labels.csv'
+    fieldnames = ['item', 'itemLabel', 'itemAlias']
+
+    def detect(self, entity: dict) -> list[dict]:
+        labels = {label['value'] for label in entity.get('labels', {}).values()}
+        rows = []
+        found = set()
+        for aliases in entity.get('aliases', {}).values():
+            for alias in aliases:
+                if alias['value'] in labels and alias['value'] not in found:
+                    found.add(alias['value'])
+                    rows.append({'item': self.entity_url + entity['id'], 'itemLabel': alias['value'], 'itemAlias': alias['value']})
+        return rows
+
+
+class StatedAsDuplicatesDetector(Detector):
+    """
+    Repeated values of the property 'stated as', as in 'stated_as_duplicates_removal.py'.
+    """
+    file_name = 'stated_as_duplicates.csv'
+    fieldnames = ['item', 'value']
+
+    def detect(self, entity: dict) -> list[dict]:
+        values = Counter((value['text'], value['language']) for value in get_claims_values(entity, P_STATED_AS))
+        duplicated_texts = dict.fromkeys(text for (text, language), count in values.items() if count > 1)
+        return [{'item': self.entity_url + entity['id'], 'value': text} for text in duplicated_texts]
+
+
+class SimcIdTooShortDetector(Detector):
+    """
+    Elements with exactly one SIMC ID value shorter than 7 characters, as in 'simc_id_add_missing_starting_digits.py'.
+    """
+    file_name = 'simc_id_too_short.csv'
+    fieldnames = ['item']
+
+    def detect(self, entity: dict) -> list[dict]:
+        values = get_claims_values(entity, P_SIMC_ID)
+        if len(values) == 1 and len(values[0]) < 7:
+            return [{'item': self.entity_url + entity['id']}]
+        return []
+
+
+class SimcIdDuplicatesDetector(Detector):
+    """
+    Elements with two SIMC ID values, as in 'simc_id_remove_duplicates.py'.
+    """
+    file_name = 'simc_id_duplicates.csv'
+    fieldnames = ['item']
+
+    def detect(self, entity: dict) -> list[dict]:
+        if len(get_claims_values(entity, P_SIMC_ID)) == 2:
+            return [{'item': self.entity_url + entity['id']}]
+        return []
+
+
+class DataAtlasFontiumReferencesDetector(Detector):
+    """
+    Statements with a reference 'stated in' Data Atlas Fontium, as in 'data_atlas_fontium_reference_removal.py'.
+    """
+    file_name = 'data_atlas_fontium_references.csv'
+    fieldnames = ['item', 'statement', 'reference']
+
+    def detect(self, entity: dict) -> list[dict]:
+        rows = []
+        for statements in entity.get('claims', {}).values():
+            for statement in statements:
+                for reference in statement.get('references', []):
+                    stated_in_snaks = reference['snaks'].get(P_STATED_IN, [])
+                    if any(snak['snaktype'] == 'value' and snak['datavalue']['value']['id'] == DATA_ATLAS_FONTIUM_ID for snak in stated_in_snaks):
+                        statement_link = self.entity_url + 'statement/' + statement['id'].replace('$', '-', 1)
+                        reference_link = self.reference_url + reference['hash']
+                        rows.append({'item': self.entity_url + entity['id'], 'statement': statement_link, 'reference': reference_link})
+        return rows
+
+
+DETECTORS = [MissingLabelsDetector, AliasesIdenticalAsLabelsDetector, StatedAsDuplicatesDetector, SimcIdTooShortDetector,
+             SimcIdDuplicatesDetector, DataAtlasFontiumReferencesDetector]
+
+
+def scan_dump(dump_path: str, output_directory: str, detectors: list[Detector]) -> int:
+    """
+    Passes every entity of the dump to all the detectors and writes their findings to CSV files in the output directory
+
+    Parameters
+    ----------
+    dump_path : str
+        path to the dump file
+    output_directory : str
+        directory of the output CSV files
+    detectors : list[Detector]
+        detectors to run
+
+    Returns
+    -------
+    int
+        number of scanned entities
+    """
+    output_files = []
+    writers = []
+    for detector in detectors:
+        output_file = open(f'{output_directory}/{detector.file_name}', 'w', encoding='utf-8', newline='')
+        writer = csv.DictWriter(output_file, fieldnames=detector.fieldnames)
+        writer.writeheader()
+        output_files.append(output_file)
+        writers.append(writer)
+
+    number_of_entities = 0
+    try:
+        for entity in read_dump(dump_path):
+            number_of_entities += 1
+            for detector, writer in zip(detectors, writers):
+                writer.writerows(detector.detect(entity))
+    finally:
+        for output_file in output_files:
+            output_file.close()
+
+    return number_of_entities
+
+
+def iter_detection_rows(path: str) -> Iterator[dict[str, str]]:
+    """
+    Reads a CSV file written by a detector row by row, in the same form as the rows of sparql.iter_query_rows()
+
+    Parameters
+    ----------
+    path : str
+        path to the CSV file
+
+    Returns
+    -------
+    Iterator[dict[str, str]]
+        rows of the file
+    """
+    with open(path, encoding='utf-8', newline='') as results_file:
+        yield from csv.DictReader(results_file)
+
+
+def read_detection_results(path: str) -> dict:
+    """
+    Reads a CSV file written by a detector into the structure returned by execute_sparql_query()
+
+    Parameters
+    ----------
+    path : str
+        path to the CSV file
+
+    Returns
+    -------
+    dict
+        rows of the file as SPARQL query result bindings
+    """
+    with open(path, encoding='utf-8', newline='') as results_file:
+        bindings = [{name: {'value': value} for name, value in row.items()} for row in csv.DictReader(results_file)]
+    return {'results': {'bindings': bindings}}
@@ -0,0 +1,204 @@
+"""
+Edit plans separating the analysis from the writes. A dry run records the minimal API calls prepared for every modified
+entity (tools/entity_diff.py) together with the revision they are based on, one JSON line per entity. The plan is applied
+later by apply_plan.py without downloading and analysing the entities again. Entries whose entity has been edited since the
+plan was made are rejected instead of being applied to a different revision.
+"""
+
+import os
+from collections.abc import Iterable, Iterator
+import ujson
+from wikibaseintegrator import entities, wbi_login
+
+import tools.batch_fetcher as batch_fetcher
+import tools.entity_diff as entity_diff
+import tools.report_writer as report_writer
+import tools.write_pool as write_pool
+
+
+class PlanWriter(report_writer.JsonlReportWriter):
+    """
+    Edit plan written during a dry run. Every entity has at most one entry, since the calls of a second entry would be
+    based on the revision made by the first one and the entry would be rejected as stale.
+    """
+
+    def __init__(self, path: str, flush_interval: float = report_writer.FLUSH_INTERVAL):
+        # entities of the entries kept from the previous run
+        self.entity_ids = {entry['id'] for entry in iter_plan(path)} if os.path.exists(path) else set()
+        super().__init__(path, flush_interval=flush_interval)
+
+    def add_entity(self, entity: entities.item.ItemEntity, snapshot: dict, summary: str | None = None) -> int:
+        """
+        Records the changes of the entity made since the snapshot
+
+        Parameters
+        ----------
+        entity : entities.item.ItemEntity
+            modified entity
+        snapshot : dict
+            snapshot taken by entity_diff.take_snapshot() before the modification
+        summary : str | None
+            summary of the edits
+
+        Returns
+        -------
+        int
+            number of planned API calls, 0 if nothing changed
+
+        Raises
+        ------
+        ValueError
+            if the plan already has an entry of the entity
+        """
+        entity_diff.assign_claim_guids(entity)
+        calls = entity_diff.diff_entity(entity, snapshot)
+        if calls:
+            if entity.id in self.entity_ids:
+                raise ValueError(f"{entity.id} is already in the plan, the scripts have to write their plans to separate files")
+            self.entity_ids.add(entity.id)
+            self.write_record({'id': entity.id, 'baserevid': snapshot.get('lastrevid'), 'summary': summary, 'calls': calls})
+        return len(calls)
+
+
+def open_plan(path: str | None, resume: bool = False) -> PlanWriter | None:
+    """
+    Opens the edit plan for writing. The plan is started from scratch unless the run is resumed.
+
+    Parameters
+    ----------
+    path : str | None
+        path of the plan file, no plan is written if None
+    resume : bool
+        keep the entries of the previous run
+
+    Returns
+    -------
+    PlanWriter | None
+        writer of the plan
+    """
+    if path is None:
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if not resume and os.path.exists(path):
+        os.remove(path)
+    return PlanWriter(path)
+
+
+def iter_plan(path: str) -> Iterator[dict]:
+    """
+    Reads the entries of the edit plan
+
+    Parameters
+    ----------
+    path : str
+        path of the plan file
+
+    Returns
+    -------
+    Iterator[dict]
+        entries of the plan with the keys 'id', 'baserevid', 'summary' and 'calls'
+    """
+    with open(path, 'r', encoding='utf-8') as plan_file:
+        for line in plan_file:
+            if line.strip():
+                yield ujson.loads(line)
+
+
+def get_revision_ids(entity_ids: Iterable[str], login: wbi_login._Login | None = None) -> dict[str, int | None]:
+    """
+    Downloads the current revision IDs of the entities, 50 entities in one request
+
+    Parameters
+    ----------
+    entity_ids : Iterable[str]
+        IDs of the entities
+    login : wbi_login._Login | None
+        login instance
+
+    Returns
+    -------
+    dict[str, int | None]
+        revision IDs by entity IDs, None for the entities which do not exist, without the entities which could not be
+        downloaded
+    """
+    return {entity_json['id']: entity_json.get('lastrevid')
+            for entity_json in batch_fetcher.get_entities_json(entity_ids, props=['info'], login=login)}
+
+
+def apply_entry(entry: dict, login: wbi_login._Login | None = None, is_bot: bool = False,
+                maxlag: int = write_pool.MAXLAG) -> int | None:
+    """
+    Sends the API calls of a single plan entry
+
+    Parameters
+    ----------
+    entry : dict
+        entry of the plan
+    login : wbi_login._Login | None
+        login instance
+    is_bot : bool
+        mark the edits as bot edits
+    maxlag : int
+        maximal replication lag in seconds accepted by the server before it refuses the edit
+
+    Returns
+    -------
+    int | None
+        revision ID made by the last call
+    """
+    revision_id, _ = entity_diff.send_calls(entry['calls'], entry['baserevid'], summary=entry.get('summary'), login=login,
+                                            is_bot=is_bot, maxlag=maxlag)
+    return revision_id
+
+
+def apply_plan(entries: Iterable[dict], login: wbi_login._Login | None = None, is_bot: bool = False,
+               max_workers: int = write_pool.MAX_WRITERS, batch_size: int = batch_fetcher.MAX_IDS_PER_REQUEST) -> Iterator[tuple[dict, str]]:
+    """
+    Applies the plan entries with the write pool. The current revisions of the entities are checked in batches before the
+    writes, and the entries based on an older revision are rejected as stale.
+
+    Parameters
+    ----------
+    entries : Iterable[dict]
+        entries of the plan
+    login : wbi_login._Login | None
+        login instance
+    is_bot : bool
+        mark the edits as bot edits
+    max_workers : int
+        maximal number of entities written at the same time
+    batch_size : int
+        number of entries whose revisions are checked with one request
+
+    Returns
+    -------
+    Iterator[tuple[dict, str]]
+        entries with their outcome ('applied', 'stale', 'missing' or the error message), in the order of the plan
+    """
+    session = login.get_session() if login else None
+    with write_pool.WritePool(max_workers=max_workers, session=session) as pool:
+        for batch in batch_fetcher.split_into_batches(entries, batch_size):
+            revision_ids = get_revision_ids([entry['id'] for entry in batch], login=login)
+
+            futures = []
+            for entry in batch:
+                revision_id = revision_ids.get(entry['id'])
+                if entry['id'] not in revision_ids:
+                    futures.append((entry, 'error checking the revision', None))
+                elif revision_id is None:
+                    futures.append((entry, 'missing', None))
+                elif revision_id != entry['baserevid']:
+                    futures.append((entry, 'stale', None))
+                else:
+                    future = pool.submit(entry['id'], apply_entry, entry, login=login, is_bot=is_bot, maxlag=pool.maxlag)
+                    futures.append((entry, 'applied', future))
+
+            for entry, outcome, future in futures:
+                if future is not None:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        outcome = f"error writing to Wikibase {e}"
+                yield entry, outcome
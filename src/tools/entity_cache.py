@@ -0,0 +1,188 @@
+"""
+Local cache of downloaded entities, stored in an SQLite database as compressed JSON together with the last revision ID.
+Cached entities are checked in bulk against the current revision IDs in Wikibase, so only entities that were changed
+since the previous run have to be downloaded again. When the cache grows over its size limit, the least recently used
+entities are removed. The access times of the cache hits are kept in memory and saved together with the next write, so
+reading from the cache does not write to the database.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Iterable, Iterator
+import ujson
+from wikibaseintegrator import wbi_login
+
+import tools.batch_fetcher as batch_fetcher
+
+
+CACHE_PATH = 'data_2025/cache/entities.sqlite'
+MAX_CACHE_SIZE = 2 * 1024 ** 3
+
+
+class EntityCache:
+    """
+    SQLite database with entity JSON data keyed by entity ID. It can be shared by several threads.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_size: int = MAX_CACHE_SIZE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS entities (
+                                       id TEXT PRIMARY KEY,
+                                       lastrevid INTEGER NOT NULL,
+                                       data BLOB NOT NULL,
+                                       size INTEGER NOT NULL,
+                                       accessed REAL NOT NULL
+                                   )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entities_accessed ON entities (accessed)")
+        self.connection.commit()
+        self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entities").fetchone()[0]
+        self.valid_ids: set[str] = set()
+        # access times of the cache hits not saved in the database yet
+        self.access_times: dict[str, float] = {}
+
+    def get(self, entity_id: str) -> dict | None:
+        """
+        Returns JSON data of the cached entity or None if the entity is not in the cache
+
+        Parameters
+        ----------
+        entity_id : str
+            ID of the entity
+
+        Returns
+        -------
+        dict | None
+            JSON data of the entity as returned by 'wbgetentities'
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM entities WHERE id = ?", (entity_id,)).fetchone()
+            if row is None:
+                return None
+            self.access_times[entity_id] = time.time()
+        return ujson.loads(zlib.decompress(row[0]))
+
+    def put(self, entity_json: dict):
+        """
+        Saves JSON data of the entity in the cache, replacing the older version
+
+        Parameters
+        ----------
+        entity_json : dict
+            JSON data of the entity as returned by 'wbgetentities'
+        """
+        data = zlib.compress(ujson.dumps(entity_json, ensure_ascii=False).encode('utf-8'))
+        with self.lock:
+            old_row = self.connection.execute("SELECT size FROM entities WHERE id = ?", (entity_json['id'],)).fetchone()
+            if old_row is not None:
+                self.size -= old_row[0]
+            self.connection.execute("INSERT OR REPLACE INTO entities (id, lastrevid, data, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                                    (entity_json['id'], int(entity_json['lastrevid']), data, len(data), time.time()))
+            self.size += len(data)
+            self.valid_ids.add(entity_json['id'])
+            self.access_times.pop(entity_json['id'], None)
+            self.save_access_times()
+            if self.size > self.max_size:
+                self.evict()
+            self.connection.commit()
+
+    def save_access_times(self):
+        """
+        Saves the access times of the cache hits in the database in a single batch.
+        Has to be called with the lock acquired, the changes are committed by the caller.
+        """
+        if self.access_times:
+            self.connection.executemany("UPDATE entities SET accessed = ? WHERE id = ?",
+                                        [(accessed, entity_id) for entity_id, accessed in self.access_times.items()])
+            self.access_times.clear()
+
+    def evict(self):
+        """
+        Removes the least recently used entities until the cache is smaller than 90% of its size limit.
+        Has to be called with the lock acquired.
+        """
+        rows = self.connection.execute("SELECT id, size FROM entities ORDER BY accessed")
+        ids_to_remove = []
+        for entity_id, size in rows:
+            if self.size <= self.max_size * 0.9:
+                break
+            ids_to_remove.append((entity_id,))
+            self.size -= size
+            self.valid_ids.discard(entity_id)
+        self.connection.executemany("DELETE FROM entities WHERE id = ?", ids_to_remove)
+
+    def revalidate(self, entity_ids: list[str], login: wbi_login._Login | None = None):
+        """
+        Compares revision IDs of the cached entities with the current ones, using batched 'wbgetentities' requests that
+        return only the page info. Entities that are up to date are marked as valid, the outdated ones are removed.
+
+        Parameters
+        ----------
+        entity_ids : list[str]
+            IDs of the entities to check
+        login : wbi_login._Login | None
+            login instance used for the requests
+        """
+        with self.lock:
+            cached_revisions = {}
+            for entity_id in entity_ids:
+                row = self.connection.execute("SELECT lastrevid FROM entities WHERE id = ?", (entity_id,)).fetchone()
+                if row is not None:
+                    cached_revisions[entity_id] = row[0]
+        if not cached_revisions:
+            return
+
+        outdated_ids = []
+        for entity_json in batch_fetcher.get_entities_json(cached_revisions.keys(), props=['info'], login=login):
+            entity_id = entity_json['id']
+            if 'missing' not in entity_json and int(entity_json['lastrevid']) == cached_revisions[entity_id]:
+                self.valid_ids.add(entity_id)
+            else:
+                outdated_ids.append(entity_id)
+
+        with self.lock:
+            for entity_id in outdated_ids:
+                row = self.connection.execute("SELECT size FROM entities WHERE id = ?", (entity_id,)).fetchone()
+                if row is not None:
+                    self.size -= row[0]
+                self.connection.execute("DELETE FROM entities WHERE id = ?", (entity_id,))
+                self.valid_ids.discard(entity_id)
+            self.connection.commit()
+
+    def revalidated(self, entity_ids: Iterable[str], login: wbi_login._Login | None = None) -> Iterator[str]:
+        """
+        Passes the given entity IDs through, revalidating them in batches just before they are yielded
+
+        Parameters
+        ----------
+        entity_ids : Iterable[str]
+            IDs of the entities
+        login : wbi_login._Login | None
+            login instance used for the requests
+
+        Returns
+        -------
+        Iterator[str]
+            the same entity IDs
+        """
+        for batch in batch_fetcher.split_into_batches(entity_ids):
+            self.revalidate(batch, login=login)
+            yield from batch
+
+    def close(self):
+        """
+        Saves the access times and closes the database connection
+        """
+        with self.lock:
+            self.save_access_times()
+            self.connection.commit()
+            self.connection.close()
@@ -0,0 +1,546 @@
+"""
+Minimal writes of modified entities. The entity is compared with the snapshot of its JSON taken after it was downloaded and
+only the changed parts are sent to Wikibase with targeted API calls (wbsetclaimvalue, wbremoveclaims, wbsetreference,
+wbsetaliases, ...), instead of posting the whole entity with wbeditentity. Changes which would need more than
+MAX_TARGETED_CALLS calls (every call makes a revision), or which cannot be sent with the targeted calls, are sent with a
+single wbeditentity call carrying only the changed parts. Every call carries the base revision ID, so an edit made by
+someone else in the meantime is reported as a conflict instead of being overwritten.
+"""
+
+import copy
+import uuid
+import ujson
+from wikibaseintegrator import entities, wbi_login
+from wikibaseintegrator.wbi_helpers import mediawiki_api_call_helper
+
+import tools.metrics as metrics
+
+
+# changes needing more targeted API calls are sent with a single wbeditentity call
+MAX_TARGETED_CALLS = 3
+
+
+def take_snapshot(entity: entities.item.ItemEntity) -> dict:
+    """
+    Copies the current JSON of the entity, to be compared with the entity after its modification
+
+    Parameters
+    ----------
+    entity : entities.item.ItemEntity
+        downloaded entity
+
+    Returns
+    -------
+    dict
+        deep copy of the entity JSON together with its revision ID
+    """
+    snapshot = copy.deepcopy(entity.get_json())
+    snapshot['lastrevid'] = entity.lastrevid
+
+    # hashes of references are needed to replace them, but they are not a part of the JSON made by WikibaseIntegrator
+    claims_json = {claim['id']: claim for statement in snapshot.get('claims', {}).values() for claim in statement if 'id' in claim}
+    for claim in entity.claims:
+        if claim.id in claims_json:
+            for reference_json, reference in zip(claims_json[claim.id].get('references', []), claim.references):
+                reference_json['hash'] = reference.hash
+
+    return snapshot
+
+
+def update_reference_hashes(entity: entities.item.ItemEntity, entity_json: dict):
+    """
+    Sets the hashes of all the references of the entity from the entity JSON returned by wbeditentity, so that the
+    references can be changed by the next write without downloading the entity again
+
+    Parameters
+    ----------
+    entity : entities.item.ItemEntity
+        written entity
+    entity_json : dict
+        entity JSON from the response of the API
+    """
+    claims_json = {claim['id']: claim for statement in entity_json.get('claims', {}).values() for claim in statement}
+    for claim in entity.claims:
+        if claim.id in claims_json:
+            for reference, reference_json in zip(claim.references, claims_json[claim.id].get('references', [])):
+                reference.hash = reference_json.get('hash')
+
+
+def update_reference_hash(entity: entities.item.ItemEntity, call: dict, results: dict):
+    """
+    Sets the hash of the reference written by wbsetreference in the entity, so that the reference can be changed by the
+    next write without downloading the entity again
+
+    Parameters
+    ----------
+    entity : entities.item.ItemEntity
+        written entity
+    call : dict
+        parameters of the wbsetreference call
+    results : dict
+        response of the API
+    """
+    reference_json = {'snaks': ujson.loads(call['snaks']), 'snaks-order': ujson.loads(call['snaks-order'])}
+    for claim in entity.claims:
+        if claim.id != call['statement']:
+            continue
+        for reference in claim.references:
+            if not reference.hash and strip_hashes(reference.get_json()) == reference_json:
+                reference.hash = results['reference']['hash']
+                return
+
+
+def to_json(json_data) -> str:
+    """
+    Serializes a part of the entity JSON as a parameter of an API call
+
+    Parameters
+    ----------
+    json_data
+        JSON data of any part of an entity
+
+    Returns
+    -------
+    str
+        serialized data
+    """
+    return ujson.dumps(json_data, ensure_ascii=False, escape_forward_slashes=False)
+
+
+def strip_hashes(json_data):
+    """
+    Removes the 'hash' keys, which are recomputed by Wikibase, from the JSON of snaks and references
+
+    Parameters
+    ----------
+    json_data
+        JSON data of any part of an entity
+
+    Returns
+    -------
+        the same data without 'hash' keys
+    """
+    if isinstance(json_data, dict):
+        return {key: strip_hashes(value) for key, value in json_data.items() if key != 'hash'}
+    if isinstance(json_data, list):
+        return [strip_hashes(value) for value in json_data]
+    return json_data
+
+
+def is_removed(json_data: dict) -> bool:
+    """
+    Checks if the label, alias or claim is marked as removed in the entity JSON
+
+    Parameters
+    ----------
+    json_data : dict
+        JSON of a single label, alias or claim
+
+    Returns
+    -------
+    bool
+        True if the element is marked as removed
+    """
+    return 'remove' in json_data
+
+
+def get_term_changes(field: str, snapshot: dict, current: dict) -> dict[str, str]:
+    """
+    Finds the changed labels or descriptions
+
+    Parameters
+    ----------
+    field : str
+        'labels' or 'descriptions'
+    snapshot : dict
+        JSON of the entity before the modification
+    current : dict
+        JSON of the entity after the modification
+
+    Returns
+    -------
+    dict[str, str]
+        new values by language, an empty string if the value was removed
+    """
+    old_values = {language: value['value'] for language, value in snapshot.get(field, {}).items() if not is_removed(value)}
+    new_values = {language: value['value'] for language, value in current.get(field, {}).items() if not is_removed(value)}
+    return {language: new_values.get(language, '') for language in dict.fromkeys([*old_values, *new_values])
+            if old_values.get(language) != new_values.get(language)}
+
+
+def get_alias_changes(snapshot: dict, current: dict) -> dict[str, tuple[list[str], list[str]]]:
+    """
+    Finds the removed and added aliases
+
+    Parameters
+    ----------
+    snapshot : dict
+        JSON of the entity before the modification
+    current : dict
+        JSON of the entity after the modification
+
+    Returns
+    -------
+    dict[str, tuple[list[str], list[str]]]
+        removed and added aliases by language, only for the changed languages
+    """
+    old_aliases = snapshot.get('aliases', {})
+    new_aliases = current.get('aliases', {})
+    changes = {}
+    for language in dict.fromkeys([*old_aliases, *new_aliases]):
+        old_values = [alias['value'] for alias in old_aliases.get(language, []) if not is_removed(alias)]
+        new_values = [alias['value'] for alias in new_aliases.get(language, []) if not is_removed(alias)]
+        values_to_remove = [value for value in old_values if value not in new_values]
+        values_to_add = [value for value in new_values if value not in old_values]
+        if values_to_remove or values_to_add:
+            changes[language] = (values_to_remove, values_to_add)
+    return changes
+
+
+def diff_terms(entity_id: str, snapshot: dict, current: dict) -> list[dict]:
+    """
+    Prepares the API calls changing labels, descriptions and aliases
+
+    Parameters
+    ----------
+    entity_id : str
+        ID of the entity
+    snapshot : dict
+        JSON of the entity before the modification
+    current : dict
+        JSON of the entity after the modification
+
+    Returns
+    -------
+    list[dict]
+        parameters of the API calls
+    """
+    calls = []
+    for field, action in (('labels', 'wbsetlabel'), ('descriptions', 'wbsetdescription')):
+        for language, value in get_term_changes(field, snapshot, current).items():
+            calls.append({'action': action, 'id': entity_id, 'language': language, 'value': value})
+
+    for language, (values_to_remove, values_to_add) in get_alias_changes(snapshot, current).items():
+        call = {'action': 'wbsetaliases', 'id': entity_id, 'language': language}
+        if values_to_remove:
+            call['remove'] = '|'.join(values_to_remove)
+        if values_to_add:
+            call['add'] = '|'.join(values_to_add)
+        calls.append(call)
+
+    return calls
+
+
+def diff_references(old_claim: dict, new_claim: dict) -> list[dict]:
+    """
+    Prepares the API calls changing references of a single statement. Changed references are replaced in place, so that
+    the order of references is kept.
+
+    Parameters
+    ----------
+    old_claim : dict
+        JSON of the statement before the modification
+    new_claim : dict
+        JSON of the statement after the modification
+
+    Returns
+    -------
+    list[dict]
+        parameters of the API calls
+    """
+    old_references = old_claim.get('references', [])
+    new_references = new_claim.get('references', [])
+    old_stripped = [strip_hashes(reference) for reference in old_references]
+    new_stripped = [strip_hashes(reference) for reference in new_references]
+
+    references_to_remove = [reference for reference, stripped in zip(old_references, old_stripped) if stripped not in new_stripped]
+    references_to_add = [stripped for stripped in new_stripped if stripped not in old_stripped]
+
+    calls = []
+    for position, reference in enumerate(references_to_add):
+        call = {'action': 'wbsetreference', 'statement': new_claim['id'], 'snaks': to_json(reference['snaks']),
+                'snaks-order': to_json(reference['snaks-order'])}
+        if position < len(references_to_remove) and references_to_remove[position].get('hash'):
+            call['reference'] = references_to_remove[position]['hash']
+        calls.append(call)
+
+    hashes = [reference['hash'] for reference in references_to_remove[len(references_to_add):] if reference.get('hash')]
+    if hashes:
+        calls.append({'action': 'wbremovereferences', 'statement': new_claim['id'], 'references': '|'.join(hashes)})
+
+    return calls
+
+
+def diff_claims(entity_id: str, snapshot: dict, current: dict) -> list[dict]:
+    """
+    Prepares the API calls changing statements. Removed statements are removed with a single call, a changed value is set
+    with wbsetclaimvalue, changed references with wbsetreference and wbremovereferences, and any other change (qualifiers,
+    rank) or a new statement is sent with wbsetclaim.
+
+    Parameters
+    ----------
+    entity_id : str
+        ID of the entity
+    snapshot : dict
+        JSON of the entity before the modification
+    current : dict
+        JSON of the entity after the modification
+
+    Returns
+    -------
+    list[dict]
+        parameters of the API calls
+    """
+    old_claims = {claim['id']: claim for statement in snapshot.get('claims', {}).values() for claim in statement
+                  if 'id' in claim and not is_removed(claim)}
+
+    calls = []
+    claims_to_remove = []
+    for statement in current.get('claims', {}).values():
+        for claim in statement:
+            claim_id = claim.get('id')
+            if claim_id not in old_claims:
+                if not is_removed(claim):
+                    new_claim = dict(claim, id=claim_id or f'{entity_id}${uuid.uuid4()}')
+                    calls.append({'action': 'wbsetclaim', 'claim': to_json(strip_hashes(new_claim))})
+                continue
+            if is_removed(claim):
+                claims_to_remove.append(claim_id)
+                continue
+
+            old_claim = strip_hashes(old_claims[claim_id])
+            new_claim = strip_hashes(claim)
+            if old_claim == new_claim:
+                continue
+
+            other_fields_changed = any(old_claim.get(field) != new_claim.get(field) for field in ('qualifiers', 'qualifiers-order', 'rank'))
+            if other_fields_changed:
+                calls.append({'action': 'wbsetclaim', 'claim': to_json(new_claim)})
+                continue
+
+            if old_claim['mainsnak'] != new_claim['mainsnak']:
+                call = {'action': 'wbsetclaimvalue', 'claim': claim_id, 'snaktype': new_claim['mainsnak']['snaktype']}
+                if new_claim['mainsnak']['snaktype'] == 'value':
+                    call['value'] = to_json(new_claim['mainsnak']['datavalue']['value'])
+                calls.append(call)
+
+            calls.extend(diff_references(old_claims[claim_id], claim))
+
+    if claims_to_remove:
+        calls.insert(0, {'action': 'wbremoveclaims', 'claim': '|'.join(claims_to_remove)})
+
+    return calls
+
+
+def diff_as_edit(entity_id: str, snapshot: dict, current: dict) -> dict:
+    """
+    Prepares a single wbeditentity call with only the changed terms and statements. Removed labels, descriptions, aliases
+    and statements are marked with the 'remove' key, added aliases with the 'add' key.
+
+    Parameters
+    ----------
+    entity_id : str
+        ID of the entity
+    snapshot : dict
+        JSON of the entity before the modification
+    current : dict
+        JSON of the entity after the modification
+
+    Returns
+    -------
+    dict
+        parameters of the API call
+    """
+    data = {}
+    for field in ('labels', 'descriptions'):
+        for language, value in get_term_changes(field, snapshot, current).items():
+            term = {'language': language, 'value': value} if value else {'language': language, 'remove': ''}
+            data.setdefault(field, {})[language] = term
+
+    for language, (values_to_remove, values_to_add) in get_alias_changes(snapshot, current).items():
+        data.setdefault('aliases', {})[language] = ([{'language': language, 'value': value, 'remove': ''} for value in values_to_remove]
+                                                    + [{'language': language, 'value': value, 'add': ''} for value in values_to_add])
+
+    old_claims = {claim['id']: claim for statement in snapshot.get('claims', {}).values() for claim in statement
+                  if 'id' in claim and not is_removed(claim)}
+    claims = []
+    for statement in current.get('claims', {}).values():
+        for claim in statement:
+            claim_id = claim.get('id')
+            if claim_id not in old_claims:
+                if not is_removed(claim):
+                    claims.append(strip_hashes(dict(claim, id=claim_id or f'{entity_id}${uuid.uuid4()}')))
+            elif is_removed(claim):
+                claims.append({'id': claim_id, 'remove': ''})
+            elif strip_hashes(old_claims[claim_id]) != strip_hashes(claim):
+                claims.append(strip_hashes(claim))
+    if claims:
+        data['claims'] = claims
+
+    return {'action': 'wbeditentity', 'id': entity_id, 'data': to_json(data)}
+
+
+def diff_entity(entity: entities.item.ItemEntity, snapshot: dict) -> list[dict]:
+    """
+    Prepares the API calls which change the entity in Wikibase from the snapshot to its current state. The changes are sent
+    with a single wbeditentity call when they need more than MAX_TARGETED_CALLS calls, or when an alias contains the '|'
+    character, which separates the values of wbsetaliases.
+
+    Parameters
+    ----------
+    entity : entities.item.ItemEntity
+        modified entity
+    snapshot : dict
+        snapshot taken by take_snapshot() before the modification
+
+    Returns
+    -------
+    list[dict]
+        parameters of the API calls, without the token, base revision ID and summary
+    """
+    current = entity.get_json()
+    calls = diff_terms(entity.id, snapshot, current) + diff_claims(entity.id, snapshot, current)
+    alias_changes = get_alias_changes(snapshot, current).values()
+    has_separator = any('|' in value for values_to_remove, values_to_add in alias_changes for value in values_to_remove + values_to_add)
+    if len(calls) > MAX_TARGETED_CALLS or has_separator:
+        return [diff_as_edit(entity.id, snapshot, current)]
+    return calls
+
+
+def assign_claim_guids(entity: entities.item.ItemEntity):
+    """
+    Gives GUIDs to the new statements of the entity before they are written, so that they are not added again by the next
+    write and they can be addressed by later edits
+
+    Parameters
+    ----------
+    entity : entities.item.ItemEntity
+        modified entity
+    """
+    for claim in entity.claims:
+        if not claim.id and not claim.removed:
+            claim.id = f'{entity.id}${uuid.uuid4()}'
+
+
+def send_calls(calls: list[dict], base_revision_id: int | None, summary: str | None = None,
+               login: wbi_login._Login | None = None, is_bot: bool = False, maxlag: int = 5) -> tuple[int | None, list[dict]]:
+    """
+    Sends the API calls prepared by diff_entity() one after another, every call based on the revision made by the previous one
+
+    Parameters
+    ----------
+    calls : list[dict]
+        parameters of the API calls
+    base_revision_id : int | None
+        revision of the entity the first call is based on
+    summary : str | None
+        summary of the edits
+    login : wbi_login._Login | None
+        login instance
+    is_bot : bool
+        mark the edits as bot edits
+    maxlag : int
+        maximal replication lag in seconds accepted by the server before it refuses the edit
+
+    Returns
+    -------
+    tuple[int | None, list[dict]]
+        revision ID made by the last call and the responses of the API
+    """
+    responses = []
+    for call in calls:
+        data = dict(call, format='json')
+        if base_revision_id:
+            data['baserevid'] = base_revision_id
+        if summary:
+            data['summary'] = summary
+        if is_bot:
+            data['bot'] = ''
+        results = mediawiki_api_call_helper(data=data, login=login, maxlag=maxlag, is_bot=is_bot)
+        # edits of statements return the revision in 'pageinfo', edits of terms and wbeditentity in 'entity'
+        page_info = results.get('pageinfo') or results.get('entity') or {}
+        base_revision_id = page_info.get('lastrevid', base_revision_id)
+        responses.append(results)
+
+    return base_revision_id, responses
+
+
+def write_changes(entity: entities.item.ItemEntity, snapshot: dict, summary: str | None = None,
+                  login: wbi_login._Login | None = None, is_bot: bool | None = None, maxlag: int = 5) -> int:
+    """
+    Sends only the changes of the entity to Wikibase. Every call is based on the revision made by the previous one, starting
+    from the revision of the snapshot. After the write the snapshot is updated to the current state of the entity, so that
+    the entity can be modified and written again.
+
+    Parameters
+    ----------
+    entity : entities.item.ItemEntity
+        modified entity
+    snapshot : dict
+        snapshot taken by take_snapshot() before the modification
+    summary : str | None
+        summary of the edits
+    login : wbi_login._Login | None
+        login instance, the login of the entity if None
+    is_bot : bool | None
+        mark the edits as bot edits, the setting of the entity if None
+    maxlag : int
+        maximal replication lag in seconds accepted by the server before it refuses the edit
+
+    Returns
+    -------
+    int
+        number of API calls, 0 if nothing changed
+    """
+    login = login or entity.api.login
+    is_bot = is_bot if is_bot is not None else entity.api.is_bot
+
+    assign_claim_guids(entity)
+    calls = diff_entity(entity, snapshot)
+    base_revision_id, responses = send_calls(calls, snapshot.get('lastrevid'), summary=summary, login=login, is_bot=is_bot,
+                                             maxlag=maxlag)
+    for call, results in zip(calls, responses):
+        if call['action'] == 'wbsetreference':
+            update_reference_hash(entity, call, results)
+        elif call['action'] == 'wbeditentity':
+            update_reference_hashes(entity, results['entity'])
+
+    if calls:
+        entity.lastrevid = base_revision_id
+        snapshot.clear()
+        snapshot.update(take_snapshot(entity))
+
+    return len(calls)
+
+
+def write_entity(entity: entities.item.ItemEntity, snapshot: dict, minimal: bool = True, summary: str | None = None,
+                 maxlag: int = 5) -> int:
+    """
+    Writes the entity either with minimal writes or as a whole with entity.write(), keeping the snapshot up to date
+
+    Parameters
+    ----------
+    entity : entities.item.ItemEntity
+        modified entity
+    snapshot : dict
+        snapshot taken by take_snapshot() before the modification
+    minimal : bool
+        send only the changes with write_changes(), otherwise the whole entity is sent
+    summary : str | None
+        summary of the edits
+    maxlag : int
+        maximal replication lag in seconds accepted by the server before it refuses the edit
+
+    Returns
+    -------
+    int
+        number of API calls
+    """
+    with metrics.measure('write.entity'):
+        if minimal:
+            return write_changes(entity, snapshot, summary=summary, maxlag=maxlag)
+        entity.write(summary=summary, maxlag=maxlag)
+
+    snapshot.clear()
+    snapshot.update(take_snapshot(entity))
+    return 1
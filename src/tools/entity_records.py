@@ -0,0 +1,131 @@
+"""
+Compact read-only representation of entities for the scans which read only a few fields of every item. The records are
+built straight from the entity JSON (parsed with ujson when read from text), keep their fields in __slots__ and group the
+statements in a dictionary by property, so a scan does not build the whole WikibaseIntegrator object graph of every item.
+The records have the same attribute names as the models of WikibaseIntegrator (e.g. claim.mainsnak.property_number,
+claim.mainsnak.datavalue). References are not kept in the records, the entity is kept as it was read, the JSON text or
+the downloaded JSON, from which the full entity is built when the item has to be edited, with to_entity(). The downloaded
+JSON is serialized only when the text is needed, so the scans which edit nothing never serialize the entities.
+"""
+
+import ujson
+from wikibaseintegrator import WikibaseIntegrator, entities
+
+
+class SnakRecord:
+    """
+    Read-only snak: the main value of a statement or a qualifier.
+    """
+    __slots__ = ('snaktype', 'property_number', 'datatype', 'datavalue')
+
+    def __init__(self, snak_json: dict):
+        self.snaktype = snak_json.get('snaktype', 'value')
+        self.property_number = snak_json['property']
+        self.datatype = snak_json.get('datatype')
+        self.datavalue = snak_json.get('datavalue', {})
+
+
+class ClaimRecord:
+    """
+    Read-only statement with its main value and qualifiers by property, without the references.
+    """
+    __slots__ = ('id', 'rank', 'mainsnak', 'qualifiers')
+
+    def __init__(self, claim_json: dict):
+        self.id = claim_json.get('id')
+        self.rank = claim_json.get('rank', 'normal')
+        self.mainsnak = SnakRecord(claim_json['mainsnak'])
+        self.qualifiers = {property_number: [SnakRecord(snak_json) for snak_json in snaks_json]
+                           for property_number, snaks_json in claim_json.get('qualifiers', {}).items()}
+
+
+class EntityRecord:
+    """
+    Read-only item or property, with labels, descriptions and aliases as plain strings by language and the statements
+    by property.
+    """
+    __slots__ = ('id', 'type', 'lastrevid', 'labels', 'descriptions', 'aliases', 'claims', 'source')
+
+    def __init__(self, entity_json: dict, text: str | None = None):
+        self.id = entity_json['id']
+        self.type = entity_json.get('type', 'property' if self.id.startswith('P') else 'item')
+        self.lastrevid = entity_json.get('lastrevid')
+        self.labels = {language: label['value'] for language, label in entity_json.get('labels', {}).items()}
+        self.descriptions = {language: description['value']
+                             for language, description in entity_json.get('descriptions', {}).items()}
+        self.aliases = {language: [alias['value'] for alias in aliases]
+                        for language, aliases in entity_json.get('aliases', {}).items()}
+        self.claims = {property_number: [ClaimRecord(claim_json) for claim_json in claims_json]
+                       for property_number, claims_json in entity_json.get('claims', {}).items()}
+        # the text takes several times less memory than the parsed JSON, so it is kept when the record is built from it
+        self.source = text if text is not None else entity_json
+
+    @classmethod
+    def from_text(cls, text: str) -> 'EntityRecord':
+        """
+        Builds the record from the JSON text of the entity, e.g. a line of a dump or a cached entity
+
+        Parameters
+        ----------
+        text : str
+            JSON of the entity
+
+        Returns
+        -------
+        EntityRecord
+            record of the entity
+        """
+        return cls(ujson.loads(text), text)
+
+    @property
+    def text(self) -> str:
+        """
+        JSON text of the entity, serialized from the downloaded JSON when the record was not built from text
+        """
+        if isinstance(self.source, str):
+            return self.source
+        return ujson.dumps(self.source, escape_forward_slashes=False)
+
+    def get_claims(self, property_number: str) -> list[ClaimRecord]:
+        """
+        Returns the statements of the property
+
+        Parameters
+        ----------
+        property_number : str
+            property, e.g. 'P84'
+
+        Returns
+        -------
+        list[ClaimRecord]
+            statements of the property, empty if there are none
+        """
+        return self.claims.get(property_number, [])
+
+    def get_json(self) -> dict:
+        """
+        Returns a new copy of the whole JSON of the entity, e.g. to read the references
+
+        Returns
+        -------
+        dict
+            JSON of the entity as returned by 'wbgetentities'
+        """
+        return ujson.loads(self.text)
+
+    def to_entity(self, wbi: WikibaseIntegrator) -> entities.item.ItemEntity | entities.property.PropertyEntity:
+        """
+        Builds the full WikibaseIntegrator entity from the JSON text, so that it can be modified and written
+
+        Parameters
+        ----------
+        wbi : WikibaseIntegrator
+            WikibaseIntegrator instance used by the entity for writing
+
+        Returns
+        -------
+        entities.item.ItemEntity | entities.property.PropertyEntity
+            full entity
+        """
+        entity_factory = wbi.property if self.type == 'property' else wbi.item
+        return entity_factory.new().from_json(json_data=self.get_json())
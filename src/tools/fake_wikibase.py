@@ -0,0 +1,825 @@
+"""
+Local stand-in for the Wikibase instance, used to test and benchmark the scripts without sending any request to
+wikihum.lab.dariah.pl. The server runs in a thread of the current process and answers the API actions used by the scripts
+(reading, editing, merging and deleting entities) from entities kept in memory, e.g. read from a JSON dump with
+dump_scanner.read_dump(). SPARQL queries are answered from fixture rows chosen by a fragment of the query. The latency
+of the responses, the share of edits refused because of replication lag (maxlag) and the share of edit conflicts can be
+set, and the server counts the requests and the highest number of requests handled at the same time.
+
+Usage:
+    with FakeWikibase(dump_scanner.read_dump('dump.json'), latency=0.05, maxlag_rate=0.01) as wikibase:
+        wikibase.configure()
+        ...
+        print(wikibase.get_stats())
+"""
+
+import csv
+import hashlib
+import io
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterable
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import ujson
+from wikibaseintegrator.wbi_config import config as wbi_config
+
+
+API_PATH = '/w/api.php'
+SPARQL_PATH = '/bigdata/sparql'
+CSRF_TOKEN = 'fakecsrftoken+\\'
+LOGIN_TOKEN = 'fakelogintoken+\\'
+# canonical names and numbers of the entity namespaces, as in a default Wikibase installation
+NAMESPACES = {'Item': 120, 'Property': 122}
+ENTITY_PREFIXES = {'Q': 'Item', 'P': 'Property'}
+ALLPAGES_LIMIT = 500
+# lag in seconds reported in the simulated maxlag errors
+LAG = 5
+WRITE_ACTIONS = ('wbeditentity', 'wbsetclaim', 'wbsetclaimvalue', 'wbremoveclaims', 'wbsetreference',
+                 'wbremovereferences', 'wbsetaliases', 'wbsetlabel', 'wbsetdescription', 'wbcreateredirect',
+                 'wbmergeitems', 'delete')
+
+
+class ApiError(Exception):
+    """
+    Error returned by the API in the 'error' object of the response.
+    """
+
+    def __init__(self, code: str, info: str, headers: dict | None = None):
+        super().__init__(info)
+        self.code = code
+        self.info = info
+        self.headers = headers or {}
+
+
+def get_hash(json_data) -> str:
+    """
+    Returns the hash of a snak or a reference, computed from its JSON data like in Wikibase
+
+    Parameters
+    ----------
+    json_data
+        JSON data without the hash
+
+    Returns
+    -------
+    str
+        SHA-1 of the data
+    """
+    return hashlib.sha1(ujson.dumps(json_data, sort_keys=True).encode()).hexdigest()
+
+
+def get_title(entity_id: str) -> str:
+    """
+    Returns the title of the page of the entity, e.g. 'Item:Q123'
+    """
+    return f'{ENTITY_PREFIXES[entity_id[0]]}:{entity_id}'
+
+
+def get_entity_number(entity_id: str) -> int:
+    """
+    Returns the numeric part of the entity ID, e.g. 123 for 'Q123'
+    """
+    return int(entity_id[1:])
+
+
+def prepare_reference(reference: dict) -> dict:
+    """
+    Completes the hash and the order of snaks of the reference
+    """
+    reference.setdefault('snaks-order', list(reference.get('snaks', {})))
+    reference['hash'] = reference.get('hash') or get_hash({'snaks': reference.get('snaks', {})})
+    return reference
+
+
+def prepare_claim(claim: dict, entity_id: str) -> dict:
+    """
+    Completes the GUID, rank, type and the hashes of the references of a claim
+    """
+    claim['id'] = claim.get('id') or f'{entity_id}${uuid.uuid4()}'
+    claim.setdefault('type', 'statement')
+    claim.setdefault('rank', 'normal')
+    for reference in claim.get('references', []):
+        prepare_reference(reference)
+    return claim
+
+
+def iter_values(json_data: dict | list) -> Iterable:
+    """
+    Yields the values of a part of the entity, given in the API either as a dictionary (e.g. keyed by language) or as a list
+    """
+    for value in (json_data.values() if isinstance(json_data, dict) else json_data):
+        if isinstance(value, list):
+            yield from value
+        else:
+            yield value
+
+
+def get_projection(query: str) -> list[str] | None:
+    """
+    Returns the names of the variables selected by the SPARQL query, None if they cannot be read from the query
+    """
+    if re.search(r'SELECT\s*\(\s*COUNT', query, re.IGNORECASE):
+        return ['count']
+    match = re.search(r'SELECT\s+(?:DISTINCT\s+)?((?:\?\w+\s*)+)', query, re.IGNORECASE)
+    if match is None:
+        return None
+    return re.findall(r'\?(\w+)', match.group(1))
+
+
+def unescape_literal(literal: str) -> str:
+    """
+    Reads the value of a quoted SPARQL string literal, written by sparql.to_string_literal()
+    """
+    return re.sub(r'\\(.)', lambda match: {'n': '\n', 'r': '\r'}.get(match.group(1), match.group(1)), literal[1:-1])
+
+
+def filter_rows(query: str, rows: list[dict[str, str]]) -> list[dict[str, str]]:
+    """
+    Applies to the fixture rows the parts of the query which the scripts use to split the results: the VALUES clause,
+    the keyset FILTER and the ORDER BY of sparql.iter_query_rows() and the LIMIT
+
+    Parameters
+    ----------
+    query : str
+        SPARQL query
+    rows : list[dict[str, str]]
+        all the rows of the fixture
+
+    Returns
+    -------
+    list[dict[str, str]]
+        rows of the results
+    """
+    literal = r'"(?:[^"\\]|\\.)*"'
+    for variable, values_clause in re.findall(r'VALUES\s+\?(\w+)\s*\{([^}]*)\}', query):
+        values = {unescape_literal(value) for value in re.findall(literal, values_clause)}
+        rows = [row for row in rows if row.get(variable) in values]
+
+    order_match = re.search(r'ORDER BY\s+((?:STR\(\?\w+\)\s*)+)', query)
+    if order_match:
+        variables = re.findall(r'\?(\w+)', order_match.group(1))
+        rows = sorted(rows, key=lambda row: tuple(row.get(variable, '') for variable in variables))
+        last_values = dict(re.findall(rf'STR\(\?(\w+)\) > ({literal})', query))
+        if last_values:
+            last_row = tuple(unescape_literal(last_values[variable]) for variable in variables)
+            rows = [row for row in rows if tuple(row.get(variable, '') for variable in variables) > last_row]
+
+    limit_match = re.search(r'LIMIT\s+(\d+)\s*$', query.strip())
+    if limit_match:
+        rows = rows[:int(limit_match.group(1))]
+    return rows
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the HTTP requests, keeping the connections alive like the real server.
+    """
+    protocol_version = 'HTTP/1.1'
+    server: 'FakeWikibaseServer'
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def handle_request(self):
+        url = urlsplit(self.path)
+        parameters = parse_qs(url.query, keep_blank_values=True)
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            body = self.rfile.read(length).decode('utf-8')
+            if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                parameters.update(parse_qs(body, keep_blank_values=True))
+        parameters = {name: values[0] for name, values in parameters.items()}
+
+        if url.path == SPARQL_PATH:
+            status, headers, content = self.server.wikibase.handle_sparql(parameters, self.headers.get('Accept', ''))
+        elif url.path == API_PATH:
+            status, headers, content = self.server.wikibase.handle_api(parameters)
+        else:
+            status, headers, content = 404, {'Content-Type': 'text/plain'}, b'Not found'
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeWikibaseServer(ThreadingHTTPServer):
+    """
+    HTTP server with a reference to the simulated Wikibase.
+    """
+    daemon_threads = True
+
+    def __init__(self, wikibase: 'FakeWikibase', port: int):
+        self.wikibase = wikibase
+        super().__init__(('127.0.0.1', port), RequestHandler)
+
+
+class FakeWikibase:
+    """
+    Wikibase API and SPARQL endpoint served from memory. The behaviour of the server can be changed while it is running
+    by setting the attributes (e.g. maxlag_rate).
+
+    Parameters
+    ----------
+    entities : Iterable[dict] | None
+        JSON data of the entities, e.g. read from a dump
+    sparql_results : dict[str, list[dict[str, str]]] | None
+        rows of the results for the queries containing the key, e.g. {'wdt:P75': [{'item': '...', 'simc': '0918123'}]}
+    latency : float
+        seconds every request takes
+    jitter : float
+        maximal random delay in seconds added to the latency
+    write_latency : float | None
+        seconds every edit takes, the latency if None
+    maxlag_rate : float
+        share of the requests with the 'maxlag' parameter refused because of replication lag
+    conflict_rate : float
+        share of the edits refused as edit conflicts, edits based on an old revision are always refused
+    seed : int | None
+        seed of the random numbers, for repeatable runs
+    port : int
+        port of the server, a free one if 0
+    """
+
+    def __init__(self, entities: Iterable[dict] | None = None, sparql_results: dict[str, list[dict[str, str]]] | None = None,
+                 latency: float = 0.0, jitter: float = 0.0, write_latency: float | None = None, maxlag_rate: float = 0.0,
+                 conflict_rate: float = 0.0, seed: int | None = None, port: int = 0):
+        self.entities = {}
+        self.redirects = {}
+        self.sparql_results = sparql_results or {}
+        self.latency = latency
+        self.jitter = jitter
+        self.write_latency = write_latency
+        self.maxlag_rate = maxlag_rate
+        self.conflict_rate = conflict_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.last_revision_id = 0
+        self.last_entity_numbers = Counter()
+        self.requests = Counter()
+        self.errors = Counter()
+        self.in_progress = 0
+        self.max_in_progress = 0
+        self.entities_in_edit = Counter()
+        self.overlapping_edits = 0
+        self.previous_config = None
+        for entity in entities or []:
+            self.add_entity(entity)
+
+        self.server = FakeWikibaseServer(self, port)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.api_url = self.url + API_PATH
+        self.sparql_url = self.url + SPARQL_PATH
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def add_entity(self, entity: dict) -> dict:
+        """
+        Adds the entity to the server, completing the page information and the hashes of the references
+
+        Parameters
+        ----------
+        entity : dict
+            JSON data of the entity
+
+        Returns
+        -------
+        dict
+            stored JSON data
+        """
+        entity = deepcopy(entity)
+        entity_id = entity['id']
+        for part in ('labels', 'descriptions', 'aliases', 'claims', 'sitelinks'):
+            if not entity.get(part):
+                entity[part] = {}
+        for claims in entity['claims'].values():
+            for claim in claims:
+                prepare_claim(claim, entity_id)
+        entity.setdefault('type', 'property' if entity_id.startswith('P') else 'item')
+        entity['pageid'] = entity.get('pageid') or get_entity_number(entity_id)
+        entity['ns'] = NAMESPACES[ENTITY_PREFIXES[entity_id[0]]]
+        entity['title'] = get_title(entity_id)
+        self.last_revision_id = max(self.last_revision_id, entity.get('lastrevid', 0))
+        if not entity.get('lastrevid'):
+            self.last_revision_id += 1
+            entity['lastrevid'] = self.last_revision_id
+        entity.setdefault('modified', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+        self.last_entity_numbers[entity_id[0]] = max(self.last_entity_numbers[entity_id[0]], get_entity_number(entity_id))
+        self.entities[entity_id] = entity
+        return entity
+
+    def configure(self):
+        """
+        Points WikibaseIntegrator (and so all the scripts and tools) at this server, until it is closed
+        """
+        self.previous_config = {name: wbi_config[name] for name in ('MEDIAWIKI_API_URL', 'SPARQL_ENDPOINT_URL', 'WIKIBASE_URL')}
+        wbi_config['MEDIAWIKI_API_URL'] = self.api_url
+        wbi_config['SPARQL_ENDPOINT_URL'] = self.sparql_url
+        wbi_config['WIKIBASE_URL'] = self.url
+
+    def close(self):
+        """
+        Stops the server and restores the previous configuration of WikibaseIntegrator
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        if self.previous_config is not None:
+            wbi_config.update(self.previous_config)
+            self.previous_config = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_stats(self) -> dict:
+        """
+        Returns the counters of the server
+
+        Returns
+        -------
+        dict
+            number of requests of every action, number of errors of every code, highest number of requests handled at
+            the same time and number of edits of an entity which started before the previous edit of it had finished
+        """
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'errors': dict(self.errors),
+                'max_in_progress': self.max_in_progress,
+                'overlapping_edits': self.overlapping_edits
+            }
+
+    def wait(self, is_edit: bool):
+        """
+        Simulates the time of processing the request
+        """
+        latency = self.write_latency if is_edit and self.write_latency is not None else self.latency
+        if self.jitter:
+            with self.lock:
+                latency += self.random.uniform(0, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+    def start_request(self, action: str, entity_ids: list[str]):
+        with self.lock:
+            self.requests[action] += 1
+            self.in_progress += 1
+            self.max_in_progress = max(self.max_in_progress, self.in_progress)
+            for entity_id in entity_ids:
+                if self.entities_in_edit[entity_id]:
+                    self.overlapping_edits += 1
+                self.entities_in_edit[entity_id] += 1
+
+    def finish_request(self, entity_ids: list[str]):
+        with self.lock:
+            self.in_progress -= 1
+            for entity_id in entity_ids:
+                self.entities_in_edit[entity_id] -= 1
+
+    def handle_api(self, parameters: dict[str, str]) -> tuple[int, dict, bytes]:
+        """
+        Answers a request of the MediaWiki API
+
+        Parameters
+        ----------
+        parameters : dict[str, str]
+            parameters of the request
+
+        Returns
+        -------
+        tuple[int, dict, bytes]
+            HTTP status, headers and content of the response
+        """
+        action = parameters.get('action', '')
+        is_edit = action in WRITE_ACTIONS
+        edited_ids = self.get_edited_ids(parameters) if is_edit else []
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        self.start_request(action, edited_ids)
+        try:
+            self.wait(is_edit)
+            with self.lock:
+                if 'maxlag' in parameters and self.random.random() < self.maxlag_rate:
+                    raise ApiError('maxlag', f'Waiting for a database server: {LAG} seconds lagged.',
+                                   headers={'Retry-After': str(LAG), 'X-Database-Lag': str(LAG)})
+                if is_edit:
+                    if parameters.get('token') != CSRF_TOKEN:
+                        raise ApiError('badtoken', 'Invalid CSRF token.')
+                    if self.random.random() < self.conflict_rate:
+                        raise ApiError('editconflict', 'Edit conflict.')
+                handler = getattr(self, f'action_{action}', None)
+                if handler is None:
+                    raise ApiError('badvalue', f'Unrecognized value for parameter "action": {action}.')
+                result = handler(parameters)
+        except ApiError as error:
+            with self.lock:
+                self.errors[error.code] += 1
+            headers.update(error.headers)
+            headers['MediaWiki-API-Error'] = error.code
+            result = {'error': {'code': error.code, 'info': error.info}, 'servedby': 'fake-wikibase'}
+            if error.code == 'maxlag':
+                result['error']['lag'] = LAG
+        finally:
+            self.finish_request(edited_ids)
+        return 200, headers, ujson.dumps(result, ensure_ascii=False).encode()
+
+    def get_edited_ids(self, parameters: dict[str, str]) -> list[str]:
+        """
+        Returns the IDs of the entities changed by the edit, based on its parameters
+        """
+        entity_ids = [parameters[name] for name in ('id', 'fromid', 'toid', 'from', 'to') if parameters.get(name)]
+        for name in ('claim', 'statement'):
+            value = parameters.get(name, '')
+            if value.startswith('{'):
+                value = ujson.loads(value).get('id') or ''
+            entity_ids.extend(claim_id.split('$')[0].upper() for claim_id in value.split('|') if '$' in claim_id)
+        if parameters.get('title'):
+            entity_ids.append(parameters['title'].rpartition(':')[2])
+        return list(dict.fromkeys(entity_ids))
+
+    def handle_sparql(self, parameters: dict[str, str], accept: str) -> tuple[int, dict, bytes]:
+        """
+        Answers a SPARQL query with the rows of the first fixture whose key is a part of the query
+
+        Parameters
+        ----------
+        parameters : dict[str, str]
+            parameters of the request
+        accept : str
+            Accept header, the results are sent as CSV if it asks for 'text/csv' and as SPARQL JSON otherwise
+
+        Returns
+        -------
+        tuple[int, dict, bytes]
+            HTTP status, headers and content of the response
+        """
+        query = parameters.get('query', '')
+        self.start_request('sparql', [])
+        try:
+            self.wait(False)
+        finally:
+            self.finish_request([])
+
+        rows = next((rows for fragment, rows in self.sparql_results.items() if fragment in query), [])
+        rows = filter_rows(query, rows)
+        variables = get_projection(query) or list(dict.fromkeys(name for row in rows for name in row))
+        if variables == ['count']:
+            rows = [{'count': str(len(rows))}]
+
+        if 'text/csv' in accept:
+            results_file = io.StringIO()
+            writer = csv.DictWriter(results_file, fieldnames=variables, extrasaction='ignore', lineterminator='\r\n')
+            writer.writeheader()
+            writer.writerows(rows)
+            return 200, {'Content-Type': 'text/csv; charset=utf-8'}, results_file.getvalue().encode()
+
+        bindings = [{variable: {'type': 'uri' if row[variable].startswith(('http://', 'https://')) else 'literal',
+                                'value': row[variable]} for variable in variables if variable in row} for row in rows]
+        results = {'head': {'vars': variables}, 'results': {'bindings': bindings}}
+        return 200, {'Content-Type': 'application/sparql-results+json; charset=utf-8'}, ujson.dumps(results).encode()
+
+    def get_entity(self, entity_id: str) -> dict:
+        """
+        Returns the stored entity, following the redirect, the lock has to be held
+        """
+        entity_id = self.redirects.get(entity_id, entity_id)
+        if entity_id not in self.entities:
+            raise ApiError('no-such-entity', f'Could not find an entity with the ID "{entity_id}".')
+        return self.entities[entity_id]
+
+    def save_revision(self, entity: dict, parameters: dict[str, str]) -> dict:
+        """
+        Checks the base revision of the edit and gives the entity a new revision, the lock has to be held
+
+        Returns
+        -------
+        dict
+            page information returned by the edits of statements, the edits of terms return the revision in the entity
+            (see get_term_results())
+        """
+        base_revision_id = parameters.get('baserevid')
+        if base_revision_id and int(base_revision_id) != entity['lastrevid']:
+            raise ApiError('editconflict', 'Edit conflict: the entity was changed since the base revision.')
+        self.last_revision_id += 1
+        entity['lastrevid'] = self.last_revision_id
+        entity['modified'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        return {'pageinfo': {'lastrevid': entity['lastrevid']}, 'success': 1}
+
+    def get_claim(self, claim_id: str) -> tuple[dict, list, dict]:
+        """
+        Finds the claim by its GUID, the lock has to be held
+
+        Returns
+        -------
+        tuple[dict, list, dict]
+            entity, claims of the property and the claim
+        """
+        entity = self.get_entity(claim_id.split('$')[0].upper())
+        for claims in entity['claims'].values():
+            for claim in claims:
+                if claim['id'] == claim_id:
+                    return entity, claims, claim
+        raise ApiError('no-such-claim', f'Could not find the claim {claim_id}.')
+
+    def action_query(self, parameters: dict[str, str]) -> dict:
+        if parameters.get('meta') == 'tokens':
+            token_type = parameters.get('type', 'csrf')
+            return {'query': {'tokens': {f'{token_type}token': LOGIN_TOKEN if token_type == 'login' else CSRF_TOKEN}}}
+        if parameters.get('meta') == 'siteinfo':
+            namespaces = {str(number): {'id': number, 'canonical': name, '*': name} for name, number in NAMESPACES.items()}
+            return {'query': {'namespaces': namespaces}}
+        if parameters.get('list') == 'allpages':
+            namespace = int(parameters.get('apnamespace', 0))
+            start = parameters.get('apcontinue', '')
+            limit = ALLPAGES_LIMIT if parameters.get('aplimit', 'max') == 'max' else int(parameters['aplimit'])
+            titles = sorted(entity['title'] for entity in self.entities.values() if entity['ns'] == namespace)
+            titles = [title for title in titles if title >= start]
+            results = {'query': {'allpages': [{'ns': namespace, 'title': title} for title in titles[:limit]]}}
+            if len(titles) > limit:
+                results['continue'] = {'apcontinue': titles[limit], 'continue': '-||'}
+            return results
+        raise ApiError('badvalue', 'Only tokens, siteinfo and allpages are supported by the fake server.')
+
+    def action_login(self, parameters: dict[str, str]) -> dict:
+        return {'login': {'result': 'Success', 'lguserid': 1, 'lgusername': parameters.get('lgname', '')}}
+
+    def action_clientlogin(self, parameters: dict[str, str]) -> dict:
+        return {'clientlogin': {'status': 'PASS', 'username': parameters.get('username', '')}}
+
+    def action_wbgetentities(self, parameters: dict[str, str]) -> dict:
+        props = parameters.get('props', 'info|sitelinks|aliases|labels|descriptions|claims|datatype').split('|')
+        languages = parameters['languages'].split('|') if parameters.get('languages') else None
+        results = {}
+        for entity_id in parameters.get('ids', '').split('|'):
+            try:
+                entity = self.get_entity(entity_id)
+            except ApiError:
+                results[entity_id] = {'id': entity_id, 'missing': ''}
+                continue
+            entity_json = {'type': entity['type'], 'id': entity['id']}
+            if 'info' in props:
+                entity_json.update({name: entity[name] for name in ('pageid', 'ns', 'title', 'lastrevid', 'modified')})
+            if 'datatype' in props and 'datatype' in entity:
+                entity_json['datatype'] = entity['datatype']
+            for part in ('labels', 'descriptions', 'aliases', 'claims', 'sitelinks'):
+                if part in props:
+                    values = entity[part]
+                    if languages is not None and part in ('labels', 'descriptions', 'aliases'):
+                        values = {language: value for language, value in values.items() if language in languages}
+                    entity_json[part] = deepcopy(values)
+            if entity['id'] != entity_id:
+                entity_json['redirects'] = {'from': entity_id, 'to': entity['id']}
+            results[entity_id] = entity_json
+        return {'entities': results, 'success': 1}
+
+    def action_wbeditentity(self, parameters: dict[str, str]) -> dict:
+        data = ujson.loads(parameters.get('data', '{}'))
+        if parameters.get('new'):
+            prefix = 'P' if parameters['new'] == 'property' else 'Q'
+            self.last_entity_numbers[prefix] += 1
+            new_entity = {'id': f'{prefix}{self.last_entity_numbers[prefix]}'}
+            if prefix == 'P':
+                new_entity['datatype'] = data.get('datatype')
+            entity = self.add_entity(new_entity)
+        else:
+            entity = self.get_entity(parameters.get('id', ''))
+            self.save_revision(entity, parameters)
+        if parameters.get('clear'):
+            for part in ('labels', 'descriptions', 'aliases', 'claims', 'sitelinks'):
+                entity[part] = {}
+
+        for part in ('labels', 'descriptions'):
+            for term in iter_values(data.get(part, {})):
+                if 'remove' in term:
+                    entity[part].pop(term['language'], None)
+                else:
+                    entity[part][term['language']] = {'language': term['language'], 'value': term['value']}
+
+        replaced_languages = set()
+        for alias in iter_values(data.get('aliases', {})):
+            aliases = entity['aliases'].setdefault(alias['language'], [])
+            if 'remove' in alias:
+                aliases[:] = [value for value in aliases if value['value'] != alias['value']]
+            elif 'add' in alias or alias['language'] in replaced_languages:
+                if alias['value'] not in [value['value'] for value in aliases]:
+                    aliases.append({'language': alias['language'], 'value': alias['value']})
+            else:
+                replaced_languages.add(alias['language'])
+                aliases[:] = [{'language': alias['language'], 'value': alias['value']}]
+        entity['aliases'] = {language: aliases for language, aliases in entity['aliases'].items() if aliases}
+
+        for claim in iter_values(data.get('claims', {})):
+            if 'remove' in claim:
+                for claims in entity['claims'].values():
+                    claims[:] = [old_claim for old_claim in claims if old_claim['id'] != claim['id']]
+                continue
+            self.set_claim(entity, claim)
+        entity['claims'] = {property_number: claims for property_number, claims in entity['claims'].items() if claims}
+
+        for sitelink in iter_values(data.get('sitelinks', {})):
+            if 'remove' in sitelink:
+                entity['sitelinks'].pop(sitelink['site'], None)
+            else:
+                entity['sitelinks'][sitelink['site']] = {'site': sitelink['site'], 'title': sitelink['title'], 'badges': []}
+
+        return {'entity': deepcopy(entity), 'success': 1}
+
+    def set_claim(self, entity: dict, claim: dict) -> dict:
+        """
+        Adds the claim to the entity or replaces the claim with the same GUID, the lock has to be held
+        """
+        claim = prepare_claim(deepcopy(claim), entity['id'])
+        claim.pop('remove', None)
+        for claims in entity['claims'].values():
+            for index, old_claim in enumerate(claims):
+                if old_claim['id'] == claim['id']:
+                    claims[index] = claim
+                    return claim
+        entity['claims'].setdefault(claim['mainsnak']['property'], []).append(claim)
+        return claim
+
+    def action_wbsetclaim(self, parameters: dict[str, str]) -> dict:
+        claim = ujson.loads(parameters['claim'])
+        entity = self.get_entity(claim['id'].split('$')[0].upper())
+        results = self.save_revision(entity, parameters)
+        results['claim'] = deepcopy(self.set_claim(entity, claim))
+        return results
+
+    def action_wbsetclaimvalue(self, parameters: dict[str, str]) -> dict:
+        entity, claims, claim = self.get_claim(parameters['claim'])
+        results = self.save_revision(entity, parameters)
+        mainsnak = claim['mainsnak']
+        mainsnak['snaktype'] = parameters['snaktype']
+        if parameters['snaktype'] == 'value':
+            mainsnak.setdefault('datavalue', {})['value'] = ujson.loads(parameters['value'])
+        else:
+            mainsnak.pop('datavalue', None)
+        results['claim'] = deepcopy(claim)
+        return results
+
+    def action_wbremoveclaims(self, parameters: dict[str, str]) -> dict:
+        claim_ids = parameters['claim'].split('|')
+        located_claims = [self.get_claim(claim_id) for claim_id in claim_ids]
+        entity = located_claims[0][0]
+        results = self.save_revision(entity, parameters)
+        for _, claims, claim in located_claims:
+            claims.remove(claim)
+        entity['claims'] = {property_number: claims for property_number, claims in entity['claims'].items() if claims}
+        results['claims'] = claim_ids
+        return results
+
+    def action_wbsetreference(self, parameters: dict[str, str]) -> dict:
+        entity, claims, claim = self.get_claim(parameters['statement'])
+        results = self.save_revision(entity, parameters)
+        snaks = ujson.loads(parameters['snaks'])
+        # the order is a JSON array of property IDs, as in the Wikibase API
+        snaks_order = ujson.loads(parameters['snaks-order']) if parameters.get('snaks-order') else list(snaks)
+        reference = prepare_reference({'snaks': snaks, 'snaks-order': snaks_order})
+        references = claim.setdefault('references', [])
+        hashes = [old_reference['hash'] for old_reference in references]
+        if parameters.get('reference'):
+            if parameters['reference'] not in hashes:
+                raise ApiError('no-such-reference', f'Could not find the reference {parameters["reference"]}.')
+            references[hashes.index(parameters['reference'])] = reference
+        elif parameters.get('index'):
+            references.insert(int(parameters['index']), reference)
+        else:
+            references.append(reference)
+        results['reference'] = deepcopy(reference)
+        return results
+
+    def action_wbremovereferences(self, parameters: dict[str, str]) -> dict:
+        entity, claims, claim = self.get_claim(parameters['statement'])
+        hashes = parameters['references'].split('|')
+        references = claim.get('references', [])
+        missing_hashes = set(hashes) - {reference['hash'] for reference in references}
+        if missing_hashes:
+            raise ApiError('no-such-reference', f'Could not find the references {", ".join(sorted(missing_hashes))}.')
+        results = self.save_revision(entity, parameters)
+        claim['references'] = [reference for reference in references if reference['hash'] not in hashes]
+        return results
+
+    def get_term_results(self, entity: dict, part: str, language: str) -> dict:
+        """
+        Returns the response of an edit of a label, description or aliases: unlike the edits of statements, Wikibase
+        returns the new revision ID as a part of the entity, together with the edited term
+        """
+        entity_results = {'id': entity['id'], 'type': entity['type'], 'lastrevid': entity['lastrevid']}
+        if language in entity[part]:
+            entity_results[part] = {language: deepcopy(entity[part][language])}
+        return {'entity': entity_results, 'success': 1}
+
+    def action_wbsetaliases(self, parameters: dict[str, str]) -> dict:
+        entity = self.get_entity(parameters['id'])
+        self.save_revision(entity, parameters)
+        language = parameters['language']
+        values = [alias['value'] for alias in entity['aliases'].get(language, [])]
+        if 'set' in parameters:
+            values = [value for value in parameters['set'].split('|') if value]
+        values = [value for value in values if value not in parameters.get('remove', '').split('|')]
+        values += [value for value in parameters.get('add', '').split('|') if value and value not in values]
+        entity['aliases'][language] = [{'language': language, 'value': value} for value in values]
+        if not values:
+            del entity['aliases'][language]
+        return self.get_term_results(entity, 'aliases', language)
+
+    def set_term(self, part: str, parameters: dict[str, str]) -> dict:
+        entity = self.get_entity(parameters['id'])
+        self.save_revision(entity, parameters)
+        language = parameters['language']
+        if parameters.get('value'):
+            entity[part][language] = {'language': language, 'value': parameters['value']}
+        else:
+            entity[part].pop(language, None)
+        return self.get_term_results(entity, part, language)
+
+    def action_wbsetlabel(self, parameters: dict[str, str]) -> dict:
+        return self.set_term('labels', parameters)
+
+    def action_wbsetdescription(self, parameters: dict[str, str]) -> dict:
+        return self.set_term('descriptions', parameters)
+
+    def action_wbcreateredirect(self, parameters: dict[str, str]) -> dict:
+        source = self.get_entity(parameters['from'])
+        target = self.get_entity(parameters['to'])
+        if any(source[part] for part in ('labels', 'descriptions', 'aliases', 'claims', 'sitelinks')):
+            raise ApiError('not-empty', f'The entity {source["id"]} is not empty.')
+        self.redirect(source, target)
+        return {'success': 1, 'redirect': target['id']}
+
+    def redirect(self, source: dict, target: dict):
+        """
+        Turns the source entity into a redirect to the target, the lock has to be held
+        """
+        del self.entities[source['id']]
+        self.redirects[source['id']] = target['id']
+        for redirected_id, target_id in self.redirects.items():
+            if target_id == source['id']:
+                self.redirects[redirected_id] = target['id']
+
+    def action_wbmergeitems(self, parameters: dict[str, str]) -> dict:
+        source = self.get_entity(parameters['fromid'])
+        target = self.get_entity(parameters['toid'])
+        ignored_conflicts = parameters.get('ignoreconflicts', '').split('|')
+        # like in Wikibase, only descriptions and sitelinks conflict, a different label becomes an alias of the target
+        for part, conflict in (('descriptions', 'description'), ('sitelinks', 'sitelink')):
+            if conflict in ignored_conflicts:
+                continue
+            value_name = 'title' if part == 'sitelinks' else 'value'
+            conflicts = [key for key, value in source[part].items()
+                         if key in target[part] and target[part][key][value_name] != value[value_name]]
+            if conflicts:
+                raise ApiError('failed-modify', f'Conflicting {part} for {", ".join(conflicts)}.')
+
+        aliases_to_merge = {language: list(aliases) for language, aliases in source['aliases'].items()}
+        for language, label in source['labels'].items():
+            if language in target['labels'] and target['labels'][language]['value'] != label['value']:
+                aliases_to_merge.setdefault(language, []).append(label)
+        for part in ('labels', 'descriptions', 'sitelinks'):
+            for key, value in source[part].items():
+                target[part].setdefault(key, value)
+        for language, aliases in aliases_to_merge.items():
+            target_aliases = target['aliases'].setdefault(language, [])
+            target_values = [alias['value'] for alias in target_aliases]
+            for alias in aliases:
+                if alias['value'] not in target_values:
+                    target_aliases.append(alias)
+                    target_values.append(alias['value'])
+        for claims in source['claims'].values():
+            for claim in claims:
+                claim = dict(claim, id=f'{target["id"]}${uuid.uuid4()}')
+                self.set_claim(target, claim)
+
+        for part in ('labels', 'descriptions', 'aliases', 'claims', 'sitelinks'):
+            source[part] = {}
+        source_revision = self.save_revision(source, {})['pageinfo']['lastrevid']
+        target_revision = self.save_revision(target, {})['pageinfo']['lastrevid']
+        self.redirect(source, target)
+        return {'success': 1, 'redirected': 1, 'from': {'id': source['id'], 'lastrevid': source_revision},
+                'to': {'id': target['id'], 'lastrevid': target_revision}}
+
+    def action_delete(self, parameters: dict[str, str]) -> dict:
+        if parameters.get('pageid'):
+            entity = next((entity for entity in self.entities.values() if entity['pageid'] == int(parameters['pageid'])), None)
+        else:
+            entity = self.entities.get(parameters.get('title', '').rpartition(':')[2])
+        if entity is None:
+            raise ApiError('missingtitle', "The page you specified doesn't exist.")
+        del self.entities[entity['id']]
+        self.last_revision_id += 1
+        return {'delete': {'title': entity['title'], 'reason': parameters.get('reason', ''), 'logid': self.last_revision_id}}
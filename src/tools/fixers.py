@@ -0,0 +1,428 @@
+"""
+Cleanup rules of the WikiHum data written as fixers, which can be run together on the same entity by fixers_pipeline.py.
+Every fixer finds its candidate items with a SPARQL graph pattern and changes a downloaded entity only in memory, so that
+the entity is fetched once and written once, whatever the number of fixers that changed it.
+"""
+
+from wikibaseintegrator import entities
+from wikibaseintegrator.models import Claim, references, snaks
+
+
+P_REFERENCE_URL = 'P2'
+P_RETRIEVED = 'P48'
+P_STATED_AS = 'P54'
+P_STATED_IN = 'P55'
+P_SIMC_ID = 'P75'
+P_AHP_ID = 'P81'
+P_FILENAME = 'P122'
+
+DATA_ATLAS_FONTIUM = {'value': {'entity-type': 'item', 'numeric-id': 179149, 'id': 'Q179149'}, 'type': 'wikibase-entityid'}
+
+
+
+def add_leading_zeros(simc_id: str) -> str:
+    """
+    Adds zeros at the beginning of the provided identifier value, so that the whole string consists of seven digits
+
+    Parameters
+    ----------
+    simc_id : str
+        current SIMC identifier
+
+    Returns
+    -------
+    str
+        new SIMC identifier in correct seven-digit format
+    """
+    number_of_zeros = 7 - len(simc_id)
+    new_simc_id =  '{}{}'.format('0' * number_of_zeros, simc_id)
+    return new_simc_id
+
+
+
+def check_two_property_values_equality(claim_1: Claim, claim_2: Claim) -> tuple[bool, str]:
+    """
+    Checks if two claim values have the same text value, language, qualifiers and references.
+    Works for properties with datatype "monolingual text".
+
+    Parameters
+    ----------
+    claim_1 : Claim
+        First Claim
+    claim_2 : Claim
+        Second Claim
+
+    Returns
+    -------
+    tuple[bool, str]
+        True if the claims are equal, False if ther are not and a message with inequality reason
+    """
+    claim_1_value = claim_1.mainsnak.datavalue["value"]["text"]
+    claim_1_language = claim_1.mainsnak.datavalue["value"]["language"]
+
+    claim_2_value = claim_2.mainsnak.datavalue["value"]["text"]
+    claim_2_language = claim_2.mainsnak.datavalue["value"]["language"]
+
+    if claim_1_value != claim_2_value or claim_1_language != claim_2_language:
+        return False, " - value or language not eual"
+
+    claim_1_qualifiers_order = claim_1.qualifiers_order
+    claim_2_qualifiers_order = claim_2.qualifiers_order
+
+    if claim_1_qualifiers_order != claim_2_qualifiers_order:
+        return False, " - qualifiers order not equal"
+
+    for qualifier_p in claim_1_qualifiers_order:
+        claim_1_qualifier = claim_1.qualifiers.get(qualifier_p)
+        claim_1_qualifier_datavalue = claim_1_qualifier[0].datavalue
+
+        claim_2_qualifier = claim_2.qualifiers.get(qualifier_p)
+        claim_2_qualifier_datavalue = claim_2_qualifier[0].datavalue
+
+        if claim_1_qualifier_datavalue != claim_2_qualifier_datavalue:
+            return False, " - qualifiers not equal"
+
+    claim_1_references = claim_1.references.references
+    claim_2_references = claim_2.references.references
+
+    if len(claim_1_references) != len(claim_2_references):
+        return False, " - number of references not equal"
+
+    if len(claim_1_references) > 1:
+        print("That's Too Much, Man!")
+        return False, " - too many references"
+
+    claim_1_reference_order = claim_1_references[0].snaks_order
+    claim_1_reference = claim_1_references[0].snaks
+
+    claim_2_reference_order = claim_2_references[0].snaks_order
+    claim_2_reference = claim_2_references[0].snaks
+
+    if claim_1_reference_order != claim_2_reference_order:
+        return False, " - references order not equal"
+
+    for reference_p in claim_1_reference_order:
+        reference_1_value = claim_1_reference.get(reference_p)[0].datavalue
+        reference_2_value = claim_2_reference.get(reference_p)[0].datavalue
+        if reference_1_value != reference_2_value:
+            return False, " - references not equal"
+
+    return True, ""
+
+
+
+def get_data_atlas_fontium_reference() -> references.Reference:
+    """
+    Prepares the standard reference to Data Atlas Fontium, consisting of 'reference URL', 'filename' and 'retrieved'
+
+    Returns
+    -------
+    references.Reference
+        new reference
+    """
+    snaks_references = snaks.Snaks()
+
+    snak_reference_url = snaks.Snak(snaktype='value', property_number='P2', datavalue={'value': 'https://data.atlasfontium.pl/documents/202', 'type': 'string'}, datatype='url')
+    snak_filename  = snaks.Snak(snaktype='value', property_number='P122', datavalue={'value': 'tabela-zbiorcza-miejscowosci-atlas-historyczny-polski-xvi-w', 'type': 'string'}, datatype='string')
+    snak_retrieved = snaks.Snak(snaktype='value', property_number='P48', datavalue={'value': {'time': '+2023-12-07T00:00:00Z', 'timezone': 0, 'before': 0, 'after': 0, 'precision': 11, 'calendarmodel': 'http://www.wikidata.org/entity/Q1985727'}, 'type': 'time'}, datatype='time')
+
+    snaks_references.add(snak_reference_url)
+    snaks_references.add(snak_filename)
+    snaks_references.add(snak_retrieved)
+
+    references_order = [P_REFERENCE_URL, P_FILENAME, P_RETRIEVED]
+    return references.Reference(snaks=snaks_references, snaks_order=references_order)
+
+
+
+def replace_data_atlas_fontium_references(entity: entities.item.ItemEntity, claim_ids: set[str] | None = None) -> int:
+    """
+    Replaces references stated in Data Atlas Fontium with the standard references to Data Atlas Fontium. The entity is
+    changed only in memory.
+
+    Parameters
+    ----------
+    entity : entities.item.ItemEntity
+        entity to change
+    claim_ids : set[str] | None
+        IDs of the statements to change, all the statements of the entity if None
+
+    Returns
+    -------
+    int
+        number of replaced references
+    """
+    number_of_references = 0
+    for p, statement in entity.claims.claims.items():
+        for claim in statement:
+            if claim_ids is not None and claim.id not in claim_ids:
+                continue
+            for reference in list(claim.references):
+                if P_STATED_IN in reference.snaks_order and reference.snaks.get(P_STATED_IN)[0].datavalue == DATA_ATLAS_FONTIUM:
+                    claim.references.remove(reference)
+                    claim.references.add(get_data_atlas_fontium_reference())
+                    number_of_references += 1
+
+    return number_of_references
+
+
+
+class Fixer:
+    """
+    Base class of the cleanup rules. A subclass sets the summary of its edits and the SPARQL graph pattern binding the
+    ?item variable to the candidate items, and implements fix().
+    """
+
+    summary = ''
+    where_clause = ''
+
+    def fix(self, entity: entities.item.ItemEntity) -> tuple[bool, list[str]]:
+        """
+        Applies the rule to the entity in memory, without writing it to Wikibase
+
+        Parameters
+        ----------
+        entity : entities.item.ItemEntity
+            downloaded entity
+
+        Returns
+        -------
+        tuple[bool, list[str]]
+            True if the entity was changed and the report messages of the rule
+        """
+        raise NotImplementedError
+
+
+
+class AliasesIdenticalAsLabelsFixer(Fixer):
+    """
+    Removes polish and english aliases identical to the label in the same language.
+    """
+
+    summary = 'aliases identical as labels removed'
+    where_clause = """
+                    ?item rdfs:label ?itemLabel .
+                    ?item skos:altLabel ?itemAlias.
+                    FILTER (STR(?itemLabel) = STR(?itemAlias))
+            """
+    languages = ['pl', 'en']
+
+    def fix(self, entity: entities.item.ItemEntity) -> tuple[bool, list[str]]:
+        messages = []
+        for language in self.languages:
+            label = entity.labels.values.get(language)
+            aliases = entity.aliases.aliases.get(language)
+            if not aliases:
+                continue
+            for alias in aliases:
+                if label == alias and not alias.removed:
+                    alias.remove()
+                    messages.append(f"{language} {alias} - alias same as label removed")
+        return bool(messages), messages
+
+
+
+class StatedAsDuplicatesFixer(Fixer):
+    """
+    Removes the second of two equal values of the property 'stated as' (with the same qualifiers and references).
+    """
+
+    summary = "duplicated values of 'stated as' removed"
+    where_clause = """
+                    ?item p:P54 ?statement1 .
+                    ?item p:P54 ?statement2 .
+
+                    ?statement1 (ps:P54) ?value .
+                    ?statement2 (ps:P54) ?value .
+
+                    FILTER (?statement1 != ?statement2)
+            """
+
+    def fix(self, entity: entities.item.ItemEntity) -> tuple[bool, list[str]]:
+        claims_by_value = {}
+        for claim in entity.claims.get(P_STATED_AS):
+            if not claim.removed:
+                claims_by_value.setdefault(claim.mainsnak.datavalue["value"]["text"], []).append(claim)
+
+        changed = False
+        messages = []
+        for stated_as_value, claims_stated_as in claims_by_value.items():
+            if len(claims_stated_as) == 1:
+                continue
+            if len(claims_stated_as) > 2:
+                messages.append(f"{stated_as_value} - too many claims in the property 'stated as' {len(claims_stated_as)}")
+                continue
+
+            are_claims_equal, check_message = check_two_property_values_equality(claims_stated_as[0], claims_stated_as[1])
+            if are_claims_equal:
+                claims_stated_as[1].remove()
+                changed = True
+                messages.append(f"{stated_as_value} claim removed")
+            else:
+                messages.append(stated_as_value + check_message)
+
+        return changed, messages
+
+
+
+class SimcIdAddMissingStartingDigitsFixer(Fixer):
+    """
+    Adds missing zeros at the beginning of the only SIMC identifier of the item.
+    """
+
+    summary = 'missing zeroes in SIMC ID added'
+    where_clause = """
+                    ?item p:P75 ?statement0.
+                    ?statement0 (ps:P75) ?value .
+                    {
+                        SELECT ?item (COUNT(?value) AS ?count) WHERE {
+                            ?item p:P75 ?statement0.
+                            ?statement0 (ps:P75) ?value .
+                        }
+                        GROUP BY ?item
+                        HAVING (?count = 1)
+                    }
+                    FILTER (STRLEN(STR(?value)) < 7)
+            """
+
+    def fix(self, entity: entities.item.ItemEntity) -> tuple[bool, list[str]]:
+        claims_simc_id = [claim for claim in entity.claims.get(P_SIMC_ID) if not claim.removed]
+        if len(claims_simc_id) != 1:
+            return False, []
+
+        claim = claims_simc_id[0]
+        simc_id_claim_value = claim.mainsnak.datavalue["value"]
+        if len(simc_id_claim_value) >= 7:
+            return False, []
+
+        new_simc_id_value = add_leading_zeros(simc_id_claim_value)
+        claim.mainsnak.datavalue.update({'value': new_simc_id_value, 'type': 'string'})
+        return True, [f"missing zeroes in SIMC ID were added {new_simc_id_value}"]
+
+
+
+class SimcIdRemoveDuplicatesFixer(Fixer):
+    """
+    Merges two values of the SIMC identifier which differ only by the leading zeros. The reference of the second value is
+    moved to the first one and the second value is removed.
+    """
+
+    summary = 'duplicated SIMC ID removed'
+    where_clause = """
+                    ?item p:P75 ?statement0.
+                    ?statement0 (ps:P75) ?value .
+                    {
+                        SELECT ?item (COUNT(?value) AS ?count) WHERE {
+                            ?item p:P75 ?statement0.
+                            ?statement0 (ps:P75) ?value .
+                        }
+                        GROUP BY ?item
+                        HAVING (?count = 2)
+                    }
+            """
+
+    def fix(self, entity: entities.item.ItemEntity) -> tuple[bool, list[str]]:
+        claims_simc_id = [claim for claim in entity.claims.get(P_SIMC_ID) if not claim.removed]
+        if len(claims_simc_id) != 2:
+            return False, []
+
+        claim_1, claim_2 = claims_simc_id
+        claim_1_value = claim_1.mainsnak.datavalue["value"]
+        claim_2_value = claim_2.mainsnak.datavalue["value"]
+
+        new_claim_1_value = add_leading_zeros(claim_1_value)
+        new_claim_2_value = add_leading_zeros(claim_2_value)
+
+        if new_claim_1_value != new_claim_2_value:
+            return False, [f"incompatible SIMC ID {new_claim_1_value} / {new_claim_2_value}"]
+        if len(claim_2.qualifiers.qualifiers) != 0:
+            return False, ["There are qualifiers in the second value of the SIMC ID"]
+        if len(claim_2.references) != 1:
+            return False, ["More than one reference in the second value of the SIMC ID"]
+
+        messages = []
+        if new_claim_1_value != claim_1_value:
+            claim_1.mainsnak.datavalue["value"] = new_claim_1_value
+            messages.append(f"SIMC  ID value was changed {claim_1_value} to {new_claim_1_value}")
+
+        claim_2_reference = claim_2.references.references[0]
+        snaks_references = snaks.Snaks()
+        for reference_element in claim_2_reference:
+            new_reference = snaks.Snak(snaktype=reference_element.snaktype, property_number=reference_element.property_number,
+                                       datavalue=reference_element.datavalue, datatype=reference_element.datatype)
+            snaks_references.add(new_reference)
+        reference_to_add = references.Reference(snaks=snaks_references, snaks_order=claim_2_reference.snaks_order)
+
+        claim_1.references.add(reference_to_add)
+        claim_2.remove()
+        messages.append("References from the second value was moved, second value was deleted")
+        return True, messages
+
+
+
+class ExternalIdAhpReferencesFixer(Fixer):
+    """
+    Removes 'stated in' from the reference of the AHP identifier, keeping 'reference URL', 'filename' and 'retrieved'.
+    """
+
+    summary = "'stated in' removed from the reference of AHP ID"
+    where_clause = """
+                    ?item p:P81 ?statement .
+                    ?statement prov:wasDerivedFrom ?reference .
+                    ?reference pr:P55 ?statedIn
+            """
+
+    def fix(self, entity: entities.item.ItemEntity) -> tuple[bool, list[str]]:
+        ahp_id_claims = entity.claims.get(P_AHP_ID)
+        if not ahp_id_claims or not ahp_id_claims[0].references.references:
+            return False, []
+
+        ahp_id_claim = ahp_id_claims[0]
+        reference = ahp_id_claim.references.references[0]
+        if P_STATED_IN not in reference.snaks_order:
+            return False, []
+        if not all(reference.snaks.get(p) for p in (P_REFERENCE_URL, P_FILENAME, P_RETRIEVED)):
+            return False, ["reference of AHP ID without reference URL, filename or retrieved date"]
+
+        snaks_references = snaks.Snaks()
+        snaks_references.add(reference.snaks.get(P_REFERENCE_URL)[0])
+        snaks_references.add(reference.snaks.get(P_FILENAME)[0])
+        snaks_references.add(reference.snaks.get(P_RETRIEVED)[0])
+
+        references_order = [P_REFERENCE_URL, P_FILENAME, P_RETRIEVED]
+        reference_to_add = references.Reference(snaks=snaks_references, snaks_order=references_order)
+
+        ahp_id_claim.references.clear()
+        ahp_id_claim.references.add(reference_to_add)
+        return True, ["stated in removed from reference"]
+
+
+
+class DataAtlasFontiumReferencesFixer(Fixer):
+    """
+    Replaces references stated in Data Atlas Fontium with the standard references to Data Atlas Fontium.
+    """
+
+    summary = 'stated in Data Atlas Fontium removed from references'
+    where_clause = """
+                    ?item ?property ?statement .
+                    ?statement prov:wasDerivedFrom ?reference .
+                    ?reference pr:P55 wd:Q179149 .
+            """
+
+    def fix(self, entity: entities.item.ItemEntity) -> tuple[bool, list[str]]:
+        number_of_references = replace_data_atlas_fontium_references(entity)
+        if not number_of_references:
+            return False, []
+        return True, [f"stated in Data Atlas Fontium removed from {number_of_references} references"]
+
+
+
+FIXERS = [
+    AliasesIdenticalAsLabelsFixer,
+    StatedAsDuplicatesFixer,
+    SimcIdAddMissingStartingDigitsFixer,
+    SimcIdRemoveDuplicatesFixer,
+    ExternalIdAhpReferencesFixer,
+    DataAtlasFontiumReferencesFixer,
+]
@@ -0,0 +1,130 @@
+"""
+Shared HTTP settings of the scripts. The sessions used by WikibaseIntegrator (API calls, SPARQL queries) and by the login
+get a pool of keep-alive connections, compressed responses, default timeouts and retries with exponential backoff and
+jitter, so that the TLS handshake is not repeated for every request and a stalled connection cannot hang the script.
+Every response is also recorded in the metrics of the run (tools/metrics.py).
+"""
+
+import backoff
+import requests
+from requests.adapters import HTTPAdapter
+from wikibaseintegrator import wbi_helpers, wbi_login
+from wikibaseintegrator.wbi_config import config as wbi_config
+
+import tools.metrics as metrics
+
+
+POOL_SIZE = 16
+# seconds to connect and to wait for the response
+TIMEOUT = (10, 120)
+MAX_TRIES = 5
+MAX_BACKOFF = 60
+
+
+def is_edit(request: requests.PreparedRequest) -> bool:
+    """
+    Checks if the request changes data in Wikibase, i.e. it is not a read and carries a real edit token. The anonymous
+    token which WikibaseIntegrator adds to the reads is ignored, so the reads are still repeated after an error.
+
+    Parameters
+    ----------
+    request : requests.PreparedRequest
+        sent request
+
+    Returns
+    -------
+    bool
+        True if the request is an edit
+    """
+    return request.method != 'GET' and metrics.is_edit_request(metrics.get_request_parameters(request))
+
+
+def give_up(exception: requests.RequestException) -> bool:
+    """
+    Decides if the failed request should not be sent again. Edits are repeated only if the connection was not established,
+    otherwise the edit could be made twice.
+
+    Parameters
+    ----------
+    exception : requests.RequestException
+        error of the request
+
+    Returns
+    -------
+    bool
+        True if the request should not be repeated
+    """
+    if isinstance(exception, requests.ConnectTimeout) or exception.request is None:
+        return False
+    return is_edit(exception.request)
+
+
+def on_backoff(details: dict):
+    """
+    Records the retry of the request in the metrics
+
+    Parameters
+    ----------
+    details : dict
+        details of the call given by backoff, its arguments are (adapter, request)
+    """
+    metrics.record_retry(details['args'][1])
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    Transport adapter with a larger connection pool, a default timeout and retries of failed connections.
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE, timeout: tuple[float, float] = TIMEOUT):
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.timeout = timeout
+
+    @backoff.on_exception(backoff.expo, (requests.ConnectionError, requests.Timeout), max_tries=MAX_TRIES,
+                          max_value=MAX_BACKOFF, jitter=backoff.full_jitter, giveup=give_up, on_backoff=on_backoff)
+    def send(self, request: requests.PreparedRequest, timeout=None, **kwargs) -> requests.Response:
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+def configure_session(session: requests.Session, pool_size: int = POOL_SIZE) -> requests.Session:
+    """
+    Mounts the pooled adapter in the session, sets the common headers and records the responses in the metrics
+
+    Parameters
+    ----------
+    session : requests.Session
+        configured session
+    pool_size : int
+        number of connections kept open for every host
+
+    Returns
+    -------
+    requests.Session
+        the same session
+    """
+    adapter = PooledAdapter(pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    if metrics.observe_response not in session.hooks['response']:
+        session.hooks['response'].append(metrics.observe_response)
+    if session.headers.get('User-Agent', '').startswith('python-requests'):
+        session.headers['User-Agent'] = wbi_helpers.get_user_agent(wbi_config['USER_AGENT'])
+    return session
+
+
+def configure(login: wbi_login._Login | None = None, pool_size: int = POOL_SIZE):
+    """
+    Configures the sessions of WikibaseIntegrator and of the login instance, should be called at the start of the script
+
+    Parameters
+    ----------
+    login : wbi_login._Login | None
+        login instance whose session is used for the authenticated requests
+    pool_size : int
+        number of connections kept open for every host
+    """
+    configure_session(wbi_helpers.helpers_session, pool_size)
+    configure_session(wbi_helpers.default_session, pool_size)
+    if login is not None:
+        configure_session(login.get_session(), pool_size)
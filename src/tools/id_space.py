@@ -0,0 +1,97 @@
+"""
+Functions that list IDs of the entities which really exist in Wikibase, so that scans do not have to probe every number up to
+a fixed limit. Deleted items and redirects left after merges are skipped and new items are included automatically.
+"""
+
+from collections.abc import Iterable, Iterator
+import numpy as np
+from wikibaseintegrator import wbi_login
+from wikibaseintegrator.wbi_helpers import mediawiki_api_call_helper
+
+
+def get_namespace_id(namespace_name: str, login: wbi_login._Login | None = None) -> int:
+    """
+    Returns the number of the namespace with the given canonical name, e.g. 'Item' or 'Property'
+
+    Parameters
+    ----------
+    namespace_name : str
+        canonical name of the namespace
+    login : wbi_login._Login | None
+        login instance used for the request
+
+    Returns
+    -------
+    int
+        number of the namespace
+    """
+    params = {
+        'action': 'query',
+        'meta': 'siteinfo',
+        'siprop': 'namespaces',
+        'format': 'json'
+    }
+    results = mediawiki_api_call_helper(data=params, login=login, allow_anonymous=True)
+    for namespace in results['query']['namespaces'].values():
+        if namespace.get('canonical') == namespace_name:
+            return int(namespace['id'])
+    raise ValueError(f"Namespace {namespace_name} does not exist")
+
+
+def get_existing_entity_numbers(namespace_name: str = 'Item', login: wbi_login._Login | None = None) -> np.ndarray:
+    """
+    Lists all the pages of the entity namespace that are not redirects, following the continuation of 'allpages' requests
+
+    Parameters
+    ----------
+    namespace_name : str
+        canonical name of the entity namespace
+    login : wbi_login._Login | None
+        login instance used for the requests
+
+    Returns
+    -------
+    np.ndarray
+        sorted numeric parts of the entity IDs (e.g. 123 for 'Q123')
+    """
+    params = {
+        'action': 'query',
+        'list': 'allpages',
+        'apnamespace': get_namespace_id(namespace_name, login=login),
+        'apfilterredir': 'nonredirects',
+        'aplimit': 'max',
+        'format': 'json'
+    }
+    numbers = []
+    while True:
+        results = mediawiki_api_call_helper(data=dict(params), login=login, allow_anonymous=True)
+        for page in results['query']['allpages']:
+            title = page['title']
+            numbers.append(int(title[title.rfind(':') + 2:]))
+        if 'continue' not in results:
+            break
+        params.update(results['continue'])
+
+    entity_numbers = np.array(numbers, dtype=np.uint32)
+    entity_numbers.sort()
+    return entity_numbers
+
+
+def to_entity_ids(entity_numbers: Iterable[int], prefix: str = 'Q') -> Iterator[str]:
+    """
+    Converts numeric parts of the IDs back to entity IDs
+
+    Parameters
+    ----------
+    entity_numbers : Iterable[int]
+        numeric parts of the IDs
+    prefix : str
+        letter of the entity type
+
+    Returns
+    -------
+    Iterator[str]
+        entity IDs
+    """
+    for entity_number in entity_numbers:
+        yield prefix + str(entity_number)
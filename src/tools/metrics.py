@@ -0,0 +1,402 @@
+"""
+Metrics of the script runs. Every HTTP response of the configured sessions (tools/http_client.py) is counted in its phase
+(SPARQL queries, entity downloads, writes, other API calls) together with its size, latency, errors and retries, and the
+main operations of the tools are timed as a whole (e.g. downloading and parsing an entity). The metrics are exported
+periodically and at the end of the run as JSON and in the Prometheus textfile format.
+"""
+
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from urllib.parse import parse_qs
+import requests
+import ujson
+from wikibaseintegrator.wbi_config import config as wbi_config
+
+
+METRICS_DIRECTORY = 'data_2025/metrics'
+EXPORT_INTERVAL = 60.0
+QUANTILES = (0.5, 0.95, 0.99)
+RETRIED_STATUS_CODES = (429, 500, 502, 503, 504)
+# token sent by WikibaseIntegrator with every request made without a login, also with the reads
+ANONYMOUS_TOKEN = '+\\'
+# actions which do not change data, even when they are sent with an edit token
+READ_ACTIONS = ('query', 'wbgetentities', 'wbgetclaims', 'wbsearchentities', 'wbformatvalue', 'parse', 'login', 'clientlogin')
+
+
+class PhaseMetrics:
+    """
+    Counters and latencies of a single phase.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.latencies = array('d')
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        Returns the latency quantile in seconds (nearest rank)
+
+        Parameters
+        ----------
+        quantile : float
+            quantile between 0 and 1
+
+        Returns
+        -------
+        float
+            latency, 0 if nothing was measured
+        """
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+    def to_dict(self) -> dict:
+        """
+        Summarizes the phase
+
+        Returns
+        -------
+        dict
+            counters, total and quantiles of the latency
+        """
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'bytes': self.bytes,
+            'latency_sum': sum(self.latencies),
+            'latency': {f'p{round(quantile * 100)}': self.get_quantile(quantile) for quantile in QUANTILES}
+        }
+
+
+class MetricsRegistry:
+    """
+    Metrics of all the phases of the run, safe to be updated from several threads.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    def get_phase(self, phase: str) -> PhaseMetrics:
+        """
+        Returns the metrics of the phase, creating them if needed, the lock has to be held
+        """
+        if phase not in self.phases:
+            self.phases[phase] = PhaseMetrics()
+        return self.phases[phase]
+
+    def record(self, phase: str, latency: float | None = None, size: int = 0, error: bool = False, retry: bool = False):
+        """
+        Records a single operation or its retry
+
+        Parameters
+        ----------
+        phase : str
+            name of the phase, e.g. 'fetch'
+        latency : float | None
+            duration of the operation in seconds, the operation is not counted if None (e.g. for a retry)
+        size : int
+            number of bytes received
+        error : bool
+            the operation failed
+        retry : bool
+            the operation is going to be repeated
+        """
+        with self.lock:
+            phase_metrics = self.get_phase(phase)
+            if latency is not None:
+                phase_metrics.count += 1
+                phase_metrics.latencies.append(latency)
+            phase_metrics.bytes += size
+            phase_metrics.errors += error
+            phase_metrics.retries += retry
+
+    def set_gauge(self, name: str, value: float):
+        """
+        Sets the current value of a gauge, e.g. the progress of the run
+
+        Parameters
+        ----------
+        name : str
+            name of the gauge
+        value : float
+            current value
+        """
+        with self.lock:
+            self.gauges[name] = value
+
+    def get_request_totals(self) -> tuple[int, int, int]:
+        """
+        Sums up the HTTP requests of all the phases, operations measured as a whole (phases with a dot in the name, e.g.
+        'fetch.entity') are not included
+
+        Returns
+        -------
+        tuple[int, int, int]
+            number of requests, writes and errors
+        """
+        with self.lock:
+            requests_phases = [phase_metrics for phase, phase_metrics in self.phases.items() if '.' not in phase]
+            writes = self.phases['write'].count if 'write' in self.phases else 0
+            return (sum(phase_metrics.count for phase_metrics in requests_phases), writes,
+                    sum(phase_metrics.errors for phase_metrics in requests_phases))
+
+    @contextmanager
+    def measure(self, phase: str):
+        """
+        Measures the duration of the code in the 'with' block, an exception is recorded as an error
+
+        Parameters
+        ----------
+        phase : str
+            name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(phase, time.perf_counter() - start, error=True)
+            raise
+        self.record(phase, time.perf_counter() - start)
+
+    def to_dict(self) -> dict:
+        """
+        Summarizes all the phases
+
+        Returns
+        -------
+        dict
+            duration of the run and the metrics of every phase
+        """
+        with self.lock:
+            return {
+                'start_time': self.start_time,
+                'duration': time.time() - self.start_time,
+                'phases': {phase: phase_metrics.to_dict() for phase, phase_metrics in sorted(self.phases.items())},
+                'gauges': dict(sorted(self.gauges.items()))
+            }
+
+    def to_prometheus(self, script: str) -> str:
+        """
+        Formats the metrics in the Prometheus text format
+
+        Parameters
+        ----------
+        script : str
+            name of the script, added as a label to every metric
+
+        Returns
+        -------
+        str
+            metrics in the Prometheus text format
+        """
+        summary = self.to_dict()
+        lines = [
+            '# TYPE wikihum_run_duration_seconds gauge',
+            f'wikihum_run_duration_seconds{{script="{script}"}} {summary["duration"]:.3f}'
+        ]
+        counters = (('operations', 'count'), ('errors', 'errors'), ('retries', 'retries'), ('received_bytes', 'bytes'))
+        for name, key in counters:
+            lines.append(f'# TYPE wikihum_{name}_total counter')
+            for phase, phase_summary in summary['phases'].items():
+                lines.append(f'wikihum_{name}_total{{script="{script}",phase="{phase}"}} {phase_summary[key]}')
+
+        for name, value in summary['gauges'].items():
+            lines.append(f'# TYPE wikihum_{name} gauge')
+            lines.append(f'wikihum_{name}{{script="{script}"}} {value}')
+
+        lines.append('# TYPE wikihum_latency_seconds summary')
+        for phase, phase_summary in summary['phases'].items():
+            labels = f'script="{script}",phase="{phase}"'
+            for quantile in QUANTILES:
+                value = phase_summary['latency'][f'p{round(quantile * 100)}']
+                lines.append(f'wikihum_latency_seconds{{{labels},quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'wikihum_latency_seconds_sum{{{labels}}} {phase_summary["latency_sum"]:.6f}')
+            lines.append(f'wikihum_latency_seconds_count{{{labels}}} {phase_summary["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def measure(phase: str):
+    """
+    Measures the duration of the code in the 'with' block in the phase of the shared registry
+
+    Parameters
+    ----------
+    phase : str
+        name of the phase
+    """
+    return REGISTRY.measure(phase)
+
+
+def get_request_parameters(request: requests.PreparedRequest) -> dict[str, list[str]]:
+    """
+    Decodes the parameters of the API request, from the form data of a POST request or from the URL otherwise
+
+    Parameters
+    ----------
+    request : requests.PreparedRequest
+        sent request
+
+    Returns
+    -------
+    dict[str, list[str]]
+        values of every parameter
+    """
+    if request.method != 'POST':
+        return parse_qs(request.url.partition('?')[2])
+    body = request.body or ''
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    return parse_qs(body)
+
+
+def is_edit_request(parameters: dict[str, list[str]]) -> bool:
+    """
+    Checks if the API request changes data in Wikibase: it carries a real edit token (not the anonymous one) and its
+    action is not a read
+
+    Parameters
+    ----------
+    parameters : dict[str, list[str]]
+        parameters of the request, see get_request_parameters()
+
+    Returns
+    -------
+    bool
+        True if the request is an edit
+    """
+    token = parameters.get('token', [ANONYMOUS_TOKEN])[0]
+    action = parameters.get('action', [''])[0]
+    return token != ANONYMOUS_TOKEN and action not in READ_ACTIONS
+
+
+def get_request_phase(request: requests.PreparedRequest) -> str:
+    """
+    Assigns the HTTP request to a phase: 'sparql', 'fetch' (wbgetentities), 'write' (edits, see is_edit_request()) or 'api'
+
+    Parameters
+    ----------
+    request : requests.PreparedRequest
+        sent request
+
+    Returns
+    -------
+    str
+        name of the phase
+    """
+    if request.url.startswith(wbi_config['SPARQL_ENDPOINT_URL']) or '/sparql' in request.url:
+        return 'sparql'
+
+    parameters = get_request_parameters(request)
+    if is_edit_request(parameters):
+        return 'write'
+    if parameters.get('action') == ['wbgetentities']:
+        return 'fetch'
+    return 'api'
+
+
+def observe_response(response: requests.Response, *args, **kwargs):
+    """
+    Hook of the HTTP session recording every response in its phase
+
+    Parameters
+    ----------
+    response : requests.Response
+        received response
+    """
+    phase = get_request_phase(response.request)
+    if kwargs.get('stream'):
+        size = int(response.headers.get('Content-Length', 0))
+        api_error = False
+    else:
+        size = len(response.content)
+        api_error = response.content.startswith(b'{"error"')
+
+    retry = response.status_code in RETRIED_STATUS_CODES or (api_error and b'"maxlag"' in response.content)
+    REGISTRY.record(phase, response.elapsed.total_seconds(), size=size, error=response.status_code >= 400 or api_error,
+                    retry=retry)
+
+
+def record_retry(request: requests.PreparedRequest | None):
+    """
+    Records the retry of a failed HTTP request
+
+    Parameters
+    ----------
+    request : requests.PreparedRequest | None
+        request which is going to be repeated
+    """
+    REGISTRY.record(get_request_phase(request) if request is not None else 'api', retry=True, error=True)
+
+
+class MetricsExporter:
+    """
+    Background thread writing the metrics of the run to '<script>.json' and '<script>.prom' in METRICS_DIRECTORY.
+    The files are replaced atomically, so that they can be read at any time (e.g. by the node exporter).
+    """
+
+    def __init__(self, script_path: str, interval: float = EXPORT_INTERVAL, registry: MetricsRegistry = REGISTRY):
+        self.script = os.path.splitext(os.path.basename(script_path))[0]
+        self.interval = interval
+        self.registry = registry
+        self.stopped = threading.Event()
+        os.makedirs(METRICS_DIRECTORY, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.export()
+
+    def export(self):
+        """
+        Writes the current metrics to the files
+        """
+        path = os.path.join(METRICS_DIRECTORY, self.script)
+        contents = ((f'{path}.json', ujson.dumps(self.registry.to_dict(), indent=2) + '\n'),
+                    (f'{path}.prom', self.registry.to_prometheus(self.script)))
+        for file_path, content in contents:
+            with open(file_path + '.tmp', 'w', encoding='utf-8') as metrics_file:
+                metrics_file.write(content)
+            os.replace(file_path + '.tmp', file_path)
+
+    def close(self):
+        """
+        Stops the thread and writes the final metrics
+        """
+        self.stopped.set()
+        self.thread.join()
+        self.export()
+
+
+def start_exporter(script_path: str, interval: float = EXPORT_INTERVAL) -> MetricsExporter:
+    """
+    Starts the periodic export of the metrics of the script
+
+    Parameters
+    ----------
+    script_path : str
+        path of the script, usually __file__
+    interval : float
+        seconds between the exports
+
+    Returns
+    -------
+    MetricsExporter
+        exporter, to be closed at the end of the run
+    """
+    return MetricsExporter(script_path, interval)
@@ -0,0 +1,158 @@
+"""
+Profiling of the script runs, enabled with --profile. Every phase of the run (e.g. the SPARQL query and the main loop) is
+profiled with cProfile separately and saved as '<script>.<phase>.prof' next to the reports, to be viewed with pstats or
+snakeviz. With --profile-memory the allocations are traced with tracemalloc and the lines which allocated the most
+memory during the phase are saved in '<script>.<phase>.allocations.txt'.
+
+cProfile of Python 3.12 sees all the threads, but it mixes their call stacks and its cumulative times are wrong, and a
+second profiler cannot be enabled in the worker threads. While a run is profiled, the entities are therefore downloaded
+and written in the main thread (see run_inline()).
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import tracemalloc
+
+
+REPORTS_DIRECTORY = 'data_2025/reports'
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 25
+TRACEBACK_FRAMES = 5
+
+# True while a run is profiled
+inline = False
+
+
+class RunProfiler:
+    """
+    Profiler of the phases of a run, one phase is profiled at a time. A disabled profiler does nothing.
+    """
+
+    def __init__(self, script_path: str, enabled: bool = False, trace_memory: bool = False, top: int = TOP_ALLOCATIONS):
+        self.script = os.path.splitext(os.path.basename(script_path))[0]
+        self.enabled = enabled or trace_memory
+        self.trace_memory = trace_memory
+        self.top = top
+        self.phase = None
+        self.profile = None
+        self.memory_snapshot = None
+        if self.trace_memory:
+            tracemalloc.start(TRACEBACK_FRAMES)
+        if self.enabled:
+            global inline
+            inline = True
+
+    def get_path(self, suffix: str) -> str:
+        """
+        Returns the path of the output file of the current phase
+
+        Parameters
+        ----------
+        suffix : str
+            extension of the file, e.g. '.prof'
+
+        Returns
+        -------
+        str
+            path of the file
+        """
+        return os.path.join(REPORTS_DIRECTORY, f"{self.script}.{self.phase.replace(' ', '_')}{suffix}")
+
+    def start_phase(self, phase: str):
+        """
+        Finishes the current phase and starts profiling the next one
+
+        Parameters
+        ----------
+        phase : str
+            name of the phase, used in the names of the output files
+        """
+        if not self.enabled:
+            return
+        self.stop_phase()
+        self.phase = phase
+        if self.trace_memory:
+            self.memory_snapshot = tracemalloc.take_snapshot()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop_phase(self):
+        """
+        Stops profiling the current phase and saves its results
+        """
+        if self.profile is None:
+            return
+        self.profile.disable()
+        os.makedirs(REPORTS_DIRECTORY, exist_ok=True)
+        self.profile.dump_stats(self.get_path('.prof'))
+        print(f"Profile of the phase '{self.phase}' saved in {self.get_path('.prof')}")
+        pstats.Stats(self.profile).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+
+        if self.trace_memory:
+            self.save_allocations(tracemalloc.take_snapshot())
+        self.profile = None
+
+    def save_allocations(self, snapshot: tracemalloc.Snapshot):
+        """
+        Saves the lines which allocated the most memory since the start of the phase
+
+        Parameters
+        ----------
+        snapshot : tracemalloc.Snapshot
+            snapshot taken at the end of the phase
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        # allocations of tracemalloc itself are not reported
+        own_allocations = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        differences = snapshot.filter_traces(own_allocations).compare_to(self.memory_snapshot.filter_traces(own_allocations), 'lineno')
+        with open(self.get_path('.allocations.txt'), 'w', encoding='utf-8') as allocations_file:
+            allocations_file.write(f"Phase: {self.phase}\n")
+            allocations_file.write(f"Traced memory: {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB\n\n")
+            for difference in differences[:self.top]:
+                allocations_file.write(f"{difference}\n")
+        tracemalloc.reset_peak()
+
+    def close(self):
+        """
+        Finishes the last phase and stops tracing the memory
+        """
+        self.stop_phase()
+        if self.trace_memory:
+            tracemalloc.stop()
+        if self.enabled:
+            global inline
+            inline = False
+
+
+def run_inline() -> bool:
+    """
+    Checks if the worker threads should be replaced by calls in the main thread, so that the profile shows the real call
+    stacks of the downloads and the writes
+
+    Returns
+    -------
+    bool
+        True while a run is profiled
+    """
+    return inline
+
+
+def open_profiler(script_path: str, arguments: argparse.Namespace) -> RunProfiler:
+    """
+    Creates the profiler of the script according to the command line options
+
+    Parameters
+    ----------
+    script_path : str
+        path of the script, usually __file__
+    arguments : argparse.Namespace
+        options parsed by cli.parse_arguments()
+
+    Returns
+    -------
+    RunProfiler
+        profiler, disabled if --profile was not given
+    """
+    return RunProfiler(script_path, enabled=arguments.profile, trace_memory=arguments.profile_memory)
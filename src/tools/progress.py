@@ -0,0 +1,145 @@
+"""
+Progress of the script runs. The number of items to process is known before the main loop (length of the SPARQL results,
+number of rows of the CSV file or a COUNT query), so the scripts can report the share of work done, the number of items
+and writes per second, the error rate and the estimated time to the end. Rates are computed over a rolling window, so
+a slowdown is visible while it is happening. The progress is printed periodically and kept as gauges of the metrics
+(tools/metrics.py).
+"""
+
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+
+import tools.metrics as metrics
+
+
+WINDOW = 60.0
+PRINT_INTERVAL = 10.0
+
+
+def format_duration(seconds: float | None) -> str:
+    """
+    Formats the duration as hours, minutes and seconds
+
+    Parameters
+    ----------
+    seconds : float | None
+        duration in seconds
+
+    Returns
+    -------
+    str
+        duration as 'HH:MM:SS', '--:--:--' if unknown
+    """
+    if seconds is None:
+        return '--:--:--'
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressTracker:
+    """
+    Progress of the main loop of a script. Writes and errors are taken from the HTTP requests recorded in the metrics,
+    so the scripts only have to report the processed items.
+    """
+
+    def __init__(self, total: int | None, window: float = WINDOW, print_interval: float = PRINT_INTERVAL,
+                 registry: metrics.MetricsRegistry = metrics.REGISTRY):
+        self.total = total
+        self.done = 0
+        self.window = window
+        self.print_interval = print_interval
+        self.registry = registry
+        self.start_time = time.monotonic()
+        self.last_print_time = self.start_time
+        self.samples = deque([self.take_sample(self.start_time)])
+
+    def take_sample(self, now: float) -> tuple[float, int, int, int, int]:
+        """
+        Returns the current counters: time, items done, requests, writes and errors
+        """
+        return (now, self.done, *self.registry.get_request_totals())
+
+    def update(self, items: int = 1):
+        """
+        Records the processed items and reports the progress if the print interval has passed
+
+        Parameters
+        ----------
+        items : int
+            number of items processed since the last update
+        """
+        self.done += items
+        now = time.monotonic()
+        if now - self.samples[-1][0] >= 1.0:
+            self.samples.append(self.take_sample(now))
+            while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+                self.samples.popleft()
+        if now - self.last_print_time >= self.print_interval:
+            self.last_print_time = now
+            self.report()
+
+    def track(self, items: Iterable) -> Iterator:
+        """
+        Yields the items, counting every one of them as processed
+
+        Parameters
+        ----------
+        items : Iterable
+            items processed by the script
+
+        Returns
+        -------
+        Iterator
+            the same items
+        """
+        for item in items:
+            self.update()
+            yield item
+
+    def get_rates(self) -> dict[str, float | None]:
+        """
+        Computes the rates over the rolling window
+
+        Returns
+        -------
+        dict[str, float | None]
+            items and writes per second, share of failed requests, estimated seconds to the end (None if unknown)
+        """
+        now, done, requests, writes, errors = self.take_sample(time.monotonic())
+        start, start_done, start_requests, start_writes, start_errors = self.samples[0]
+        elapsed = max(now - start, 1e-9)
+        items_per_second = (done - start_done) / elapsed
+        eta = None
+        if self.total is not None and items_per_second > 0:
+            eta = max(self.total - done, 0) / items_per_second
+        return {
+            'items_per_second': items_per_second,
+            'writes_per_second': (writes - start_writes) / elapsed,
+            'error_rate': (errors - start_errors) / (requests - start_requests) if requests > start_requests else 0.0,
+            'eta_seconds': eta
+        }
+
+    def report(self):
+        """
+        Prints the progress and updates the gauges of the metrics
+        """
+        rates = self.get_rates()
+        self.registry.set_gauge('progress_items_done', self.done)
+        if self.total is not None:
+            self.registry.set_gauge('progress_items_total', self.total)
+        for name, value in rates.items():
+            if value is not None:
+                self.registry.set_gauge(f'progress_{name}', round(value, 4))
+
+        share = f" ({self.done / self.total:.1%})" if self.total else ''
+        print(f"[progress] {self.done}/{self.total if self.total is not None else '?'}{share}"
+              f" - {rates['items_per_second']:.2f} items/s, {rates['writes_per_second']:.2f} writes/s,"
+              f" errors {rates['error_rate']:.1%}, ETA {format_duration(rates['eta_seconds'])}")
+
+    def close(self):
+        """
+        Reports the final progress and the total time
+        """
+        self.report()
+        print(f"[progress] finished in {format_duration(time.monotonic() - self.start_time)}")
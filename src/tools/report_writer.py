@@ -0,0 +1,178 @@
+"""
+Writers of the script outputs. Report files are opened once and written through a buffer that is flushed periodically,
+instead of opening the file for every line. Tabular results are streamed row by row to a CSV file or to a write-only
+.xlsx workbook, so they are never kept in memory as a whole.
+"""
+
+import csv
+import os
+import time
+import ujson
+from openpyxl import Workbook
+
+
+BUFFER_SIZE = 1024 * 1024
+FLUSH_INTERVAL = 5.0
+
+
+class ReportWriter:
+    """
+    Text report opened in append mode. The buffer is flushed to the file at least every flush_interval seconds.
+    """
+
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL):
+        self.report_file = open(path, 'a', encoding='utf-8', buffering=BUFFER_SIZE)
+        self.flush_interval = flush_interval
+        self.last_flush_time = time.monotonic()
+
+    def write(self, text: str):
+        """
+        Writes the text to the report, the text should end with a new line character
+
+        Parameters
+        ----------
+        text : str
+            text to write
+        """
+        self.report_file.write(text)
+        if time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered text to the file
+        """
+        self.report_file.flush()
+        self.last_flush_time = time.monotonic()
+
+    def close(self):
+        """
+        Flushes and closes the report file
+        """
+        self.report_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class JsonlReportWriter(ReportWriter):
+    """
+    Report with one JSON record in each line.
+    """
+
+    def write_record(self, record: dict):
+        """
+        Writes the record as a single line of the report
+
+        Parameters
+        ----------
+        record : dict
+            JSON serializable record
+        """
+        self.write(ujson.dumps(record, ensure_ascii=False) + '\n')
+
+
+class CsvTableWriter:
+    """
+    Table streamed to a CSV file. With append=True the rows are added to the existing file, and the header is written only
+    if the file is new.
+    """
+
+    def __init__(self, path: str, header: list[str] | None = None, append: bool = False):
+        is_new = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.table_file = open(path, 'a' if append else 'w', encoding='utf-8', newline='', buffering=BUFFER_SIZE)
+        self.writer = csv.writer(self.table_file)
+        if header and is_new:
+            self.writer.writerow(header)
+
+    def append(self, row: list):
+        """
+        Writes a single row of the table
+
+        Parameters
+        ----------
+        row : list
+            values of the row
+        """
+        self.writer.writerow(row)
+
+    def flush(self):
+        """
+        Writes the buffered rows to the file
+        """
+        self.table_file.flush()
+
+    def close(self):
+        """
+        Flushes and closes the file
+        """
+        self.table_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class XlsxTableWriter:
+    """
+    Table streamed to a single sheet of a write-only openpyxl workbook, which keeps only the current row in memory.
+    The workbook is saved when the writer is closed.
+    """
+
+    def __init__(self, path: str, sheet_name: str, header: list[str] | None = None):
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.work_sheet = self.workbook.create_sheet(sheet_name)
+        if header:
+            self.work_sheet.append(header)
+
+    def append(self, row: list):
+        """
+        Writes a single row of the table
+
+        Parameters
+        ----------
+        row : list
+            values of the row
+        """
+        self.work_sheet.append(row)
+
+    def close(self):
+        """
+        Saves the workbook
+        """
+        self.workbook.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_table_writer(path: str, sheet_name: str = 'Sheet', header: list[str] | None = None) -> CsvTableWriter | XlsxTableWriter:
+    """
+    Opens the table writer matching the extension of the file
+
+    Parameters
+    ----------
+    path : str
+        path to the .csv or .xlsx file
+    sheet_name : str
+        name of the sheet, used only for .xlsx files
+    header : list[str] | None
+        names of the columns written in the first row, no header if None
+
+    Returns
+    -------
+    CsvTableWriter | XlsxTableWriter
+        writer of the table
+    """
+    if path.endswith('.xlsx'):
+        return XlsxTableWriter(path, sheet_name, header=header)
+    return CsvTableWriter(path, header=header)
@@ -0,0 +1,107 @@
+"""
+Functions that split a list of entity IDs into ranges (shards), process every shard in a separate process and merge
+partial CSV results of the shards back into a single result in the order of IDs.
+"""
+
+import csv
+import os
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+
+def get_numeric_id(entity_id: str) -> int:
+    """
+    Returns the number of the entity ID, e.g. 123 for 'Q123'
+
+    Parameters
+    ----------
+    entity_id : str
+        ID of the entity
+
+    Returns
+    -------
+    int
+        numeric part of the ID
+    """
+    return int(entity_id[1:])
+
+
+def split_into_shards(entity_ids: list[str], number_of_shards: int) -> list[list[str]]:
+    """
+    Sorts the entity IDs and splits them into contiguous ranges of similar size
+
+    Parameters
+    ----------
+    entity_ids : list[str]
+        IDs of the entities
+    number_of_shards : int
+        number of ranges
+
+    Returns
+    -------
+    list[list[str]]
+        non-empty ranges of IDs in ascending order
+    """
+    sorted_ids = sorted(entity_ids, key=get_numeric_id)
+    shard_size, remainder = divmod(len(sorted_ids), number_of_shards)
+    shards = []
+    start = 0
+    for shard_number in range(number_of_shards):
+        end = start + shard_size + (1 if shard_number < remainder else 0)
+        if end > start:
+            shards.append(sorted_ids[start:end])
+        start = end
+    return shards
+
+
+def run_sharded(worker: Callable[[list[str], str], None], shards: list[list[str]], output_directory: str,
+                file_prefix: str, max_workers: int | None = None) -> list[str]:
+    """
+    Runs the worker for every shard in a pool of processes. The worker gets the IDs of its shard and the path of its partial
+    CSV file, and it must be a module level function so that it can be sent to another process.
+
+    Parameters
+    ----------
+    worker : Callable[[list[str], str], None]
+        function processing a single shard
+    shards : list[list[str]]
+        ranges of entity IDs
+    output_directory : str
+        directory of the partial files
+    file_prefix : str
+        beginning of the partial file names
+    max_workers : int | None
+        number of processes, the number of shards if None
+
+    Returns
+    -------
+    list[str]
+        paths of the partial files in the order of the shards
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    partial_paths = [os.path.join(output_directory, f'{file_prefix}_{shard_number:03d}.csv') for shard_number in range(len(shards))]
+    with ProcessPoolExecutor(max_workers=max_workers or len(shards)) as executor:
+        futures = [executor.submit(worker, shard, partial_path) for shard, partial_path in zip(shards, partial_paths)]
+        for future in futures:
+            future.result()
+    return partial_paths
+
+
+def merge_shards(partial_paths: list[str]) -> Iterator[list[str]]:
+    """
+    Reads the rows of partial CSV files one after another. Shards are contiguous ranges of IDs, so the rows are in the
+    order of IDs.
+
+    Parameters
+    ----------
+    partial_paths : list[str]
+        paths of the partial files in the order of the shards
+
+    Returns
+    -------
+    Iterator[list[str]]
+        rows of all the partial files
+    """
+    for partial_path in partial_paths:
+        with open(partial_path, encoding='utf-8', newline='') as partial_file:
+            yield from csv.reader(partial_file)
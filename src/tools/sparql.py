@@ -0,0 +1,234 @@
+"""
+Helpers of SPARQL queries sent to the query service of Wikibase, which replace many small queries with a few bigger ones,
+and split very big results into pages read one after another.
+"""
+
+import csv
+import io
+import time
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from wikibaseintegrator.wbi_config import config as wbi_config
+from wikibaseintegrator.wbi_helpers import execute_sparql_query, get_user_agent, helpers_session
+
+
+MAX_VALUES_PER_QUERY = 200
+PAGE_SIZE = 10000
+MAX_RETRIES = 10
+RETRY_AFTER = 60
+
+
+def to_string_literal(value: str) -> str:
+    """
+    Converts the value to a SPARQL string literal, escaping the characters that would end it
+
+    Parameters
+    ----------
+    value : str
+        value to convert
+
+    Returns
+    -------
+    str
+        quoted and escaped value
+    """
+    escaped_value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+    return f'"{escaped_value}"'
+
+
+def split_into_chunks(values: list[str], chunk_size: int) -> Iterator[list[str]]:
+    """
+    Splits the values into consecutive chunks of at most chunk_size elements
+
+    Parameters
+    ----------
+    values : list[str]
+        values to split
+    chunk_size : int
+        maximal number of values in a chunk
+
+    Returns
+    -------
+    Iterator[list[str]]
+        chunks of values
+    """
+    for start in range(0, len(values), chunk_size):
+        yield values[start:start + chunk_size]
+
+
+def get_items_by_string_values(property_number: str, values: Iterable[str],
+                               chunk_size: int = MAX_VALUES_PER_QUERY) -> dict[str, list[str]]:
+    """
+    Finds items which have a statement of the property with one of the given string (or external ID) values. Values are
+    sent in chunks in the VALUES clause, so there is one query per chunk instead of one query per value.
+
+    Parameters
+    ----------
+    property_number : str
+        property of the statements, e.g. 'P76'
+    values : Iterable[str]
+        values of the statements
+    chunk_size : int
+        maximal number of values in a single query
+
+    Returns
+    -------
+    dict[str, list[str]]
+        links of the items (entity URIs) for every value, values without any item are not in the dictionary
+    """
+    unique_values = list(dict.fromkeys(values))
+    items_by_value = defaultdict(list)
+
+    for chunk in split_into_chunks(unique_values, chunk_size):
+        values_clause = ' '.join(to_string_literal(value) for value in chunk)
+        query = """
+            SELECT DISTINCT ?value ?item WHERE {
+                VALUES ?value { """ + values_clause + """ }
+                ?item p:""" + property_number + """ ?statement.
+                ?statement ps:""" + property_number + """ ?value.
+            }
+            """
+        results = execute_sparql_query(query)
+        for result in results["results"]["bindings"]:
+            items_by_value[result["value"]["value"]].append(result["item"]["value"])
+
+    return dict(items_by_value)
+
+
+def get_keyset_filter(variables: list[str], last_row: dict[str, str]) -> str:
+    """
+    Builds the FILTER expression which selects rows placed after the last row in the order of the given variables
+
+    Parameters
+    ----------
+    variables : list[str]
+        names of the variables (without '?') in the order of sorting
+    last_row : dict[str, str]
+        values of the last row of the previous page
+
+    Returns
+    -------
+    str
+        FILTER expression comparing string values of the variables
+    """
+    variable = variables[0]
+    last_value = to_string_literal(last_row[variable])
+    expression = f'STR(?{variable}) > {last_value}'
+    if len(variables) > 1:
+        expression += f' || (STR(?{variable}) = {last_value} && ({get_keyset_filter(variables[1:], last_row)}))'
+    return expression
+
+
+def read_csv_results(query: str, endpoint: str | None = None) -> Iterator[dict[str, str]]:
+    """
+    Sends the query and parses its results in the CSV format while they are downloaded
+
+    Parameters
+    ----------
+    query : str
+        SPARQL query
+    endpoint : str | None
+        URL of the SPARQL endpoint, SPARQL_ENDPOINT_URL from the configuration if None
+
+    Returns
+    -------
+    Iterator[dict[str, str]]
+        rows of the results, IRIs and literals are given as plain strings
+    """
+    sparql_endpoint_url = endpoint or wbi_config['SPARQL_ENDPOINT_URL']
+    headers = {
+        'Accept': 'text/csv',
+        'User-Agent': get_user_agent(wbi_config['USER_AGENT'])
+    }
+
+    for _ in range(MAX_RETRIES):
+        response = helpers_session.post(sparql_endpoint_url, data={'query': query}, headers=headers, stream=True)
+        if response.status_code in (429, 500, 502, 503, 504):
+            response.close()
+            print(f"SPARQL endpoint unavailable (HTTP {response.status_code}), retrying in {RETRY_AFTER} s.")
+            time.sleep(RETRY_AFTER)
+            continue
+        response.raise_for_status()
+        response.raw.decode_content = True
+        # the stream is closed by the 'with' block, not by urllib3 after the last byte, which TextIOWrapper would not expect
+        response.raw.auto_close = False
+        with response, io.TextIOWrapper(response.raw, encoding='utf-8', newline='') as results_file:
+            yield from csv.DictReader(results_file)
+        return
+
+    raise ConnectionError(f"No results of the SPARQL query after {MAX_RETRIES} retries")
+
+
+def iter_query_rows(where_clause: str, variables: list[str], page_size: int = PAGE_SIZE,
+                    endpoint: str | None = None) -> Iterator[dict[str, str]]:
+    """
+    Yields all the rows of a SELECT DISTINCT query page by page. Pages are sorted by the string values of the variables
+    and every next page starts after the last row of the previous one (keyset pagination), so the endpoint never has
+    to return or skip the whole result set and only one page is parsed at a time.
+
+    Parameters
+    ----------
+    where_clause : str
+        graph pattern of the query, without the surrounding braces
+    variables : list[str]
+        names of the selected variables (without '?'), the first one is the main key of sorting
+    page_size : int
+        maximal number of rows in a single page
+    endpoint : str | None
+        URL of the SPARQL endpoint, SPARQL_ENDPOINT_URL from the configuration if None
+
+    Returns
+    -------
+    Iterator[dict[str, str]]
+        rows of the results in the order of the variables
+    """
+    selected_variables = ' '.join(f'?{variable}' for variable in variables)
+    order = ' '.join(f'STR(?{variable})' for variable in variables)
+    last_row = None
+
+    while True:
+        keyset_filter = f'FILTER({get_keyset_filter(variables, last_row)})' if last_row else ''
+        query = f"""
+            SELECT DISTINCT {selected_variables} WHERE {{
+                {where_clause}
+                {keyset_filter}
+            }} ORDER BY {order} LIMIT {page_size}
+            """
+        number_of_rows = 0
+        for row in read_csv_results(query, endpoint=endpoint):
+            number_of_rows += 1
+            last_row = row
+            yield row
+        if number_of_rows < page_size:
+            break
+
+
+def count_query_rows(where_clause: str, variables: list[str], endpoint: str | None = None) -> int:
+    """
+    Counts the rows of a SELECT DISTINCT query without downloading them, e.g. to know the total before iter_query_rows()
+
+    Parameters
+    ----------
+    where_clause : str
+        graph pattern of the query, without the surrounding braces
+    variables : list[str]
+        names of the selected variables (without '?')
+    endpoint : str | None
+        URL of the SPARQL endpoint, SPARQL_ENDPOINT_URL from the configuration if None
+
+    Returns
+    -------
+    int
+        number of distinct rows
+    """
+    selected_variables = ' '.join(f'?{variable}' for variable in variables)
+    query = f"""
+        SELECT (COUNT(*) AS ?count) WHERE {{
+            SELECT DISTINCT {selected_variables} WHERE {{
+                {where_clause}
+            }}
+        }}
+        """
+    for row in read_csv_results(query, endpoint=endpoint):
+        return int(row['count'])
+    return 0
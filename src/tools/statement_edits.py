@@ -0,0 +1,90 @@
+"""
+Edits of single statements and references addressed by the statement GUID and the reference hash taken from SPARQL
+results, so that the entity does not have to be downloaded before the edit. A reference changed in the meantime has
+a different hash, so Wikibase rejects the edit instead of overwriting the change.
+"""
+
+from wikibaseintegrator import wbi_login
+from wikibaseintegrator.models import references
+from wikibaseintegrator.wbi_helpers import mediawiki_api_call_helper
+
+import tools.entity_diff as entity_diff
+
+
+def get_statement_guid(statement_link: str) -> str:
+    """
+    Converts the statement URI from SPARQL results (e.g. '.../statement/Q1-0A1B...') to the statement GUID ('Q1$0A1B...')
+
+    Parameters
+    ----------
+    statement_link : str
+        URI of the statement
+
+    Returns
+    -------
+    str
+        GUID of the statement
+    """
+    position = statement_link.rfind(r'/')
+    return statement_link[position+1:].replace('-', '$', 1)
+
+
+def get_reference_hash(reference_link: str) -> str:
+    """
+    Returns the hash of the reference from its URI in SPARQL results (e.g. '.../reference/0123abcd...')
+
+    Parameters
+    ----------
+    reference_link : str
+        URI of the reference
+
+    Returns
+    -------
+    str
+        hash of the reference
+    """
+    position = reference_link.rfind(r'/')
+    return reference_link[position+1:]
+
+
+def set_reference(statement_guid: str, reference: references.Reference, reference_hash: str | None = None,
+                  summary: str | None = None, login: wbi_login._Login | None = None, is_bot: bool = False) -> dict:
+    """
+    Adds the reference to the statement or replaces the existing reference with the given hash (wbsetreference)
+
+    Parameters
+    ----------
+    statement_guid : str
+        GUID of the statement
+    reference : references.Reference
+        new content of the reference
+    reference_hash : str | None
+        hash of the replaced reference, the reference is added if None
+    summary : str | None
+        summary of the edit
+    login : wbi_login._Login | None
+        login instance
+    is_bot : bool
+        mark the edit as a bot edit
+
+    Returns
+    -------
+    dict
+        response of the API
+    """
+    reference_json = reference.get_json()
+    data = {
+        'action': 'wbsetreference',
+        'statement': statement_guid,
+        'snaks': entity_diff.to_json(reference_json['snaks']),
+        'snaks-order': entity_diff.to_json(reference_json['snaks-order']),
+        'format': 'json'
+    }
+    if reference_hash:
+        data['reference'] = reference_hash
+    if summary:
+        data['summary'] = summary
+    if is_bot:
+        data['bot'] = ''
+    return mediawiki_api_call_helper(data=data, login=login, is_bot=is_bot)
+
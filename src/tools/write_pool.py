@@ -0,0 +1,251 @@
+"""
+Pool of concurrent writes to Wikibase. Edits of the same entity always go to the same single-threaded lane, so an entity
+is never edited by two requests at once and its edits keep their order. The number of lanes working at the same time is
+adjusted like in TCP congestion control (AIMD): it grows by one after a window of successful edits and is halved when
+the server reports replication lag (maxlag), rate limiting or overload.
+"""
+
+import threading
+import time
+import zlib
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+
+import tools.checkpoint as checkpoint
+import tools.profiling as profiling
+import tools.report_writer as report_writer
+
+
+MAX_WRITERS = 4
+MAXLAG = 5
+RETRY_AFTER = 5.0
+
+
+class AimdLimiter:
+    """
+    Limit of the concurrent edits with additive increase and multiplicative decrease.
+    """
+
+    def __init__(self, max_limit: int, initial_limit: int = 1):
+        self.max_limit = max_limit
+        self.limit = float(min(initial_limit, max_limit))
+        self.in_progress = 0
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Waits until an edit can start, i.e. the number of edits in progress is below the limit and there is no pause
+        """
+        with self.condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    self.condition.wait(pause)
+                elif self.in_progress >= int(self.limit):
+                    self.condition.wait()
+                else:
+                    break
+            self.in_progress += 1
+
+    def release(self):
+        """
+        Marks the end of an edit
+        """
+        with self.condition:
+            self.in_progress -= 1
+            self.condition.notify_all()
+
+    def on_success(self):
+        """
+        Increases the limit by one after about 'limit' successful edits
+        """
+        with self.condition:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def on_throttle(self, delay: float):
+        """
+        Halves the limit and stops starting new edits for the given time
+
+        Parameters
+        ----------
+        delay : float
+            seconds to wait before the next edit
+        """
+        with self.condition:
+            self.limit = max(1.0, self.limit / 2)
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+
+def get_throttle_delay(response: requests.Response) -> float | None:
+    """
+    Checks if the response of the API reports replication lag, rate limiting or overload of the server
+
+    Parameters
+    ----------
+    response : requests.Response
+        response of the API
+
+    Returns
+    -------
+    float | None
+        seconds to wait before the next edit, None if the server is not throttling
+    """
+    retry_after = response.headers.get('Retry-After')
+    delay = float(retry_after) if retry_after and retry_after.isdigit() else RETRY_AFTER
+
+    if response.status_code in (429, 502, 503, 504):
+        return delay
+    if response.status_code != 200 or 'json' not in response.headers.get('Content-Type', ''):
+        return None
+    # only error responses are parsed, the check of the raw content is enough for all the others
+    if b'"maxlag"' not in response.content and b'actionthrottled' not in response.content:
+        return None
+
+    error = response.json().get('error', {})
+    if error.get('code') == 'maxlag':
+        return max(delay, float(error.get('lag', 0)))
+    if 'actionthrottledtext' in [message.get('name') for message in error.get('messages', [])]:
+        return delay
+    return None
+
+
+class WritePool:
+    """
+    Runs edits in up to max_workers lanes, each lane is a single thread. Only a limited number of edits may wait in the
+    queues, so submit() blocks when the writes fall behind.
+    """
+
+    def __init__(self, max_workers: int = MAX_WRITERS, maxlag: int = MAXLAG, session: requests.Session | None = None):
+        self.maxlag = maxlag
+        self.limiter = AimdLimiter(max_workers)
+        self.lanes = [ThreadPoolExecutor(max_workers=1) for _ in range(max_workers)]
+        self.queue_slots = threading.BoundedSemaphore(max_workers * 4)
+        self.session = session
+        if session is not None:
+            session.hooks['response'].append(self.observe_response)
+
+    def observe_response(self, response: requests.Response, *args, **kwargs):
+        """
+        Hook of the HTTP session, lowering the concurrency when the server is throttling
+        """
+        delay = get_throttle_delay(response)
+        if delay is not None:
+            self.limiter.on_throttle(delay)
+
+    def run(self, function: Callable, args: tuple, kwargs: dict):
+        self.limiter.acquire()
+        try:
+            result = function(*args, **kwargs)
+            self.limiter.on_success()
+            return result
+        finally:
+            self.limiter.release()
+            self.queue_slots.release()
+
+    def submit(self, entity_id: str, function: Callable, *args, **kwargs) -> Future:
+        """
+        Schedules an edit of the entity
+
+        Parameters
+        ----------
+        entity_id : str
+            ID of the edited entity, edits of the same entity are run one after another
+        function : Callable
+            function making the edit, e.g. entity.write
+        args, kwargs
+            arguments of the function
+
+        Returns
+        -------
+        Future
+            result of the function
+        """
+        if profiling.run_inline():
+            future = Future()
+            try:
+                future.set_result(function(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self.queue_slots.acquire()
+        lane = self.lanes[zlib.crc32(entity_id.encode()) % len(self.lanes)]
+        return lane.submit(self.run, function, args, kwargs)
+
+    def close(self):
+        """
+        Waits for all the scheduled edits and stops observing the responses of the session
+        """
+        for lane in self.lanes:
+            lane.shutdown(wait=True)
+        if self.session is not None and self.observe_response in self.session.hooks['response']:
+            self.session.hooks['response'].remove(self.observe_response)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_finished(pending: deque, wait: bool = False) -> Iterator[tuple[object, BaseException | None]]:
+    """
+    Takes the finished writes from the front of the queue, in the order in which they were submitted, so that the scripts
+    report and journal the entities in their order. Any exception raised by a write is returned, not raised, so that a
+    single failed entity does not stop the run.
+
+    Parameters
+    ----------
+    pending : deque
+        (future, context) of the processed entities, the future is None if the entity is not written
+    wait : bool
+        wait for all the writes, otherwise only the writes finished before the first unfinished one are taken
+
+    Returns
+    -------
+    Iterator[tuple[object, BaseException | None]]
+        context of every finished entity (e.g. its ID and report message) and the exception raised by its write, None if
+        the write succeeded or the entity was not written
+    """
+    while pending and (wait or pending[0][0] is None or pending[0][0].done()):
+        future, context = pending.popleft()
+        yield context, future.exception() if future is not None else None
+
+
+def report_finished_writes(pending: deque, report: report_writer.ReportWriter, journal: checkpoint.CheckpointJournal,
+                           wait: bool = False, error_message: str = " - error writing to Wikibase"):
+    """
+    Reports and journals the entities whose writes were finished, in the order in which they were processed. Entities
+    whose write failed with any error are reported but not recorded in the journal, so that they are processed again
+    with --resume.
+
+    Parameters
+    ----------
+    pending : deque
+        (future, (entity ID, report message, write message)) of the processed entities, the future is None if the entity
+        is not written. The write message is added to the report message after a successful write. Nothing is reported
+        if the report message is empty, and the entity is not recorded in the journal if its ID is None.
+    report : report_writer.ReportWriter
+        report of the script
+    journal : checkpoint.CheckpointJournal
+        checkpoint journal of the script
+    wait : bool
+        wait for all the writes, otherwise only the already finished writes are reported
+    error_message : str
+        message added to the report message when the write failed, followed by the error
+    """
+    for (entity_id, report_message, write_message), error in iter_finished(pending, wait=wait):
+        if error is not None:
+            print(f"{entity_id}{error_message}")
+            report.write(f"{report_message}{error_message} {error}\n")
+            continue
+
+        report_message += write_message
+        if report_message:
+            report.write(report_message + "\n")
+        if entity_id is not None:
+            journal.record(entity_id, outcome=report_message or checkpoint.DONE_OUTCOME)